@@ -8,6 +8,7 @@ It loads available datasets from a JSON file from library static.
 """
 
 import json
+from functools import lru_cache
 from importlib import resources as impresources
 
 import pycantus.static as static
@@ -18,26 +19,36 @@ __version__ = "1.0.0"
 __author__ = "Anna Dvorakova"
 
 
+@lru_cache(maxsize=None)
 def _load_available_datasets() -> dict:
     """ 
     Loads the available datasets and their metainfo from a JSON file.
+    The file is read on the first call (not at import time).
     """
     aval_datas_file = impresources.files(static) / "available_datasets.json"
     with aval_datas_file.open("rt") as f:
         available_datasets = json.load(f)
     return available_datasets
-AVAILABLE_DATASETS = _load_available_datasets()
+
+def __getattr__(name):
+    # AVAILABLE_DATASETS are loaded on first access
+    if name == 'AVAILABLE_DATASETS':
+        return _load_available_datasets()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def load_dataset(name_or_chant_filepath : str, source_filepath : str =None, 
                  is_editable : bool =False, check_missing_sources : bool=False,
-                 create_missing_sources : bool =False, **corpus_kwargs) -> Corpus:
+                 create_missing_sources : bool =False, use_cache : bool =False, 
+                 workers : int =None, columns : list[str] =None, storage : str ='objects', 
+                 **corpus_kwargs) -> Corpus:
     """ 
     Returns a Corpus object based on the name of dataset or filepath provided.
     If the name is in the available datasets, it will load that dataset.
     If a filepath is provided, it will try to load the dataset from that filepath.
     If the filepath is not found, it will raise an error.
     If a source filepath is provided, it will be used to load the sources.
+    Files can be CSV, Parquet (.parquet, .pq) or Feather (.feather, .arrow), chosen by extension.
     If the source filepath is given and not found, it will raise an error.
 
     Args:
@@ -46,31 +57,117 @@ def load_dataset(name_or_chant_filepath : str, source_filepath : str =None,
         is_editable (bool): indicates whether objects in Corpus should be locked
         check_missing_sources (bool): indicates whether load shloud raise exception if some chant refers to source that is not in sources
         create_missing_sources (bool): indicates whether load should create Source entries for sources referred to in some of the chants and not being present in provided sources
+        use_cache (bool): indicates whether loaded data should be stored into and reused from on-disk snapshot cache,
+                          snapshot is rebuilt automatically when the files change
+        workers (int): number of processes parsing chants file in parallel (None or 1 means no parallelism)
+        columns (list): optional chant fields to be loaded, other columns of chants file are not read at all
+                        (mandatory fields are loaded always, None means all fields)
+        storage (str): 'objects' for list of Chant objects or 'columnar' for column-wise storage of chants
+                       (chants are accessed as Chant-like rows, bulk operations are vectorized, suited for very big datasets)
 
     Ruturns:
         Corpus: data collection based on the name of dataset or filepath provided
     """
-    if name_or_chant_filepath in AVAILABLE_DATASETS:
+    if name_or_chant_filepath in _load_available_datasets():
         # We know we are being asked for a pre-defined corpus.
         dataset_name = name_or_chant_filepath  
-        dataset_metadata = AVAILABLE_DATASETS[dataset_name]
+        dataset_metadata = _load_available_datasets()[dataset_name]
         corpus = Corpus(**dataset_metadata, is_editable=is_editable, check_missing_sources=check_missing_sources,
-                        create_missing_sources=create_missing_sources)
+                        create_missing_sources=create_missing_sources, use_cache=use_cache, workers=workers,
+                        columns=columns, storage=storage, **corpus_kwargs)
 
     else:
         # We know to expect a custom CSV
         csv_chant_file_path = name_or_chant_filepath
         corpus = Corpus(csv_chant_file_path, source_filepath, check_missing_sources=check_missing_sources,
                         create_missing_sources=create_missing_sources, is_editable=is_editable, 
-                        **corpus_kwargs)
+                        use_cache=use_cache, workers=workers, columns=columns, storage=storage, **corpus_kwargs)
 
     return corpus
 
+def _load_dataset_item(item : str | tuple, load_kwargs : dict) -> Corpus:
+    """
+    Loads one item of load_datasets (name of dataset, path to chants or (chants, sources) pair).
+    """
+    if isinstance(item, (tuple, list)):
+        return load_dataset(*item, **load_kwargs)
+    return load_dataset(item, **load_kwargs)
+
+def load_datasets(datasets : list, is_editable : bool =False, check_missing_sources : bool =False,
+                  create_missing_sources : bool =False, use_cache : bool =False, max_workers : int =None,
+                  use_processes : bool =False, **corpus_kwargs) -> Corpus:
+    """
+    Loads several datasets concurrently and merges them into one Corpus.
+    Chants are deduplicated by chantlink and sources by srclink, also within one dataset (see Corpus.merge()):
+    the first record with the link is kept, so when the datasets overlap the record from the earlier dataset in the list is kept.
+    The merge is recorded in operations_history of the returned Corpus.
+
+    Args:
+        datasets (list): names of available datasets, paths to chants files
+                         or (chants filepath, sources filepath) pairs
+        is_editable (bool): indicates whether objects in Corpus should be locked
+        check_missing_sources (bool): indicates whether load shloud raise exception if some chant refers to source that is not in sources
+        create_missing_sources (bool): indicates whether load should create Source entries for sources referred to in some of the chants and not being present in provided sources
+        use_cache (bool): indicates whether loaded data should be stored into and reused from on-disk snapshot cache
+        max_workers (int): maximal number of datasets loaded at once (None means one worker per dataset)
+        use_processes (bool): load datasets in a process pool instead of a thread pool,
+                              parsing then runs truly in parallel, but loaded objects are copied between processes
+        **corpus_kwargs: other arguments of load_dataset (e.g. columns)
+
+    Returns:
+        Corpus: merged data collection of all datasets
+    """
+    if not datasets:
+        raise ValueError('At least one dataset has to be provided.')
+    load_kwargs = dict(corpus_kwargs, is_editable=is_editable, check_missing_sources=check_missing_sources,
+                       create_missing_sources=create_missing_sources, use_cache=use_cache)
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor # imported lazily, they are slow to import
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers or len(datasets)) as executor:
+        corpora = list(executor.map(_load_dataset_item, datasets, [load_kwargs] * len(datasets)))
+
+    return Corpus.merge(corpora, is_editable=is_editable)
+
+def iter_dataset(name_or_chant_filepath : str, source_filepath : str =None, chunksize : int =10000,
+                 is_editable : bool =False, check_missing_sources : bool =False,
+                 create_missing_sources : bool =False):
+    """
+    Streams chants of the dataset given by name or filepath chunk by chunk
+    without loading the whole dataset into memory.
+    The dataset is resolved in the same way as in load_dataset.
+
+    Args:
+        name_or_chant_filepath (str): name of available dataset or path to file with chants to be loaded
+        source_filepath (str): if providing path to chants this can be path to sources file
+        chunksize (int): number of chants read from the file at once
+        is_editable (bool): indicates whether yielded chants should be locked
+        check_missing_sources (bool): indicates whether iteration should raise exception if some chant refers to source that is not in sources
+        create_missing_sources (bool): indicates whether Source entries should be created for sources referred to in some of the chants and not being present in provided sources
+
+    Yields:
+        Chant: chant records of the dataset in the order of the chants file
+    """
+    from pycantus.dataloaders.loader import CsvLoader # imports pandas, so only when needed
+    if name_or_chant_filepath in _load_available_datasets():
+        dataset_metadata = _load_available_datasets()[name_or_chant_filepath]
+        loader = CsvLoader(dataset_metadata['chants_filepath'], dataset_metadata['sources_filepath'],
+                           check_missing_sources, create_missing_sources,
+                           dataset_metadata['chants_fallback_url'], dataset_metadata['sources_fallback_url'],
+                           dataset_metadata['other_parameters'])
+    else:
+        loader = CsvLoader(name_or_chant_filepath, source_filepath, check_missing_sources, create_missing_sources)
+
+    for chant in loader.iter_chants(chunksize=chunksize):
+        if not is_editable:
+            chant.locked = True
+        yield chant
+
+
 def list_available_datasets():
     """
     Lists all available dataset of current PyCantus based on 
     static/available_datsets.json file.
     """
     print('List of available datasets:')
-    for dataset, dataset_metadata in AVAILABLE_DATASETS.items():
+    for dataset, dataset_metadata in _load_available_datasets().items():
         print(f"\t{dataset}: {dataset_metadata['name']} ({dataset_metadata['description']})")
\ No newline at end of file
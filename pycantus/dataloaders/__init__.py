@@ -1,2 +1,7 @@
 #!/usr/bin/env python
-from .loader import CsvLoader
\ No newline at end of file
+def __getattr__(name):
+    # CsvLoader imports pandas, so it is imported on first access only
+    if name == 'CsvLoader':
+        from .loader import CsvLoader
+        return CsvLoader
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
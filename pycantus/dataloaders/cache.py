@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+This module contains the SnapshotCache class, which stores loaded chants and sources
+as binary snapshots on disk, so repeated loads of unchanged dataset files are fast.
+
+Snapshots are keyed by the content hashes of the chants and sources files and by the loader options.
+When any of the files changes, the snapshot is detected as stale and rebuilt.
+Chants and sources are stored as columns of field values, objects are recreated by their bulk factories
+(categorical fields are interned again, as in the loader).
+"""
+import gc
+import hashlib
+import json
+import os
+import pickle
+
+from pycantus.models.chant import Chant, CHANT_INIT_FIELDS, CATEGORICAL_CHANTS_FIELDS
+from pycantus.models.source import Source, SOURCE_INIT_FIELDS, CATEGORICAL_SOURCES_FIELDS
+from pycantus.dataloaders.interning import intern_values
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+SNAPSHOT_FORMAT_VERSION = 3 # increase when stored data change, so old snapshots are rebuilt
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pycantus')
+
+
+def file_hash(path : str, chunk_size : int =1 << 20) -> str:
+    """
+    Computes SHA-256 hash of the file content.
+
+    Args:
+        path (str): path to the file
+        chunk_size (int): size of blocks the file is read by
+
+    Returns:
+        str: hexadecimal digest of the file content
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(chunk_size):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def write_atomic(path : str, data : bytes):
+    """
+    Writes data to the file so readers never see partially written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SnapshotCache():
+    """
+    On-disk cache of loaded chants and sources.
+
+    Attributes:
+        cache_dir (str): directory where snapshots are stored
+                         (default is PYCANTUS_CACHE_DIR environment variable or ~/.cache/pycantus)
+    """
+    def __init__(self, cache_dir : str =None):
+        """
+        Initialize the SnapshotCache.
+        Args corresponds to class attributes.
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get('PYCANTUS_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.cache_dir = cache_dir
+
+    @property
+    def _hashes_path(self) -> str:
+        return os.path.join(self.cache_dir, 'file_hashes.json')
+
+    def file_hash(self, path : str) -> str:
+        """
+        Returns content hash of the file.
+        Hashes are remembered together with size and modification time of the file,
+        so unchanged files are not read again.
+
+        Args:
+            path (str): path to the file
+
+        Returns:
+            str: hexadecimal SHA-256 digest of the file content
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        fingerprint = [stat.st_size, stat.st_mtime_ns]
+        try:
+            with open(self._hashes_path, 'r') as f:
+                known_hashes = json.load(f)
+        except (OSError, ValueError):
+            known_hashes = {}
+
+        known = known_hashes.get(path)
+        if known is not None and known['fingerprint'] == fingerprint:
+            return known['sha256']
+
+        digest = file_hash(path)
+        known_hashes[path] = {'fingerprint' : fingerprint, 'sha256' : digest}
+        try:
+            write_atomic(self._hashes_path, json.dumps(known_hashes).encode('utf-8'))
+        except OSError:
+            pass # remembering hashes is only an optimization
+        return digest
+
+    def snapshot_key(self, chants_filepath : str, sources_filepath : str =None,
+                     sumcheck : str =None, **options) -> str | None:
+        """
+        Computes key of the snapshot from the files content and the loader options.
+
+        Args:
+            chants_filepath (str): path to file with chants
+            sources_filepath (str, optional): path to file with sources
+            sumcheck (str, optional): expected SHA-256 hash of the chants file (e.g. from available_datasets.json)
+            **options: loader options influencing the loaded data (e.g. check_missing_sources)
+
+        Returns:
+            str: key of the snapshot or None if chants file does not match the sumcheck
+        """
+        chants_hash = self.file_hash(chants_filepath)
+        if sumcheck and chants_hash != sumcheck:
+            print(f"Chants file {chants_filepath} does not match sumcheck of the dataset, snapshot cache is not used.")
+            return None
+        key_data = {
+            'format' : SNAPSHOT_FORMAT_VERSION,
+            'chants' : chants_hash,
+            'sources' : self.file_hash(sources_filepath) if sources_filepath is not None else None,
+            'options' : options
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def snapshot_path(self, chants_filepath : str, sources_filepath : str =None, **options) -> str:
+        """
+        Returns path to the snapshot file for given files and options.
+        Files with changed content share the same path, so stale snapshots get overwritten.
+        """
+        slot_data = {
+            'chants' : os.path.abspath(chants_filepath),
+            'sources' : os.path.abspath(sources_filepath) if sources_filepath is not None else None,
+            'options' : options
+        }
+        slot = hashlib.sha256(json.dumps(slot_data, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"snapshot_{slot[:32]}.pickle")
+
+    def load(self, path : str, key : str, columnar : bool =False) -> tuple[list, list] | None:
+        """
+        Loads chants and sources from the snapshot.
+
+        Args:
+            path (str): path to the snapshot file
+            key (str): expected key of the snapshot
+            columnar (bool): indicates whether chants should be loaded into ChantTable instead of Chant objects
+
+        Returns:
+            tuple: (chants, sources) or None if there is no valid snapshot for the key,
+                   loaded objects are not locked
+        """
+        if not os.path.isfile(path):
+            return None
+        gc_enabled = gc.isenabled()
+        gc.disable() # many objects are created at once, cyclic gc would only slow it down
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+            if not isinstance(snapshot, dict) or snapshot.get('key') != key:
+                print("Snapshot of the dataset is stale, rebuilding...")
+                return None
+            for field in CATEGORICAL_CHANTS_FIELDS:
+                snapshot['chants'][field] = intern_values(snapshot['chants'][field])
+            for field in CATEGORICAL_SOURCES_FIELDS:
+                snapshot['sources'][field] = intern_values(snapshot['sources'][field])
+            if columnar:
+                from pycantus.models.chant_table import ChantTable # imports numpy, so only when needed
+                chants = ChantTable.from_columns(snapshot['chants'], snapshot['chants_count'])
+            else:
+                chants = list(Chant.from_columns(snapshot['chants'], snapshot['chants_count']))
+            sources = list(Source.from_columns(snapshot['sources'], snapshot['sources_count']))
+        except Exception:
+            return None # corrupted or incompatible snapshot is rebuilt
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return chants, sources
+
+    def store(self, path : str, key : str, chants : list, sources : list):
+        """
+        Stores chants and sources into the snapshot.
+
+        Args:
+            path (str): path to the snapshot file
+            key (str): key of the snapshot
+            chants (list): loaded Chant objects (or ChantTable)
+            sources (list): loaded Source objects
+        """
+        if getattr(chants, 'columnar', False):
+            chants_columns = chants.to_columns()
+        else:
+            chants_columns = {field : [getattr(ch, field) for ch in chants] for field in CHANT_INIT_FIELDS}
+        snapshot = {
+            'key' : key,
+            'chants' : chants_columns,
+            'chants_count' : len(chants),
+            'sources' : {field : [getattr(s, field) for s in sources] for field in SOURCE_INIT_FIELDS},
+            'sources_count' : len(sources)
+        }
+        try:
+            write_atomic(path, pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            print(f"Error storing snapshot of the dataset : {e}")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+This module contains helpers for transparent work with compressed dataset files.
+Compression is chosen by the file extension (.gz, .bz2, .xz, .zst), files are always
+compressed and decompressed as streams, no plain-text copy is written to disk.
+
+zstd compression requires the optional zstandard package.
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+COMPRESSION_EXTENSIONS = {'.gz' : 'gzip', '.bz2' : 'bz2', '.xz' : 'xz', '.zst' : 'zstd'}
+
+
+def compression_of(filename : str) -> str | None:
+    """
+    Determines compression of the file based on its extension.
+
+    Args:
+        filename (str): path to the file (or URL)
+
+    Returns:
+        str: 'gzip', 'bz2', 'xz', 'zstd' or None for uncompressed file
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return COMPRESSION_EXTENSIONS.get(extension)
+
+
+def compressed_variant(filename : str) -> str | None:
+    """
+    Finds existing compressed variant of the file (e.g. chants.csv.gz for chants.csv).
+
+    Args:
+        filename (str): path to the uncompressed file
+
+    Returns:
+        str: path to the first existing compressed variant or None
+    """
+    for extension in COMPRESSION_EXTENSIONS:
+        if os.path.isfile(filename + extension):
+            return filename + extension
+    return None
+
+
+def open_text(filename : str, mode : str ='r', newline : str =None):
+    """
+    Opens (possibly compressed) text file, compression is chosen by the file extension.
+    Uncompressed files are opened with the plain open().
+
+    Args:
+        filename (str): path to the file
+        mode (str): 'r' for reading, 'w' for writing
+        newline (str): newline argument of open() ('' disables translation of line endings, e.g. for csv module)
+
+    Returns:
+        file object: text stream (de)compressing the data on the fly
+    """
+    compression = compression_of(filename)
+    if compression is None:
+        return open(filename, mode, newline=newline)
+    if compression == 'gzip':
+        return gzip.open(filename, mode + 't', encoding='utf-8', newline=newline)
+    if compression == 'bz2':
+        return bz2.open(filename, mode + 't', encoding='utf-8', newline=newline)
+    if compression == 'xz':
+        return lzma.open(filename, mode + 't', encoding='utf-8', newline=newline)
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compressed files require zstandard package (pip install pycantus[zstd]).")
+    return io.TextIOWrapper(zstandard.open(filename, mode + 'b'), encoding='utf-8', newline=newline)
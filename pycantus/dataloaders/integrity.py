@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+This module contains the SourcesReport class, which describes integrity of relation between chants and sources,
+and the function building it in a single linear pass over the data.
+"""
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+class SourcesReport():
+    """
+    Report about integrity of sources referred to in chants.
+
+    Attributes:
+        missing_sources (list): (srclink, siglum) pairs referred to in chants without record in sources
+        duplicate_srclinks (list): srclinks having more than one record in sources
+        siglum_mismatches (list): (srclink, chant siglum, source siglum) triples where chant uses
+                                  different siglum than its source record
+    """
+    def __init__(self, missing_sources : list[tuple[str]], duplicate_srclinks : list[str],
+                 siglum_mismatches : list[tuple[str]]):
+        """
+        Initialize the SourcesReport.
+        Args corresponds to class attributes.
+        """
+        self.missing_sources = missing_sources
+        self.duplicate_srclinks = duplicate_srclinks
+        self.siglum_mismatches = siglum_mismatches
+
+    @property
+    def is_ok(self) -> bool:
+        """
+        Returns:
+            bool: True if no integrity problem was found
+        """
+        return not (self.missing_sources or self.duplicate_srclinks or self.siglum_mismatches)
+
+    def __str__(self) -> str:
+        report_string = f"Missing sources: {len(self.missing_sources)}\n"
+        for srclink, siglum in self.missing_sources:
+            report_string += f"  {srclink} : {siglum}\n"
+        report_string += f"Duplicate srclinks in sources: {len(self.duplicate_srclinks)}\n"
+        for srclink in self.duplicate_srclinks:
+            report_string += f"  {srclink}\n"
+        report_string += f"Siglum mismatches between chants and sources: {len(self.siglum_mismatches)}\n"
+        for srclink, chant_siglum, source_siglum in self.siglum_mismatches:
+            report_string += f"  {srclink} : '{chant_siglum}' in chants, '{source_siglum}' in sources\n"
+        return report_string
+
+
+def build_sources_report(chant_sources : set[tuple[str]], sources : list) -> SourcesReport:
+    """
+    Checks sources referred to in chants against source records,
+    all problems are collected in one pass (time linear in number of chants sources and sources).
+
+    Args:
+        chant_sources (set): (srclink, siglum) pairs referred to in chants
+        sources (list): Source objects
+
+    Returns:
+        SourcesReport: found problems
+    """
+    source_sigla = {} # srclink -> siglum of the first record
+    duplicate_srclinks = {}
+    for source in sources:
+        if source.srclink in source_sigla:
+            duplicate_srclinks[source.srclink] = None
+        else:
+            source_sigla[source.srclink] = source.siglum
+
+    missing_sources = []
+    siglum_mismatches = []
+    for srclink, siglum in sorted(chant_sources, key=str):
+        if srclink not in source_sigla:
+            missing_sources.append((srclink, siglum))
+        elif source_sigla[srclink] != siglum:
+            siglum_mismatches.append((srclink, siglum, source_sigla[srclink]))
+
+    return SourcesReport(missing_sources, list(duplicate_srclinks), siglum_mismatches)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+This module contains helpers for interning values of categorical fields (fields with few distinct values
+compared to the number of records, e.g. siglum, genre or office).
+Equal values then share one string object: memory is saved and equality checks of interned values
+(e.g. in filtration or grouping) are decided by identity, without comparing characters.
+"""
+import sys
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+def intern_value(value):
+    """
+    Interns string value, other values (e.g. None) are returned unchanged.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+def intern_values(values : list) -> list:
+    """
+    Dictionary-encodes the values: each distinct value is interned once
+    and all its occurrences are replaced by the shared interned object.
+
+    Args:
+        values (list): values of one field
+
+    Returns:
+        list: values with equal strings shared
+    """
+    table = {value : intern_value(value) for value in set(values)}
+    return [table[value] for value in values]
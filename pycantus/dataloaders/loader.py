@@ -1,16 +1,27 @@
 #!/usr/bin/env python
 """
-This module contains the CsvLoader class, which is responsible for loading chants and sources from CSV files.
+This module contains the CsvLoader class, which is responsible for loading chants and sources from CSV files
+(Parquet and Feather files are supported as well, with pyarrow installed). 
+CSV files can be compressed (.gz, .bz2, .xz, .zst), they are decompressed on the fly.
 It provides methods to download the files if they are not found, and to load the data into Chant and Source objects.
 """
+import numpy as np
 import pandas as pd
+import io
 import os
-import requests
+from concurrent.futures import ProcessPoolExecutor
 from importlib import resources as impresources
+from itertools import chain
 import re
-
-from pycantus.models.chant import Chant, MANDATORY_CHANTS_FIELDS, OPTIONAL_CHANTS_FIELDS
-from pycantus.models.source import Source, MANDATORY_SOURCES_FIELDS, OPTIONAL_SOURCES_FIELDS
+import warnings
+from functools import lru_cache
+
+from pycantus.models.chant import Chant, MANDATORY_CHANTS_FIELDS, OPTIONAL_CHANTS_FIELDS, CATEGORICAL_CHANTS_FIELDS
+from pycantus.models.chant_table import ChantTable
+from pycantus.models.source import Source, MANDATORY_SOURCES_FIELDS, OPTIONAL_SOURCES_FIELDS, CATEGORICAL_SOURCES_FIELDS
+from pycantus.dataloaders.integrity import SourcesReport, build_sources_report
+from pycantus.dataloaders.compression import compression_of, compressed_variant
+from pycantus.dataloaders.interning import intern_value, intern_values
 import pycantus.dataset_files as dataset_files
 
 
@@ -18,10 +29,17 @@ __version__ = "1.0.0"
 __author__ = "Anna Dvorakova"
 
 
-def get_numerical_century(century : str) -> int:
+TWO_DIGITS_PATTERN = re.compile(r'(?<!\d)\d{2}(?!\d)')
+ONE_DIGIT_PATTERN = re.compile(r'(?<!\d)\d{1}(?!\d)')
+FOUR_DIGITS_PATTERN = re.compile(r'(?<!\d)\d{4}(?!\d)')
+
+
+@lru_cache(maxsize=None)
+def get_numerical_century(century : str) -> int | None:
     """
     Extracts the numerical century from a string representation of a century.
     Generally takes the first 'possible to be translated to century' value.
+    Results are cached, since century strings repeat heavily.
 
     E.g. 
         - for '12th century' -> 12
@@ -31,36 +49,326 @@ def get_numerical_century(century : str) -> int:
         century (str): Textual representation of century.
 
     Returns:
-        int: Integer representing same century as input string.
+        int: Integer representing same century as input string (None if it cannot be parsed).
     """
-    try:
-        two_digits_pattern = r'(?<!\d)\d{2}(?!\d)'
-        two_digits_match = re.findall(two_digits_pattern, century)
-        if len(two_digits_match) == 1:
-            return int(two_digits_match[0])
-        elif len(two_digits_match) > 1: 
-            # take first anyway
-            return int(two_digits_match[0])
-        
-        one_digit_pattern = r'(?<!\d)\d{1}(?!\d)'
-        one_digit_match = re.findall(one_digit_pattern, century)
-        if len(one_digit_match) == 1:
-            return int(one_digit_match[0])
-        
-        four_digits_pattern = r'(?<!\d)\d{4}(?!\d)'
-        four_digits_match = re.findall(four_digits_pattern, century)
-        if four_digits_match is not None:
-            if len(four_digits_match) == 1:
-                return int(four_digits_match[0][0:2])+1
-            elif len(four_digits_match) > 1: 
-                # take first anyway
-                return int(four_digits_match[0][0:2])+1
-            else:
-                print('PROBLEM:', century)
-        else:
-            print('PROBLEM:', century)
-    except: # probably nan coming
+    if not isinstance(century, str): # probably nan coming
+        return None
+
+    two_digits_match = TWO_DIGITS_PATTERN.findall(century)
+    if two_digits_match:
+        # take first (even if there are more)
+        return int(two_digits_match[0])
+    
+    one_digit_match = ONE_DIGIT_PATTERN.findall(century)
+    if len(one_digit_match) == 1:
+        return int(one_digit_match[0])
+    
+    four_digits_match = FOUR_DIGITS_PATTERN.findall(century)
+    if four_digits_match:
+        # take first (even if there are more)
+        return int(four_digits_match[0][0:2])+1
+    return None
+
+
+def normalize_centuries(centuries : pd.Series) -> tuple[pd.Series, list[str]]:
+    """
+    Translates whole column of textual centuries into numerical centuries (see get_numerical_century()).
+    Each distinct value is parsed only once.
+
+    Args:
+        centuries (pd.Series): textual representations of centuries
+
+    Returns:
+        pd.Series: integer (Int64) column of numerical centuries, missing where parsing was not possible
+        list: distinct non-empty values that could not be parsed
+    """
+    distinct = centuries.dropna().unique()
+    parsed = {century : get_numerical_century(century) for century in distinct}
+    unparsable = [century for century, value in parsed.items() if value is None]
+    numeric = centuries.map(parsed, na_action='ignore').astype('Int64')
+    return numeric, unparsable
+
+
+def find_missing_values(frame : pd.DataFrame, fields : set[str]) -> tuple[int, str] | None:
+    """
+    Finds the first row of DataFrame in which some of the given fields has no value.
+    Each field is checked once for the whole column.
+
+    Args:
+        frame (pd.DataFrame): DataFrame with loaded data
+        fields (set): fields that have to be filled in every row
+
+    Returns:
+        tuple: (position of the row, name of the missing field) or None if all values are present
+    """
+    absent_fields = [field for field in fields if field not in frame.columns]
+    if absent_fields and len(frame) > 0:
+        return 0, absent_fields[0]
+    fields = list(fields)
+    missing = frame[fields].isna().to_numpy()
+    rows_with_missing = missing.any(axis=1).nonzero()[0]
+    if len(rows_with_missing) == 0:
         return None
+    row = int(rows_with_missing[0])
+    field = fields[missing[row].nonzero()[0][0]]
+    return row, field
+
+
+def column_values(frame : pd.DataFrame, field : str) -> list:
+    """
+    Returns values of the DataFrame column as a list with None in place of missing values.
+
+    Args:
+        frame (pd.DataFrame): DataFrame with loaded data
+        field (str): name of the column
+
+    Returns:
+        list: values of the column
+    """
+    return frame[field].to_numpy(dtype=object, na_value=None).tolist()
+
+
+def categorical_values(frame : pd.DataFrame, field : str) -> list:
+    """
+    Returns values of the DataFrame column as a list with None in place of missing values,
+    the column is dictionary-encoded: each distinct value is interned once and shared by all rows having it.
+
+    Args:
+        frame (pd.DataFrame): DataFrame with loaded data
+        field (str): name of the column
+
+    Returns:
+        list: values of the column
+    """
+    codes, uniques = pd.factorize(frame[field])
+    table = np.empty(len(uniques) + 1, dtype=object) # last item (code -1) stays None for missing values
+    table[:-1] = [intern_value(value) for value in uniques]
+    return table[codes].tolist()
+
+
+# Values of tombstone column marking deleted records in delta files (compared case-insensitively)
+TOMBSTONE_VALUES = {'1', 'true', 'yes', 'y', 'x', 'deleted'}
+
+def split_tombstones(frame : pd.DataFrame, link_field : str, tombstone_column : str) -> tuple[pd.DataFrame, list[str]]:
+    """
+    Separates tombstones (rows marking deleted records) of delta file from upserted records.
+    A row is a tombstone when its tombstone column has one of TOMBSTONE_VALUES, only its link has to be filled.
+
+    Args:
+        frame (pd.DataFrame): DataFrame with loaded delta data
+        link_field (str): field identifying the records ('chantlink' or 'srclink')
+        tombstone_column (str): name of the tombstone column (None means there are no tombstones)
+
+    Returns:
+        pd.DataFrame: rows of upserted records (with index of the original rows)
+        list: links of deleted records
+    """
+    if tombstone_column is None or tombstone_column not in frame.columns:
+        return frame, []
+    flags = frame[tombstone_column].astype('string').str.strip().str.lower().isin(TOMBSTONE_VALUES)
+    flags = flags.to_numpy(dtype=bool)
+    if flags.any() and (link_field not in frame.columns or frame[link_field][flags].isna().any()):
+        raise ValueError(f"Missing mandatory field '{link_field}' in tombstone row")
+    deleted = column_values(frame[flags], link_field) if flags.any() else []
+    return frame[~flags], deleted
+
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+FEATHER_EXTENSIONS = ('.feather', '.arrow')
+
+
+def table_format(filename : str) -> str:
+    """
+    Determines format of the data file based on its extension.
+
+    Args:
+        filename (str): path to the file
+
+    Returns:
+        str: 'parquet', 'feather' (Arrow IPC) or 'csv'
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in FEATHER_EXTENSIONS:
+        return 'feather'
+    return 'csv'
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, which is an optional dependency needed only for Parquet and Feather files.
+    """
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Feather files require pyarrow package (pip install pycantus[parquet]).")
+    return pyarrow
+
+
+def read_table(filename : str, columns : set[str] =None, dtype=None) -> pd.DataFrame:
+    """
+    Reads data file into DataFrame, format is chosen by the file extension (see table_format()).
+    Only requested columns are read (and decoded) if columns are given.
+
+    Args:
+        filename (str): path to the file
+        columns (set, optional): names of columns to be read, columns not present in the file are ignored
+        dtype (optional): dtype argument of pd.read_csv (Parquet and Feather files keep their stored types)
+
+    Returns:
+        pd.DataFrame: loaded data
+    """
+    file_format = table_format(filename)
+    if file_format == 'csv':
+        usecols = (lambda column: column in columns) if columns is not None else None
+        return pd.read_csv(filename, dtype=dtype, usecols=usecols)
+    
+    pyarrow = _import_pyarrow()
+    if file_format == 'parquet':
+        available_columns = pyarrow.parquet.read_schema(filename).names
+        read = pd.read_parquet
+    else:
+        with pyarrow.memory_map(filename) as f:
+            available_columns = pyarrow.ipc.open_file(f).schema.names
+        read = pd.read_feather
+    if columns is not None:
+        return read(filename, columns=[column for column in available_columns if column in columns])
+    return read(filename)
+
+
+def iter_table_chunks(filename : str, chunksize : int, columns : set[str] =None, dtype=None):
+    """
+    Reads data file by chunks of rows, format is chosen by the file extension (see table_format()).
+
+    Args:
+        filename (str): path to the file
+        chunksize (int): number of rows in one chunk
+        columns (set, optional): names of columns to be read, columns not present in the file are ignored
+        dtype (optional): dtype argument of pd.read_csv (Parquet and Feather files keep their stored types)
+
+    Yields:
+        pd.DataFrame: chunks of loaded data
+    """
+    file_format = table_format(filename)
+    if file_format == 'csv':
+        usecols = (lambda column: column in columns) if columns is not None else None
+        with pd.read_csv(filename, dtype=dtype, usecols=usecols, chunksize=chunksize) as chunks:
+            yield from chunks
+    elif file_format == 'parquet':
+        pyarrow = _import_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(filename)
+        if columns is not None:
+            columns = [column for column in parquet_file.schema_arrow.names if column in columns]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        # Feather file is memory mapped, so slicing it keeps memory bounded as well
+        frame = read_table(filename, columns)
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+
+
+def split_csv_shards(filename : str, n_shards : int) -> tuple[bytes, list[tuple[int]]]:
+    """
+    Splits CSV file into byte ranges of similar size, each starting at the beginning of a record.
+    Newlines inside quoted values are not considered as record boundaries.
+
+    Args:
+        filename (str): path to CSV file
+        n_shards (int): number of byte ranges to split the data (without header) into
+
+    Returns:
+        bytes: header line of the file
+        list: (start, end) byte offsets of the shards, in the order of the file
+    """
+    file_size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        shard_size = max(1, (file_size - data_start) // n_shards)
+        targets = [data_start + i * shard_size for i in range(1, n_shards)]
+
+        boundaries = [data_start]
+        quotes = 0 # number of quote characters in data before the current block
+        block_start = data_start
+        block_size = 1 << 20
+        while targets and block_start < file_size:
+            block = f.read(block_size)
+            block_end = block_start + len(block)
+            while targets and targets[0] < block_end:
+                # Record boundary is a newline preceded by even number of quotes
+                pos = max(targets[0], boundaries[-1], block_start) - block_start
+                newline = block.find(b'\n', pos)
+                while newline != -1 and (quotes + block.count(b'"', 0, newline)) % 2 == 1:
+                    newline = block.find(b'\n', newline + 1)
+                if newline == -1:
+                    # continue the search in the next block
+                    targets[0] = block_end
+                    break
+                boundaries.append(block_start + newline + 1)
+                targets.pop(0)
+            quotes += block.count(b'"')
+            block_start = block_end
+    boundaries.append(file_size)
+
+    shards = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+    return header, shards
+
+
+def _load_chants_shard(chants_filename : str, header : bytes, start : int, end : int, 
+                       columns : set[str] =None) -> dict:
+    """
+    Worker of parallel loading, parses one byte range of chants CSV file
+    and collects values of chant fields from it.
+
+    Errors are not raised but returned with row numbers relative to the shard,
+    so they can be reported with row numbers of the whole file.
+
+    Args:
+        chants_filename (str): path to file with chants
+        header (bytes): header line of the file
+        start (int): byte offset of the first record of the shard
+        end (int): byte offset after the last record of the shard
+        columns (set, optional): names of columns to be read
+
+    Returns:
+        dict: 'rows' (number of records) and 'columns' ({ field : list of values }) when successful,
+              'missing' (row, field) otherwise
+    """
+    with open(chants_filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    usecols = (lambda column: column in columns) if columns is not None else None
+    chants_f = pd.read_csv(io.BytesIO(header + data), dtype=str, usecols=usecols)
+    shard = {'rows' : len(chants_f)}
+
+    missing = find_missing_values(chants_f, MANDATORY_CHANTS_FIELDS)
+    if missing is not None:
+        shard['missing'] = missing
+        return shard
+
+    shard['columns'] = chants_columns(chants_f)
+    return shard
+
+
+def chants_columns(chants_f : pd.DataFrame) -> dict[str, list]:
+    """
+    Collects values of known chant fields present in the DataFrame.
+
+    Args:
+        chants_f (pd.DataFrame): DataFrame containing chant data
+
+    Returns:
+        dict: { field : list of values } for Chant.from_columns, categorical fields are interned
+    """
+    return {field : categorical_values(chants_f, field) if field in CATEGORICAL_CHANTS_FIELDS 
+                    else column_values(chants_f, field)
+            for field in MANDATORY_CHANTS_FIELDS | OPTIONAL_CHANTS_FIELDS
+            if field in chants_f.columns}
     
 
 class CsvLoader():
@@ -81,10 +389,17 @@ class CsvLoader():
         other_parameters (dict, optional): [not used yet]
         check_missing_sources (bool): indicates whether load should an raise exception if some chant refers to source that is not in sources
         create_missing_sources (bool): indicates whether load should create Source entries for sources referred to in some of the chants and not being present in provided sources
+        workers (int, optional): number of processes parsing chants file in parallel (None or 1 means no parallelism)
+        columns (list, optional): optional chant fields to be loaded (mandatory fields are loaded always), 
+                                  other columns of chants file are not read at all (None means all fields)
+        columnar (bool): indicates whether chants should be loaded into column-wise ChantTable instead of Chant objects
+        sources_report (SourcesReport): integrity report of the last sources check (None before it)
+        unparsable_centuries (list): distinct century values of loaded sources that could not be translated to numeric_century
     """
     def __init__(self, chants_filename : str, sources_filename : str, check_mising_sources : bool,
                  create_missing_sources : bool, chants_fallback_url : str =None, 
-                 sources_fallback_url : str =None, other_parameters=None):
+                 sources_fallback_url : str =None, other_parameters=None, workers : int =None,
+                 columns : list[str] =None, columnar : bool =False):
         """
         Initialize the CsvLoader. 
         Args corresponds to class attributes.
@@ -96,6 +411,11 @@ class CsvLoader():
         self.create_missing_sources = create_missing_sources
         self.check_missing_sources = check_mising_sources
         self.other_parameters = other_parameters
+        self.workers = workers
+        self.columns = columns
+        self.columnar = columnar
+        self.sources_report = None
+        self.unparsable_centuries = []
 
         # Make correct paths for available_datasets data files
         if self.other_parameters == "available_dataset":
@@ -105,56 +425,82 @@ class CsvLoader():
                 sources_file = impresources.files(dataset_files) / self.sources_filename
                 self.sources_filename = os.path.abspath(sources_file)
 
-        # Ensure the CSV files exist or download them if fallback URLs are provided
+        # Ensure the CSV files (or their compressed variants) exist or download them if fallback URLs are provided
         if not os.path.isfile(self.chants_filename):
-            if not self.chants_fallback_url:
+            if compressed_variant(self.chants_filename) is not None:
+                self.chants_filename = compressed_variant(self.chants_filename)
+            elif not self.chants_fallback_url:
                 raise ValueError(f"Non-existent chant CSV file or dataset name specified: {self.chants_filename}")
-            self.download(url=self.chants_fallback_url, target=self.chants_filename)
+            else:
+                self.chants_filename = self.download(url=self.chants_fallback_url, target=self.chants_filename)
 
         if self.sources_filename is not None:
             if not os.path.isfile(self.sources_filename):
-                if not self.sources_fallback_url:
+                if compressed_variant(self.sources_filename) is not None:
+                    self.sources_filename = compressed_variant(self.sources_filename)
+                elif not self.sources_fallback_url:
                     raise ValueError(f"Non-existent chant CSV file or dataset name specified: {self.sources_filename}")
-                self.download(url=self.sources_fallback_url, target=self.sources_filename)
+                else:
+                    self.sources_filename = self.download(url=self.sources_fallback_url, target=self.sources_filename)
 
 
-    def download(self, url : str, target : str):
+    def download(self, url : str, target : str) -> str:
         """
         Downloads a file from the given URL and saves it to the target path.
+        The file is streamed to disk as it is, compressed file (e.g. .csv.gz URL) 
+        stays compressed and gets the compression extension if target does not have it.
 
         Args:
             url (str): URL of file to be downloaded
             target (str): path to directory where downloaded file should be placed
+
+        Returns:
+            str: path to the downloaded file
         """
         print(f"Downloading file from {url}...")
+        url_path = url.split('?')[0]
+        if compression_of(url_path) is not None and compression_of(target) is None:
+            target += os.path.splitext(url_path)[1].lower()
         dir = os.path.dirname(target)
         if not os.path.exists(dir):
             os.makedirs(dir)
-        response = requests.get(url)
-        response.raise_for_status()
-        with open(target, 'wb') as f:
-            f.write(response.content)
+        import requests # imported lazily, it is needed only for downloads
+        with requests.get(url, stream=True) as response:
+            response.raise_for_status()
+            with open(target, 'wb') as f:
+                for block in response.iter_content(chunk_size=1 << 20):
+                    f.write(block)
         print("Download complete.")
+        return target
 
-    def check_sources(self, chant_sources : set[tuple[str]], sources : list[Source]):
+    def check_sources(self, chant_sources : set[tuple[str]], sources : list[Source]) -> SourcesReport:
         """
-        Raises exception if some source mentioned in chants does not have 
-        record in sources.
+        Raises exception if some sources mentioned in chants do not have 
+        record in sources (all of them are listed in the exception).
+        Duplicate srclinks and siglum mismatches are only reported.
 
         Args:
             chant_sources (set): (srclink, siglum) pair referred to in  provided Chants
             sources (list): loaded Sources from provided file
+
+        Returns:
+            SourcesReport: report of found integrity problems
         """
         print("Checking presence of sources...")
-        existig_sources_srclinks = [s.srclink for s in sources]
-        for srclink, siglum in chant_sources:
-            if srclink not in existig_sources_srclinks:
-                raise ValueError(f"Source '{srclink} : {siglum}' from chants does not have record in provided sources!")
+        report = build_sources_report(chant_sources, sources)
+        self.sources_report = report
+        if report.missing_sources:
+            raise ValueError('\n'.join(f"Source '{srclink} : {siglum}' from chants does not have record in provided sources!"
+                                       for srclink, siglum in report.missing_sources))
+        if report.duplicate_srclinks or report.siglum_mismatches:
+            print(f"{len(report.duplicate_srclinks)} duplicate srclinks in sources, "
+                  f"{len(report.siglum_mismatches)} siglum mismatches between chants and sources.")
+        return report
 
     def add_missing_sources(self, chant_sources : set[tuple[str]], sources : list[Source]) -> list[Source]:
         """
         Checks missing Source entries based on chants info and add those
-        in a basic form.
+        in a basic form (one for each missing srclink).
 
         Args:
             chant_sources (set): (srclink, siglum) pair referred to in  provided Chants
@@ -164,59 +510,64 @@ class CsvLoader():
             list: possibly enriched Sources list
         """
         print("Creating missing sources...")
-        new_sources = []
-        existig_sources_srclinks = [s.srclink for s in sources]
-        for srclink, siglum in chant_sources:
-            if srclink not in existig_sources_srclinks:
-                new_sources.append(Source(title=siglum, srclink=srclink, siglum=siglum))
+        report = build_sources_report(chant_sources, sources)
+        self.sources_report = report
+        new_sources = {}
+        for srclink, siglum in report.missing_sources:
+            if srclink not in new_sources:
+                new_sources[srclink] = Source(title=siglum, srclink=srclink, siglum=siglum)
             
         print(f"{len(new_sources)} missing sources created!")
 
-        return sources + new_sources
+        return sources + list(new_sources.values())
 
-    def _load_chants(self, chants_f : pd.DataFrame) -> tuple[list[Chant], set[str]]:
+    def _load_chants(self, chants_f : pd.DataFrame, row_offset : int =0) -> tuple[list[Chant], set[str]]:
         """
         Loads chants from a DataFrame and creates Chant objects.
 
+        Mandatory fields are checked once per column and optional parameters
+        are collected column-wise, Chant objects are then created in bulk.
+
         Args:
             chants_f (pd.DataFrame): DataFrame containing chant data
+            row_offset (int): number of chants file rows preceding the DataFrame (when loading by chunks)
 
         Returns:
             list: List of Chant objects created from the DataFrame
             set: Set of (srclink, siglum) pairs referred to in provided chants_f DataFrame
         """
-        chants = []
-        chants_sources = set()
-        for idx, row in chants_f.iterrows():
-            # Check for missing mandatory fields
-            for field in MANDATORY_CHANTS_FIELDS:
-                if field not in row or pd.isna(row[field]):
-                    raise ValueError(f"Missing mandatory field '{field}' in chants in row {idx+1}")
+        # Check for missing mandatory fields
+        missing = find_missing_values(chants_f, MANDATORY_CHANTS_FIELDS)
+        if missing is not None:
+            row, field = missing
+            raise ValueError(f"Missing mandatory field '{field}' in chants in row {row_offset+row+1}")
+
+        return self._create_chants(chants_columns(chants_f), len(chants_f), row_offset)
+
+    def _create_chants(self, columns : dict[str, list], length : int, 
+                       row_offset : int =0) -> tuple[list[Chant], set[str]]:
+        """
+        Creates Chant objects (or ChantTable when self.columnar is set) from validated column-wise data.
+
+        Args:
+            columns (dict): { field : list of values } of chants
+            length (int): number of chants
+            row_offset (int): number of chants file rows preceding the data (when loading by chunks)
+
+        Returns:
+            list: List of Chant objects created from the columns (or ChantTable)
+            set: Set of (srclink, siglum) pairs referred to in the chants
+        """
+        if self.columnar:
+            chants = ChantTable.from_columns(columns, length)
+        else:
+            chants = []
             try:
-                # Extract mandatory parameters
-                mandatory_params = {
-                    'siglum': row['siglum'],
-                    'srclink': row['srclink'],
-                    'chantlink': row['chantlink'],
-                    'folio': row['folio'],
-                    'db': row['db'],
-                    'cantus_id': row['cantus_id'],
-                    'incipit': row['incipit']
-                }
-                
-                # Extract optional parameters if they exist and are not NaN
-                optional_params = {}
-                for field in OPTIONAL_CHANTS_FIELDS:
-                    if field in row.index and pd.notna(row[field]):
-                        optional_params[field] = row[field]
-                # Create Chant object and add to list
-                chant = Chant(**mandatory_params, **optional_params)
-                chants.append(chant)
-                chants_sources.add((row['srclink'], row['siglum']))
-                
+                chants.extend(Chant.from_columns(columns, length))
             except Exception as e:
-                print(f"Error processing chants file row {idx+2}: {e}")
+                print(f"Error processing chants file row {row_offset+len(chants)+2}: {e}")
                 raise
+        chants_sources = set(zip(columns['srclink'], columns['siglum']))
 
         return chants, chants_sources
     
@@ -225,49 +576,124 @@ class CsvLoader():
         """
         Loads sources from a DataFrame and creates Source objects.
 
+        Mandatory fields are checked once per column and optional parameters
+        are collected column-wise, Source objects are then created in bulk.
+
         Args:
             sources_f (pd.DataFrame): DataFrame containing source data
         Returns:
             list: List of Source objects created from the DataFrame
         """
+        # Check for missing mandatory fields
+        missing = find_missing_values(sources_f, MANDATORY_SOURCES_FIELDS)
+        if missing is not None:
+            row, field = missing
+            raise ValueError(f"Missing mandatory field '{field}' in source in row {row+1}")
+
+        columns = {field : categorical_values(sources_f, field) if field in CATEGORICAL_SOURCES_FIELDS
+                           else column_values(sources_f, field)
+                   for field in MANDATORY_SOURCES_FIELDS | OPTIONAL_SOURCES_FIELDS
+                   if field in sources_f.columns}
+        # Handle numeric_century as integer column
+        if 'numeric_century' in sources_f.columns:
+            numeric_century = pd.to_numeric(sources_f['numeric_century'], errors='coerce')
+            numeric_century = numeric_century.where(numeric_century % 1 == 0).astype('Int64')
+            columns['numeric_century'] = numeric_century.to_numpy(dtype=object, na_value=None).tolist()
+        elif 'century' in sources_f.columns:
+            numeric_century, self.unparsable_centuries = normalize_centuries(sources_f['century'])
+            if self.unparsable_centuries:
+                warnings.warn(f"{len(self.unparsable_centuries)} distinct century values could not be translated "
+                              f"to numeric_century (see unparsable_centuries), e.g. {self.unparsable_centuries[0]!r}.")
+            columns['numeric_century'] = numeric_century.to_numpy(dtype=object, na_value=None).tolist()
+
         sources = []
-        for idx, row in sources_f.iterrows():
-            # Check for missing mandatory fields
-            for field in MANDATORY_SOURCES_FIELDS:
-                if field not in row or pd.isna(row[field]):
-                    raise ValueError(f"Missing mandatory field '{field}' in source in row {idx+1}")
-            try:
-                # Extract mandatory parameters
-                mandatory_params = {
-                    'title' : row['title'],
-                    'siglum' : row['siglum'],
-                    'srclink' : row['srclink']
-                }
-                
-                # Extract optional parameters if they exist and are not NaN
-                optional_params = {}
-                for field in OPTIONAL_SOURCES_FIELDS:
-                    if field in row.index and pd.notna(row[field]):
-                        optional_params[field] = row[field]
-                # Handle numeric_century if needed
-                if 'numeric_century' not in row.index: 
-                    if 'century' in row.index and pd.notna(row['century']):
-                        optional_params['numeric_century'] = get_numerical_century(row['century'])
-                    else:
-                        optional_params['numeric_century'] = None
-                # Create Chant object and add to list
-                source = Source(**mandatory_params, **optional_params)
-                sources.append(source)
-                
-            except Exception as e:
-                print(f"Error processing sources file row {idx+1}: {e}")
-                raise
+        try:
+            sources.extend(Source.from_columns(columns, len(sources_f)))
+        except Exception as e:
+            print(f"Error processing sources file row {len(sources)+1}: {e}")
+            raise
         
         return sources
     
+    @property
+    def _chants_columns(self) -> set[str] | None:
+        """
+        Returns:
+            set: names of chants file columns to be read (None means all)
+        """
+        if self.columns is None:
+            return None
+        return MANDATORY_CHANTS_FIELDS | set(self.columns)
+
+    def _load_chants_parallel(self) -> tuple[list[Chant], set[str]]:
+        """
+        Loads chants from CSV file in self.workers processes.
+        The file is split into byte ranges which are parsed and validated in parallel,
+        their columns are merged in the original order of rows (categorical fields are interned again,
+        so equal values are shared across the shards) and Chant objects are created from them.
+
+        Returns:
+            list: List of Chant objects created from the file
+            set: Set of (srclink, siglum) pairs referred to in the chants
+        """
+        header, shards = split_csv_shards(self.chants_filename, self.workers)
+        header_columns = pd.read_csv(io.BytesIO(header), dtype=str).columns
+        missing_fields = [field for field in MANDATORY_CHANTS_FIELDS if field not in header_columns]
+        if missing_fields:
+            raise ValueError(f"Missing mandatory fields in CSV: {', '.join(missing_fields)}")
+
+        shards_columns = []
+        row_offset = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(_load_chants_shard, self.chants_filename, header, start, end,
+                                       self._chants_columns) 
+                       for start, end in shards]
+            try:
+                for future in futures:
+                    shard = future.result()
+                    if 'missing' in shard:
+                        row, field = shard['missing']
+                        raise ValueError(f"Missing mandatory field '{field}' in chants in row {row_offset+row+1}")
+                    shards_columns.append(shard['columns'])
+                    row_offset += shard['rows']
+            except Exception:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+        if not shards_columns:
+            return ChantTable.from_columns({}, 0) if self.columnar else [], set()
+        columns = {}
+        for field in shards_columns[0]:
+            values = list(chain.from_iterable(shard_columns[field] for shard_columns in shards_columns))
+            columns[field] = intern_values(values) if field in CATEGORICAL_CHANTS_FIELDS else values
+        return self._create_chants(columns, row_offset)
+
+    def _read_sources(self) -> list[Source]:
+        """
+        Loads sources from sources CSV file (if provided).
+
+        Returns:
+            list: List of source records provided as Sources objects.
+        """
+        if self.sources_filename is None:
+            return []
+        try:
+            sources = read_table(self.sources_filename, dtype={'num_century': 'Int64'})
+
+            missing_fields = [field for field in MANDATORY_SOURCES_FIELDS if field not in sources.columns]
+            if missing_fields:
+                raise ValueError(f"Missing mandatory fields in CSV: {', '.join(missing_fields)}")
+
+            return self._load_sources(sources)
+
+        except FileNotFoundError:
+            raise FileNotFoundError(f"CSV file not found: {self.sources_filename}")
+        except Exception as e:
+            raise Exception(f"Error loading CSV {self.sources_filename} file: {e}")
+
     def load(self) -> tuple[list[Chant], list[Source]]:
         """
-        Loads chants and sources from CSV files.
+        Loads chants and sources from CSV (or Parquet / Feather) files.
         Checks for mandatory fields and raises an error if any are missing.
 
         Returns:
@@ -278,13 +704,18 @@ class CsvLoader():
         
         # Chants
         try:
-            chants = pd.read_csv(self.chants_filename, dtype=str)
+            # Byte ranges of compressed file cannot be parsed separately, so it is loaded sequentially
+            if (self.workers is not None and self.workers > 1 and table_format(self.chants_filename) == 'csv'
+                and compression_of(self.chants_filename) is None):
+                chants, chant_sources = self._load_chants_parallel()
+            else:
+                chants = read_table(self.chants_filename, columns=self._chants_columns, dtype=str)
 
-            missing_fields = [field for field in MANDATORY_CHANTS_FIELDS if field not in chants.columns]
-            if missing_fields:
-                raise ValueError(f"Missing mandatory fields in CSV: {', '.join(missing_fields)}")
-            
-            chants, chant_sources = self._load_chants(chants)
+                missing_fields = [field for field in MANDATORY_CHANTS_FIELDS if field not in chants.columns]
+                if missing_fields:
+                    raise ValueError(f"Missing mandatory fields in CSV: {', '.join(missing_fields)}")
+                
+                chants, chant_sources = self._load_chants(chants)
 
         except FileNotFoundError:
             raise FileNotFoundError(f"CSV file not found: {self.chants_filename}")
@@ -292,27 +723,114 @@ class CsvLoader():
             raise Exception(f"Error loading CSV {self.chants_filename} file: {e}")
         
         # Sources
-        if self.sources_filename is not None:
-            try:
-                sources = pd.read_csv(self.sources_filename, dtype={'num_century': 'Int64'})
+        sources = self._read_sources()
+        
+        if self.check_missing_sources:
+            self.check_sources(chant_sources, sources)
+        if self.create_missing_sources:
+            sources = self.add_missing_sources(chant_sources, sources)
 
-                missing_fields = [field for field in MANDATORY_SOURCES_FIELDS if field not in sources.columns]
-                if missing_fields:
-                    raise ValueError(f"Missing mandatory fields in CSV: {', '.join(missing_fields)}")
+        print("Data loaded!")
+        return chants, sources
+
+    def load_delta(self, tombstone_column : str ='deleted') -> tuple[list[Chant], list[str], list[Source], list[str]]:
+        """
+        Loads delta (update) files: records to be inserted or replaced (validated as in load())
+        and tombstones of deleted records (see split_tombstones()).
+
+        Args:
+            tombstone_column (str): name of the column marking deleted records (None means no tombstones)
+
+        Returns:
+            list: chants to be upserted as Chant objects (ChantTable when self.columnar is set)
+            list: chantlinks of deleted chants
+            list: sources to be upserted as Source objects
+            list: srclinks of deleted sources
+        """
+        try:
+            chants_f = read_table(self.chants_filename, dtype=str)
+            chants_f, deleted_chants = split_tombstones(chants_f, 'chantlink', tombstone_column)
+            # delta with tombstones only does not need the other columns
+            missing = find_missing_values(chants_f, MANDATORY_CHANTS_FIELDS) if len(chants_f) > 0 else None
+            if missing is not None:
+                row, field = missing
+                raise ValueError(f"Missing mandatory field '{field}' in chants in row {chants_f.index[row]+1}")
+            if len(chants_f) == 0:
+                chants = ChantTable.from_columns({}, 0) if self.columnar else []
+            else:
+                chants, _ = self._create_chants(chants_columns(chants_f), len(chants_f))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"CSV file not found: {self.chants_filename}")
+        except Exception as e:
+            raise Exception(f"Error loading CSV {self.chants_filename} file: {e}")
+
+        if self.sources_filename is None:
+            return chants, deleted_chants, [], []
+        try:
+            dtype = {'num_century': 'Int64'}
+            if tombstone_column is not None:
+                dtype[tombstone_column] = str
+            sources_f = read_table(self.sources_filename, dtype=dtype)
+            sources_f, deleted_sources = split_tombstones(sources_f, 'srclink', tombstone_column)
+            missing = find_missing_values(sources_f, MANDATORY_SOURCES_FIELDS) if len(sources_f) > 0 else None
+            if missing is not None:
+                row, field = missing
+                raise ValueError(f"Missing mandatory field '{field}' in source in row {sources_f.index[row]+1}")
+            sources = self._load_sources(sources_f) if len(sources_f) > 0 else []
+        except FileNotFoundError:
+            raise FileNotFoundError(f"CSV file not found: {self.sources_filename}")
+        except Exception as e:
+            raise Exception(f"Error loading CSV {self.sources_filename} file: {e}")
+
+        return chants, deleted_chants, sources, deleted_sources
+
+    def iter_chants(self, chunksize : int =10000):
+        """
+        Streams chants from CSV file chunk by chunk, so memory stays bounded by the chunk size.
+        Chants are validated in the same way as in load().
 
-                sources = self._load_sources(sources)
+        Sources file (if provided) is loaded at the beginning, missing sources are checked 
+        for each chunk. After the iteration is finished, sources of all chants are checked at once 
+        (self.sources_report covers the whole file as in load()) and loaded (and possibly created missing) 
+        sources are available in self.streamed_sources.
 
-            except FileNotFoundError:
-                raise FileNotFoundError(f"CSV file not found: {self.sources_filename}")
+        Args:
+            chunksize (int): number of chants file rows read at once
+
+        Yields:
+            Chant: chant records in the order of the chants file
+        """
+        sources = self._read_sources()
+        known_srclinks = {s.srclink for s in sources}
+        # distinct (srclink, siglum) pairs of all chunks, checked at the end as in load()
+        chant_sources = set()
+        self.streamed_sources = None
+
+        row_offset = 0
+        if not os.path.isfile(self.chants_filename):
+            raise FileNotFoundError(f"CSV file not found: {self.chants_filename}")
+        for chunk in iter_table_chunks(self.chants_filename, chunksize, self._chants_columns, dtype=str):
+            try:
+                if row_offset == 0:
+                    missing_fields = [field for field in MANDATORY_CHANTS_FIELDS if field not in chunk.columns]
+                    if missing_fields:
+                        raise ValueError(f"Missing mandatory fields in CSV: {', '.join(missing_fields)}")
+
+                chants, chunk_sources = self._load_chants(chunk, row_offset)
             except Exception as e:
-                raise Exception(f"Error loading CSV {self.sources_filename} file: {e}")       
-        else:
-            sources = []
+                raise Exception(f"Error loading CSV {self.chants_filename} file: {e}")
+            
+            chunk_sources -= chant_sources
+            # missing sources fail the iteration already at the chunk referring to them
+            if self.check_missing_sources and any(srclink not in known_srclinks for srclink, _ in chunk_sources):
+                self.check_sources(chunk_sources, sources)
+            chant_sources |= chunk_sources
+            
+            row_offset += len(chunk)
+            yield from chants
         
         if self.check_missing_sources:
             self.check_sources(chant_sources, sources)
         if self.create_missing_sources:
             sources = self.add_missing_sources(chant_sources, sources)
-
-        print("Data loaded!")
-        return chants, sources
\ No newline at end of file
+        self.streamed_sources = sources
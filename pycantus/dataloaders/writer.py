@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+This module contains functions for buffered export of chants and sources to CSV files.
+
+Rows are formatted according to RFC 4180 (the same output as excel dialect of csv module):
+values containing comma, quote or line break are enclosed in quotes, quotes inside them are doubled
+and records end with CRLF. Rows are formatted column by column in batches, a column without
+any special character (most of them, e.g. cantus_id or folio) is written without checking its values
+one by one, and each batch is written to the (possibly compressed) file by one write.
+Chants (or sources) may be given by any iterable, e.g. generator of iter_dataset,
+so a dataset can be exported without being loaded as a whole.
+"""
+from itertools import islice
+from operator import attrgetter
+
+from pycantus.dataloaders.compression import open_text
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+DEFAULT_BATCH_SIZE = 10000
+LINE_TERMINATOR = '\r\n'
+SPECIAL_CHARACTERS = (',', '"', '\r', '\n')
+
+
+def escape_csv_value(value) -> str:
+    """
+    Converts value to CSV field, None is written as empty value.
+    Value containing comma, quote or line break is enclosed in quotes and its quotes are doubled.
+    """
+    if value is None:
+        return ''
+    value = str(value)
+    if ',' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def format_csv_row(values) -> str:
+    """
+    Formats values as one CSV record (without line terminator), None is written as empty value.
+
+    Args:
+        values (iterable): values of the record
+
+    Returns:
+        str: RFC 4180 formatted record
+    """
+    return ','.join(map(escape_csv_value, values))
+
+
+def format_csv_column(values : list) -> list[str]:
+    """
+    Converts values of one column to CSV fields (see escape_csv_value()).
+    Values are checked one by one only if some of them contains special character.
+
+    Args:
+        values (list): values of one column
+
+    Returns:
+        list: CSV fields
+    """
+    fields = [value if type(value) is str else '' if value is None else str(value) for value in values]
+    joined = '\0'.join(fields)
+    if any(character in joined for character in SPECIAL_CHARACTERS):
+        fields = [escape_csv_value(field) for field in fields]
+    return fields
+
+
+def write_csv(filename : str, fields : list[str], columns_batches) -> int:
+    """
+    Writes header and rows to the CSV file, compressed on the fly if the path ends with .gz, .bz2, .xz or .zst.
+
+    Args:
+        filename (str): path to the output file
+        fields (list): names of the columns (header)
+        columns_batches (iterable): batches of rows, each batch is a list of columns (lists of values in the order of fields)
+
+    Returns:
+        int: number of written rows (without header)
+    """
+    written = 0
+    # newline='' keeps CRLF line terminators (no translation), each batch is written by one write
+    with open_text(filename, 'w', newline='') as f:
+        f.write(format_csv_row(fields) + LINE_TERMINATOR)
+        for columns in columns_batches:
+            rows = list(map(','.join, zip(*map(format_csv_column, columns))))
+            if rows:
+                f.write(LINE_TERMINATOR.join(rows) + LINE_TERMINATOR)
+                written += len(rows)
+    return written
+
+
+def records_batches(records, fields : list[str], batch_size : int =DEFAULT_BATCH_SIZE):
+    """
+    Generates batches of field values of records (e.g. chants or sources) column by column.
+    Columnar chants (ChantTable) are read directly from the table columns, without creating row views.
+
+    Args:
+        records (iterable): objects having fields as attributes (list, generator) or ChantTable
+        fields (list): names of exported fields
+        batch_size (int): number of records in one batch
+
+    Yields:
+        list: one list of values per field
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive.")
+    if getattr(records, 'columnar', False):
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            yield [batch.column(field).tolist() for field in fields]
+        return
+    getters = [attrgetter(field) for field in fields]
+    records = iter(records)
+    while batch := list(islice(records, batch_size)):
+        yield [list(map(getter, batch)) for getter in getters]
+
+
+def write_chants_csv(filename : str, chants, batch_size : int =DEFAULT_BATCH_SIZE) -> int:
+    """
+    Exports chants to the CSV file in the standard format (see Chant.header()).
+
+    Args:
+        filename (str): path to the output file
+        chants (iterable): Chant objects (list, generator, e.g. of iter_dataset) or ChantTable
+        batch_size (int): number of rows written to the file at once
+
+    Returns:
+        int: number of exported chants
+    """
+    from pycantus.models.chant import EXPORT_CHANTS_FIELDS
+    return write_csv(filename, EXPORT_CHANTS_FIELDS, records_batches(chants, EXPORT_CHANTS_FIELDS, batch_size))
+
+
+def write_sources_csv(filename : str, sources, batch_size : int =DEFAULT_BATCH_SIZE) -> int:
+    """
+    Exports sources to the CSV file in the standard format (see Source.header()).
+
+    Args:
+        filename (str): path to the output file
+        sources (iterable): Source objects
+        batch_size (int): number of rows written to the file at once
+
+    Returns:
+        int: number of exported sources
+    """
+    from pycantus.models.source import EXPORT_SOURCES_FIELDS
+    return write_csv(filename, EXPORT_SOURCES_FIELDS, records_batches(sources, EXPORT_SOURCES_FIELDS, batch_size))
@@ -1,2 +1,3 @@
 #!/usr/bin/env python
-from .filter import Filter
\ No newline at end of file
+from .filter import Filter
+from .expression import And, Or, Not, IsIn, Range, Prefix, Regex, IsNull
\ No newline at end of file
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+"""
+This module contains the CompiledFilter class, a Filter prepared for application (see Filter.compile()).
+
+Values of each field are turned into frozensets and include and exclude values of the field are fused
+into one check (values to be kept, or values to be dropped when the field has exclude values only),
+so a record is tested by one hash lookup per field, no matter how long the lists of values are.
+Chants and sources are evaluated into boolean masks: column-wise stored chants (ChantTable) by vectorized
+membership tests of whole columns, Chant and Source objects in one pass per check over the records still kept.
+Expression of the filter (see pycantus.filtration.expression) is evaluated into one mask as well,
+each condition tests every distinct value of its field once and the results are mapped to records by codes
+of the values, so the whole expression costs one vectorized evaluation instead of one filtered copy per condition.
+"""
+from itertools import compress
+from operator import attrgetter
+
+import numpy as np
+
+from pycantus.filtration.expression import Expression, Not, Condition
+from pycantus.models.chant import EXPORT_CHANTS_FIELDS
+from pycantus.models.chant_table import factorize_records, object_array
+from pycantus.models.groupby import source_values
+from pycantus.models.source import EXPORT_SOURCES_FIELDS
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+def fuse_values(include : list, exclude : list) -> tuple[frozenset, bool] | None:
+    """
+    Fuses include and exclude values of one field into one membership check.
+
+    Returns:
+        tuple: (values, True) when only the values pass, (values, False) when the values are dropped,
+               None when the field is not restricted
+    """
+    include = frozenset(include or ())
+    exclude = frozenset(exclude or ())
+    if include:
+        return include - exclude, True
+    if exclude:
+        return exclude, False
+    return None
+
+
+def member_mask(records, field : str, values : frozenset) -> np.ndarray:
+    """
+    Tests whether value of the field of each record is in values.
+
+    Args:
+        records (list): Chant or Source objects (or ChantTable)
+        field (str): tested field
+        values (frozenset): tested values
+
+    Returns:
+        np.ndarray: boolean mask of records
+    """
+    if getattr(records, 'columnar', False):
+        return records.isin(field, values)
+    return np.fromiter(map(values.__contains__, map(attrgetter(field), records)), dtype=bool, count=len(records))
+
+
+def take_rows(records, rows : np.ndarray | None):
+    """
+    Selects records by their sorted rows, None selects all records (they are returned as they are).
+
+    Returns:
+        list: selected Chant or Source objects (ChantTable for ChantTable)
+    """
+    if rows is None:
+        return records
+    if getattr(records, 'columnar', False):
+        return records.take(rows)
+    # rows are sorted, compress by their mask is faster than indexing the list row by row
+    mask = np.zeros(len(records), dtype=bool)
+    mask[rows] = True
+    return list(compress(records, mask))
+
+
+class ExpressionEvaluator():
+    """
+    Evaluates expressions on chants (with values of source fields taken from their sources)
+    or on sources (when all conditions test source fields).
+    Codes of values of each field are computed once and shared by all conditions testing the field.
+
+    Attributes:
+        records (list): evaluated Chant or Source objects (or ChantTable)
+        sources (list): sources of evaluated chants, None when the records are sources
+    """
+    def __init__(self, records, sources : list =None):
+        """
+        Initialize the ExpressionEvaluator.
+        Args corresponds to class attributes.
+        """
+        self.records = records
+        self.sources = sources
+        self._encoded = {}
+
+    def encoded(self, condition : Condition) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            np.ndarray: code of the value of the field of each record (-1 for None)
+            np.ndarray: values of the codes followed by None
+        """
+        key = (condition.kind, condition.name)
+        if key not in self._encoded:
+            if self.sources is None or condition.kind == 'chant':
+                codes, uniques = factorize_records(self.records, condition.name)
+            else:
+                # values of source fields are looked up once for each distinct srclink of chants
+                codes, srclinks = factorize_records(self.records, 'srclink')
+                uniques = source_values(self.sources, srclinks, condition.name)
+            self._encoded[key] = (codes, object_array(uniques.tolist() + [None]))
+        return self._encoded[key]
+
+    def evaluate(self, expression : Expression) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: boolean mask of records satisfying the expression
+        """
+        if isinstance(expression, Condition):
+            codes, values = self.encoded(expression)
+            results = np.fromiter(expression.test(values.tolist()), dtype=bool, count=len(values))
+            return results[codes]
+        if isinstance(expression, Not):
+            return ~self.evaluate(expression.operand)
+        masks = map(self.evaluate, expression.operands)
+        mask = next(masks).copy()
+        for operand_mask in masks:
+            if expression.operator == 'and':
+                mask &= operand_mask
+            else:
+                mask |= operand_mask
+        return mask
+
+
+class CompiledFilter():
+    """
+    Filter prepared for application, created by Filter.compile().
+
+    Attributes:
+        fields (set): all fields restricted by the filter
+        source_checks (list): (field, frozenset of values, True if the values pass / False if they are dropped) for sources
+        chant_checks (list): the same for chants, checks with values to be kept go first (they usually drop the most)
+        source_expression (Expression): expression testing only source fields, evaluated on sources
+        chant_expression (Expression): expression testing chant fields, evaluated on chants (source fields via their sources)
+    """
+    def __init__(self, filters_include : dict, filters_exclude : dict, expression : Expression =None):
+        """
+        Initialize the CompiledFilter from include and exclude values and expression of Filter.
+        """
+        self.fields = set(filters_include.keys()).union(filters_exclude.keys())
+        self.source_expression = None
+        self.chant_expression = None
+        if expression is not None:
+            self.fields |= expression.fields()
+            if all(condition.kind == 'source' for condition in expression.conditions()):
+                self.source_expression = expression
+            else:
+                self.chant_expression = expression
+        self.source_checks = []
+        self.chant_checks = []
+        for field in sorted(self.fields):
+            check = fuse_values(filters_include.get(field), filters_exclude.get(field))
+            if check is None:
+                continue
+            if field in EXPORT_SOURCES_FIELDS:
+                self.source_checks.append((field, *check))
+            if field in EXPORT_CHANTS_FIELDS:
+                self.chant_checks.append((field, *check))
+        self.source_checks.sort(key=lambda check: not check[2])
+        self.chant_checks.sort(key=lambda check: not check[2])
+
+    @staticmethod
+    def evaluate(records, checks : list, keep : np.ndarray =None) -> np.ndarray:
+        """
+        Evaluates the checks on the records, each check tests only records passing the previous ones.
+
+        Args:
+            records (list): Chant or Source objects (or ChantTable)
+            checks (list): checks of the records (see class attributes)
+            keep (np.ndarray): mask of records already passing other conditions (e.g. expression), all records if None
+
+        Returns:
+            np.ndarray: boolean mask of records passing all checks
+        """
+        keep = np.ones(len(records), dtype=bool) if keep is None else keep
+        columnar = getattr(records, 'columnar', False)
+        for field, values, passing in checks:
+            if columnar:
+                member = records.isin(field, values)
+                keep &= member if passing else ~member
+            else:
+                kept = list(compress(records, keep))
+                member = member_mask(kept, field, values)
+                keep[keep] = member if passing else ~member
+        return keep
+
+    def chant_checks_without(self, discarded_srclinks : set) -> list:
+        """
+        Returns chant checks extended by dropping chants of discarded sources (fused with check of srclink).
+        """
+        if not discarded_srclinks:
+            return self.chant_checks
+        checks = [check for check in self.chant_checks if check[0] != 'srclink']
+        srclink_check = next((check for check in self.chant_checks if check[0] == 'srclink'), None)
+        if srclink_check is not None and srclink_check[2]:
+            checks.insert(0, ('srclink', srclink_check[1] - discarded_srclinks, True))
+        else:
+            dropped = srclink_check[1] if srclink_check is not None else frozenset()
+            checks.append(('srclink', dropped | frozenset(discarded_srclinks), False))
+        return checks
+
+    def sources_mask(self, sources : list) -> np.ndarray | None:
+        """
+        Evaluates the filter on sources.
+
+        Returns:
+            np.ndarray: mask of kept sources (None when sources are not restricted)
+        """
+        if not self.source_checks and self.source_expression is None:
+            return None
+        sources_mask = None
+        if self.source_expression is not None:
+            sources_mask = ExpressionEvaluator(sources).evaluate(self.source_expression)
+        return self.evaluate(sources, self.source_checks, sources_mask)
+
+    def masks(self, chants, sources : list) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """
+        Evaluates the filter on chants and sources.
+
+        Returns:
+            np.ndarray: mask of kept chants (None when chants are not restricted)
+            np.ndarray: mask of kept sources (None when sources are not restricted)
+        """
+        sources_mask = self.sources_mask(sources)
+        discarded_srclinks = set()
+        if sources_mask is not None:
+            # chants of dropped sources are dropped as well
+            discarded_srclinks = {source.srclink for source in compress(sources, ~sources_mask)}
+        chant_checks = self.chant_checks_without(discarded_srclinks)
+        chants_mask = None
+        if self.chant_expression is not None:
+            chants_mask = ExpressionEvaluator(chants, sources).evaluate(self.chant_expression)
+        if chant_checks:
+            chants_mask = self.evaluate(chants, chant_checks, chants_mask)
+        return chants_mask, sources_mask
+
+    def rows(self, chants, sources : list) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """
+        Evaluates the filter on chants and sources.
+
+        Returns:
+            np.ndarray: sorted rows of kept chants (None when chants are not restricted)
+            np.ndarray: sorted rows of kept sources (None when sources are not restricted)
+        """
+        return tuple(None if mask is None else np.flatnonzero(mask) for mask in self.masks(chants, sources))
+
+    def apply(self, chants, sources : list) -> tuple[list]:
+        """
+        Applies the filter (see Filter.apply()), unrestricted lists are returned as they are.
+
+        Returns:
+            list: Reduced list of chants after filtration (ChantTable for ChantTable).
+            list: Reduced list of sources after filtration.
+        """
+        chants_mask, sources_mask = self.masks(chants, sources)
+        if sources_mask is not None:
+            sources = list(compress(sources, sources_mask))
+        if chants_mask is not None:
+            chants = chants.take(chants_mask) if getattr(chants, 'columnar', False) else list(compress(chants, chants_mask))
+        return chants, sources
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+"""
+This module contains classes of Filter expressions, boolean conditions over chant and source fields.
+
+Conditions (IsIn, Range, Prefix, Regex, IsNull) test values of one field and they are combined
+by And, Or and Not (also by operators &, | and ~), e.g.
+(IsIn('genre', ['A', 'R']) & Range('numeric_century', 11, 13) & Regex('incipit', '^Ave')).
+Fields present only in sources (e.g. provenance, numeric_century) and fields prefixed by 'source.'
+are taken from the source of the chant (see pycantus.models.source.resolve_field()).
+
+Each expression is converted to a plain dict (to_dict(), from_dict()), so it is stored with the Filter
+in its YAML representation. Expressions are evaluated by CompiledFilter (see pycantus.filtration.compiled).
+Each condition is tested once for each distinct value of its field, so it costs one vectorized pass over chants.
+"""
+import re
+
+from pycantus.dataloaders.interning import intern_values
+from pycantus.models.source import resolve_field
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+class Expression():
+    """
+    Base class of Filter expressions.
+    """
+    def __and__(self, other : 'Expression') -> 'And':
+        return And(self, other)
+
+    def __or__(self, other : 'Expression') -> 'Or':
+        return Or(self, other)
+
+    def __invert__(self) -> 'Not':
+        return Not(self)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Expression) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()})"
+
+    def fields(self) -> set[str]:
+        """
+        Returns:
+            set: all fields tested by the expression
+        """
+        raise NotImplementedError
+
+    def conditions(self) -> list['Condition']:
+        """
+        Returns:
+            list: all conditions of the expression
+        """
+        raise NotImplementedError
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: plain representation of the expression, e.g. { 'and' : [ { 'in' : { 'field' : 'genre', 'values' : ['A'] } } ] }
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def from_dict(data : dict) -> 'Expression':
+        """
+        Creates expression from its plain representation (see to_dict()).
+        """
+        if not isinstance(data, dict) or len(data) != 1:
+            raise ValueError(f"Expression has to be a dict with one operator, got {data!r}.")
+        operator, arguments = next(iter(data.items()))
+        if operator in ('and', 'or'):
+            return OPERATORS[operator](*(Expression.from_dict(operand) for operand in arguments))
+        if operator == 'not':
+            return Not(Expression.from_dict(arguments))
+        if operator in OPERATORS:
+            return OPERATORS[operator](**arguments)
+        raise ValueError(f"Unknown expression operator '{operator}', expected one of {list(OPERATORS)}.")
+
+
+class And(Expression):
+    """
+    Expression satisfied when all operands are satisfied.
+
+    Attributes:
+        operands (tuple): combined expressions
+    """
+    operator = 'and'
+
+    def __init__(self, *operands : Expression):
+        if not operands:
+            raise ValueError(f"'{self.operator}' needs at least one operand.")
+        for operand in operands:
+            if not isinstance(operand, Expression):
+                raise TypeError(f"Operand of '{self.operator}' has to be an Expression, got {operand!r}.")
+        # nested operators of the same kind are flattened, e.g. a & b & c is one And of three operands
+        self.operands = tuple(nested for operand in operands
+                              for nested in (operand.operands if type(operand) is type(self) else (operand,)))
+
+    def fields(self) -> set[str]:
+        return set().union(*(operand.fields() for operand in self.operands))
+
+    def conditions(self) -> list['Condition']:
+        return [condition for operand in self.operands for condition in operand.conditions()]
+
+    def to_dict(self) -> dict:
+        return {self.operator : [operand.to_dict() for operand in self.operands]}
+
+
+class Or(And):
+    """
+    Expression satisfied when at least one operand is satisfied.
+
+    Attributes:
+        operands (tuple): combined expressions
+    """
+    operator = 'or'
+
+
+class Not(Expression):
+    """
+    Expression satisfied when its operand is not satisfied.
+
+    Attributes:
+        operand (Expression): negated expression
+    """
+    def __init__(self, operand : Expression):
+        if not isinstance(operand, Expression):
+            raise TypeError(f"Operand of 'not' has to be an Expression, got {operand!r}.")
+        self.operand = operand
+
+    def fields(self) -> set[str]:
+        return self.operand.fields()
+
+    def conditions(self) -> list['Condition']:
+        return self.operand.conditions()
+
+    def to_dict(self) -> dict:
+        return {'not' : self.operand.to_dict()}
+
+
+class Condition(Expression):
+    """
+    Base class of conditions on values of one field.
+
+    Attributes:
+        field (str): tested field, chant field or source field (see pycantus.models.source.resolve_field())
+        kind (str): 'chant' or 'source', records having the field
+        name (str): name of the field in the records
+    """
+    operator = None
+
+    def __init__(self, field : str):
+        self.field = field
+        self.kind, self.name = resolve_field(field)
+
+    def fields(self) -> set[str]:
+        return {self.field}
+
+    def conditions(self) -> list['Condition']:
+        return [self]
+
+    def arguments(self) -> dict:
+        """
+        Returns:
+            dict: arguments of the condition other than field
+        """
+        return {}
+
+    def to_dict(self) -> dict:
+        return {self.operator : {'field' : self.field, **self.arguments()}}
+
+    def test(self, values : list) -> list[bool]:
+        """
+        Tests the condition on values of the field (each distinct value is tested once, see CompiledFilter).
+
+        Args:
+            values (list): values of the field (None for missing values)
+
+        Returns:
+            list: result for each value
+        """
+        raise NotImplementedError
+
+
+class IsIn(Condition):
+    """
+    Condition satisfied when value of the field is one of the values.
+    """
+    operator = 'in'
+
+    def __init__(self, field : str, values : list[str] | list[int] | int | str):
+        super().__init__(field)
+        if not isinstance(values, list):
+            values = [values]
+        # values are interned as in Filter.add_value_include
+        self.values = intern_values(list(dict.fromkeys(values)))
+
+    def arguments(self) -> dict:
+        return {'values' : list(self.values)}
+
+    def test(self, values : list) -> list[bool]:
+        member = frozenset(self.values)
+        return [value in member for value in values]
+
+
+class Range(Condition):
+    """
+    Condition satisfied when numeric value of the field is between min and max (both inclusive).
+    Values which are not numbers (or numeric strings, e.g. '12') never satisfy it.
+
+    Attributes:
+        min (int | float): lower bound, None for no lower bound
+        max (int | float): upper bound, None for no upper bound
+    """
+    operator = 'range'
+
+    def __init__(self, field : str, min : int | float =None, max : int | float =None):
+        super().__init__(field)
+        if min is None and max is None:
+            raise ValueError(f"Range of field '{field}' needs min or max.")
+        self.min = min
+        self.max = max
+
+    def arguments(self) -> dict:
+        return {'min' : self.min, 'max' : self.max}
+
+    def test(self, values : list) -> list[bool]:
+        results = []
+        for value in values:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                results.append(False)
+                continue
+            results.append((self.min is None or number >= self.min) and (self.max is None or number <= self.max))
+        return results
+
+
+class Prefix(Condition):
+    """
+    Condition satisfied when string value of the field starts with the prefix.
+    """
+    operator = 'prefix'
+
+    def __init__(self, field : str, prefix : str):
+        super().__init__(field)
+        self.prefix = prefix
+
+    def arguments(self) -> dict:
+        return {'prefix' : self.prefix}
+
+    def test(self, values : list) -> list[bool]:
+        return [isinstance(value, str) and value.startswith(self.prefix) for value in values]
+
+
+class Regex(Condition):
+    """
+    Condition satisfied when the regular expression matches a part of string value of the field (re.search).
+    """
+    operator = 'regex'
+
+    def __init__(self, field : str, pattern : str):
+        super().__init__(field)
+        try:
+            self._compiled = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression '{pattern}' for field '{field}': {e}")
+        self.pattern = pattern
+
+    def arguments(self) -> dict:
+        return {'pattern' : self.pattern}
+
+    def test(self, values : list) -> list[bool]:
+        search = self._compiled.search
+        return [isinstance(value, str) and search(value) is not None for value in values]
+
+
+class IsNull(Condition):
+    """
+    Condition satisfied when value of the field is missing (None), use Not(IsNull(field)) for present values.
+    """
+    operator = 'null'
+
+    def test(self, values : list) -> list[bool]:
+        return [value is None or value != value for value in values] # value != value for NaN
+
+
+OPERATORS = {'and' : And, 'or' : Or, 'not' : Not, 'in' : IsIn, 'range' : Range,
+             'prefix' : Prefix, 'regex' : Regex, 'null' : IsNull}
@@ -3,18 +3,31 @@
 This module defines the base class for filters used in the PyCantus library.
 It provides a structure for creating and applying filters to chant data.
 """
-import yaml
 import os
 
 from collections import defaultdict
 from pycantus.models.source import EXPORT_SOURCES_FIELDS
 from pycantus.models.chant import EXPORT_CHANTS_FIELDS
+from pycantus.dataloaders.interning import intern_values
+from pycantus.filtration.expression import Expression, And
 
 __version__ = "1.0.0"
 __author__ = "Anna Dvorakova"
 
 
 
+def canonical_expression(expression):
+    """
+    Returns plain representation of expression (see Expression.to_dict()) with values of 'in' conditions sorted.
+    """
+    if isinstance(expression, dict):
+        return {key : sorted(value, key=repr) if key == 'values' else canonical_expression(value)
+                for key, value in expression.items()}
+    if isinstance(expression, list):
+        return [canonical_expression(operand) for operand in expression]
+    return expression
+
+
 class Filter:
     """
     Base class for filters over Corpus data lists:
@@ -25,6 +38,8 @@ class Filter:
         name (str): Name of the filter, used in export.
         filters_include (defaultdict(list)): { Data fields : Values to be included after filtration }
         filters_exclude (defaultdict(list)): { Data fields : Values to be excluded after filtration }
+        expression (Expression): Condition combined by AND with include and exclude values (None if not used),
+                                 see pycantus.filtration.expression
     """
 
     def __init__(self, name: str):
@@ -37,6 +52,7 @@ class Filter:
         self.name = name
         self.filters_include = defaultdict(list)
         self.filters_exclude = defaultdict(list)
+        self.expression = None
     
     def add_value_include(self, field : str, values : list[str] | list[int] | int | str):
         """
@@ -54,7 +70,8 @@ class Filter:
             raise ValueError(f"Field '{field}' is not a valid chant or source field.")
 
         self.filters_include[field] += values
-        self.filters_include[field] = list(set(self.filters_include[field])) # discard duplicates
+        # discard duplicates, values are interned as loaded categorical fields (so they are compared by identity)
+        self.filters_include[field] = intern_values(list(set(self.filters_include[field])))
             
     def add_value_exclude(self, field : str, values : list[str] | list[int] | int | str):
         """
@@ -73,91 +90,104 @@ class Filter:
             raise ValueError(f"Field '{field}' is not a valid chant or source field.")
 
         self.filters_exclude[field] += values
-        self.filters_exclude[field] = list(set(self.filters_exclude[field])) # discard duplicates
+        # discard duplicates, values are interned as loaded categorical fields (so they are compared by identity)
+        self.filters_exclude[field] = intern_values(list(set(self.filters_exclude[field])))
 
     
-    def apply(self, chants : list, sources : list) -> tuple[list]:
+    def add_expression(self, expression : Expression):
+        """
+        Add an expression (conditions combined by AND, OR and NOT, e.g. numeric ranges, prefix and regex matches,
+        null checks) to the filter, it is combined by AND with previously added expression.
+        Expressions testing only source fields (e.g. provenance, numeric_century) filter sources
+        and chants of dropped sources, other expressions filter chants (source fields are taken from their sources).
+
+        Args:
+            expression (Expression): e.g. IsIn('genre', ['A', 'R']) & Range('numeric_century', 11, 13)
+        """
+        if not isinstance(expression, Expression):
+            raise TypeError(f"Expression has to be an Expression, got {expression!r}.")
+        self.expression = expression if self.expression is None else And(self.expression, expression)
+
+    def compile(self) -> 'CompiledFilter':
+        """
+        Compiles the current filter values into an optimized predicate (see pycantus.filtration.compiled).
+        Values are turned into frozensets and include and exclude values of each field are fused into one check,
+        so cost of the filtration does not depend on the number of values (e.g. hundreds of Cantus IDs).
+
+        Returns:
+            CompiledFilter: filter prepared for application
+        """
+        from pycantus.filtration.compiled import CompiledFilter # imported lazily, it needs NumPy
+        return CompiledFilter(self.filters_include, self.filters_exclude, self.expression)
+
+    def apply(self, chants : list, sources : list, postings=None) -> tuple[list]:
         """
         Apply the filter to the given data.
         If no values for field are specified we expect that user does not care about the field.
         If no filter is to be applied, returns the original lists.
+        Sources not passing the filter discard also their chants.
+        The filter is compiled (see compile()) on each application, so changed values are always taken into account.
+        When posting lists of chants are available, selective filters are answered by their intersection
+        instead of a scan of all chants (see pycantus.filtration.planner).
         Method should not be called directly, but through Corpus.apply_filter() method.
 
         Args:
-            chants (list): List of chants from the Corpus to be filtered.
+            chants (list): List of chants from the Corpus to be filtered (or ChantTable).
             source (list): List of sources from the Corpus to be filtered.
+            postings (callable, optional): postings(field) returns RowIndex of chants by the field (see Corpus._postings())
 
         Returns:
             list: Reduced list of chants after filtration.
             list: Reduced list of sources after filtration.
 
         """
-        # Collect all fields that need filtering (both include and exclude)
-        filter_fields = set(self.filters_include.keys()).union(self.filters_exclude.keys())
-
-        if len(filter_fields) == 0:
+        compiled = self.compile()
+        if len(compiled.fields) == 0:
             print("No filtering applied because no filtration values were present, returning original lists.")
             return chants, sources
-        
-        # Sources
-        filtered_sources= []
-        discarded_srclinks = set() # keep track of srclinks for excluded sources
-        source_filter_fields = set(EXPORT_SOURCES_FIELDS).intersection(filter_fields)
-        if source_filter_fields:
-            # Iterate through all sources and check if they pass include/exclude rules
-            for source in sources:
-                # Pass if either no include filter defined (first two parts of expression) OR value is in include list
-                include_pass = all(
-                    field not in self.filters_include or not self.filters_include[field] or
-                    getattr(source, field, None) in self.filters_include[field]
-                    for field in source_filter_fields
-                )
-                # Pass if either no exclude filter defined (first two parts of expression) OR value is NOT in exclude list
-                exclude_pass = all(
-                    field not in self.filters_exclude or not self.filters_exclude[field] or
-                    getattr(source, field, None) not in self.filters_exclude[field]
-                    for field in source_filter_fields
-                )
-                # Keep source if it passes both include and exclude checks
-                if include_pass and exclude_pass:
-                    filtered_sources.append(source)
-                else:
-                    # Otherwise, mark its srclink to filter out chants from that source
-                    discarded_srclinks.add(source.srclink)
-
-            sources = filtered_sources    
-            
-        # Chants
-        filtered_chants = []
-
-        # Limit filtering to only those fields relevant for chants
-        chants_filter_fields = set(EXPORT_CHANTS_FIELDS).intersection(filter_fields)
-
-        # Apply chant filtering if there are relevant fields OR discarded sources
-        if chants_filter_fields or discarded_srclinks:
-            for chant in chants:
-                # Skip chant if its source was discarded earlier -> it will discard it
-                if chant.srclink in discarded_srclinks:
-                    continue
-                # Pass if no include filter for field (first two parts of expression) OR value is in include list
-                include_pass = all(
-                    field not in self.filters_include or not self.filters_include[field] or
-                    getattr(chant, field, None) in self.filters_include[field]
-                    for field in chants_filter_fields
-                )
-                # Pass if no exclude filter for field (first two parts of expression) OR value is NOT in exclude list
-                exclude_pass = all(
-                    field not in self.filters_exclude or not self.filters_exclude[field] or
-                    getattr(chant, field, None) not in self.filters_exclude[field]
-                    for field in chants_filter_fields
-                )
-                # Keep chant if it passes both include and exclude checks
-                if include_pass and exclude_pass:
-                    filtered_chants.append(chant)
-
-            chants = filtered_chants
-
-        return chants, sources
+        if postings is not None:
+            from pycantus.filtration.planner import QueryPlanner # imported lazily, it needs NumPy
+            return QueryPlanner(chants, sources, postings).apply(compiled)
+        return compiled.apply(chants, sources)
+
+    def select(self, chants : list, sources : list, postings=None) -> tuple:
+        """
+        Evaluates the filter on the given data without creating the reduced lists (see apply()).
+
+        Args:
+            chants (list): List of chants to be filtered (or ChantTable).
+            sources (list): List of sources to be filtered.
+            postings (callable, optional): postings(field) returns RowIndex of chants by the field (see Corpus._postings())
+
+        Returns:
+            np.ndarray: sorted rows of kept chants (None when chants are not restricted)
+            np.ndarray: sorted rows of kept sources (None when sources are not restricted)
+        """
+        compiled = self.compile()
+        if postings is not None:
+            from pycantus.filtration.planner import QueryPlanner
+            return QueryPlanner(chants, sources, postings).rows(compiled)
+        return compiled.rows(chants, sources)
+
+    def canonical_hash(self) -> str:
+        """
+        Returns SHA-256 hash of the canonical form of the filter configuration (as_yaml()),
+        used as key of cached filter results. Name of the filter and fields without values are left out
+        and values are sorted, so filters selecting the same data by the same values have the same hash.
+
+        Returns:
+            str: hexadecimal digest
+        """
+        import hashlib
+        import json
+        import yaml
+        setting = yaml.safe_load(self.as_yaml())
+        canonical = {
+            'include_values' : {field : sorted(values, key=repr) for field, values in setting['include_values'].items() if values},
+            'exclude_values' : {field : sorted(values, key=repr) for field, values in setting['exclude_values'].items() if values},
+            'expression' : canonical_expression(setting.get('expression'))
+        }
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
 
     def delete_field(self, field):
         """
@@ -178,6 +208,9 @@ class Filter:
             'include_values' : dict(self.filters_include),
             'exclude_values' : dict(self.filters_exclude)
         }
+        if self.expression is not None:
+            setting['expression'] = self.expression.to_dict()
+        import yaml # imported lazily to keep import of pycantus fast
         return yaml.dump(setting, allow_unicode=True, sort_keys=False)
     
     def __str__(self) -> str:
@@ -216,11 +249,16 @@ class Filter:
         Args:
             config_file_path (str): Path to YAML to be loaded into filter configuration.
         """
+        import yaml
         try:
             with open(config_file_path, 'r') as f:
                 yaml_content = yaml.safe_load(f)
-            self.filters_include = defaultdict(list, yaml_content['include_values'])
-            self.filters_exclude = defaultdict(list, yaml_content['exclude_values'])
+            self.filters_include = defaultdict(list, {field : intern_values(values) 
+                                                      for field, values in yaml_content['include_values'].items()})
+            self.filters_exclude = defaultdict(list, {field : intern_values(values) 
+                                                      for field, values in yaml_content['exclude_values'].items()})
+            expression = yaml_content.get('expression')
+            self.expression = Expression.from_dict(expression) if expression else None
         except:
             raise IOError(f"Filter configuration file on path {config_file_path} load failed!")
 
@@ -232,9 +270,14 @@ class Filter:
         Args:
             yaml_string (str): YAML style string to be loaded into filter configuration.
         """
+        import yaml
         try:
             yaml_content = yaml.safe_load(yaml_string)
-            self.filters_include = defaultdict(list, yaml_content['include_values'])
-            self.filters_exclude = defaultdict(list, yaml_content['exclude_values'])
+            self.filters_include = defaultdict(list, {field : intern_values(values) 
+                                                      for field, values in yaml_content['include_values'].items()})
+            self.filters_exclude = defaultdict(list, {field : intern_values(values) 
+                                                      for field, values in yaml_content['exclude_values'].items()})
+            expression = yaml_content.get('expression')
+            self.expression = Expression.from_dict(expression) if expression else None
         except:
             raise ValueError("Filter configuration string load failed!")
\ No newline at end of file
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+This module contains the QueryPlanner class, which decides how a compiled Filter is executed on a Corpus.
+
+Conditions selecting values of a chant field (include values of Filter, IsIn conditions of its expression
+combined by AND) can be answered by posting lists: sorted rows of chants having each value
+(see pycantus.models.chant_table.RowIndex). Conditions on source fields (e.g. provenance, numeric_century)
+are pushed down to sources first and turned into a set of srclinks, so they are answered by the posting lists
+of srclink as well. Number of rows of a lookup is known from the posting lists, so the planner estimates
+selectivity of each lookup and intersects the posting lists of selective ones instead of scanning all chants.
+Only the candidate rows are then evaluated by CompiledFilter, for the remaining conditions.
+When no lookup is selective enough, chants are scanned (CompiledFilter.apply()).
+"""
+from itertools import compress
+
+import numpy as np
+
+from pycantus.filtration.compiled import take_rows
+from pycantus.filtration.expression import Condition, IsIn
+from pycantus.models.chant_table import object_array
+from pycantus.models.groupby import source_values
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+# Posting lists are used when they select at most this fraction of chants
+INDEX_SELECTIVITY = 0.05
+
+
+class QueryPlan():
+    """
+    Execution plan of a compiled filter.
+
+    Attributes:
+        strategy (str): 'index' (intersection of posting lists) or 'scan' (evaluation of all chants)
+        lookups (list): (field, values, estimated rows) of all possible lookups, the most selective first
+        used (list): lookups whose posting lists are intersected (empty for scan)
+        total_rows (int): number of chants
+    """
+    def __init__(self, strategy : str, lookups : list, used : list, total_rows : int):
+        """
+        Initialize the QueryPlan.
+        Args corresponds to class attributes.
+        """
+        self.strategy = strategy
+        self.lookups = lookups
+        self.used = used
+        self.total_rows = total_rows
+
+    @property
+    def estimated_rows(self) -> int:
+        """
+        Upper estimate of number of candidate chants.
+        """
+        return min((rows for _, _, rows in self.used), default=self.total_rows)
+
+    def __str__(self) -> str:
+        if self.strategy == 'scan':
+            return f"scan of {self.total_rows} chants"
+        used = ', '.join(f"{field} ({len(values)} values, {rows} rows)" for field, values, rows in self.used)
+        return f"index lookup of {used} of {self.total_rows} chants"
+
+
+class QueryPlanner():
+    """
+    Plans and executes compiled filters on chants and sources using posting lists of chant fields.
+
+    Attributes:
+        chants (list): Chant objects (or ChantTable)
+        sources (list): Source objects
+        postings (callable): postings(field) returns RowIndex of chants by the field (built and cached by Corpus)
+        selectivity (float): maximal estimated fraction of chants for which posting lists are used
+    """
+    def __init__(self, chants, sources : list, postings, selectivity : float =INDEX_SELECTIVITY):
+        """
+        Initialize the QueryPlanner.
+        Args corresponds to class attributes.
+        """
+        self.chants = chants
+        self.sources = sources
+        self.postings = postings
+        self.selectivity = selectivity
+
+    def _srclinks_without(self, discarded : set) -> set:
+        """
+        Returns srclinks of chants except the discarded ones.
+        """
+        return {srclink for srclink in self.postings('srclink').positions if srclink not in discarded}
+
+    def lookups(self, compiled) -> list[tuple[str, set]]:
+        """
+        Finds conditions of the compiled filter which can be answered by posting lists.
+
+        Returns:
+            list: (chant field, values), chants passing the filter have one of the values
+        """
+        lookups = [(field, values) for field, values, passing in compiled.chant_checks if passing]
+
+        # conditions on sources are pushed down to srclinks, chants of dropped sources are dropped (see CompiledFilter.masks())
+        sources_mask = compiled.sources_mask(self.sources)
+        if sources_mask is not None and not sources_mask.all():
+            discarded = {source.srclink for source in compress(self.sources, ~sources_mask)}
+            lookups.append(('srclink', self._srclinks_without(discarded)))
+
+        expression = compiled.chant_expression
+        if expression is not None:
+            conjuncts = expression.operands if getattr(expression, 'operator', None) == 'and' else (expression,)
+            for condition in conjuncts:
+                if not isinstance(condition, Condition):
+                    continue
+                if condition.kind == 'chant':
+                    if isinstance(condition, IsIn):
+                        lookups.append((condition.name, set(condition.values)))
+                # chants without source have missing values of source fields, so they pass only if None passes
+                elif not condition.test([None])[0]:
+                    # value of the first source with the srclink is tested (see ExpressionEvaluator)
+                    srclinks = list(self.postings('srclink').positions)
+                    values = source_values(self.sources, object_array(srclinks), condition.name).tolist()
+                    lookups.append(('srclink', set(compress(srclinks, condition.test(values)))))
+        return lookups
+
+    def plan(self, compiled) -> QueryPlan:
+        """
+        Estimates number of rows of each lookup from posting lists and chooses the strategy.
+
+        Returns:
+            QueryPlan: plan of execution
+        """
+        total_rows = len(self.chants)
+        estimated = []
+        for field, values in self.lookups(compiled):
+            index = self.postings(field)
+            estimated.append((field, values, sum(index.count(value) for value in values)))
+        estimated.sort(key=lambda lookup: lookup[2])
+        used = [lookup for lookup in estimated if lookup[2] <= self.selectivity * total_rows]
+        return QueryPlan('index' if used else 'scan', estimated, used, total_rows)
+
+    def candidates(self, plan : QueryPlan) -> np.ndarray:
+        """
+        Intersects posting lists of lookups used by the plan.
+
+        Returns:
+            np.ndarray: sorted rows of chants which can pass the filter
+        """
+        rows = None
+        for field, values, _ in plan.used:
+            posting = self.postings(field).union(values)
+            rows = posting if rows is None else np.intersect1d(rows, posting, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+    def rows(self, compiled) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """
+        Evaluates the compiled filter (see CompiledFilter.rows()) according to its plan.
+
+        Returns:
+            np.ndarray: sorted rows of kept chants (None when chants are not restricted)
+            np.ndarray: sorted rows of kept sources (None when sources are not restricted)
+        """
+        plan = self.plan(compiled)
+        if plan.strategy == 'scan':
+            return compiled.rows(self.chants, self.sources)
+        rows = self.candidates(plan)
+        # candidates are evaluated for all conditions, posting lists only narrow the chants
+        chants_mask, sources_mask = compiled.masks(take_rows(self.chants, rows), self.sources)
+        if chants_mask is not None:
+            rows = rows[chants_mask]
+        return rows, None if sources_mask is None else np.flatnonzero(sources_mask)
+
+    def apply(self, compiled) -> tuple[list]:
+        """
+        Applies the compiled filter (see Filter.apply()) according to its plan.
+
+        Returns:
+            list: Reduced list of chants after filtration (ChantTable for ChantTable).
+            list: Reduced list of sources after filtration.
+        """
+        chant_rows, source_rows = self.rows(compiled)
+        return take_rows(self.chants, chant_rows), take_rows(self.sources, source_rows)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+This module contains the FilterResultCache class, which remembers results of applied filters.
+
+A result is stored as rows (positions) of the selected chants and sources, so it takes little memory
+and it is valid for any Corpus with the same content. Results are keyed by the canonical hash
+of the filter configuration (Filter.canonical_hash()) and by the content version of the Corpus
+(Corpus.content_version()). The most recently used results are kept in memory (LRU),
+Corpus with use_cache stores them also on disk next to its snapshots, so they survive the session.
+"""
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+from pycantus.dataloaders.cache import write_atomic
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+DEFAULT_MAX_ENTRIES = 64
+RESULTS_SUBDIR = 'filters'
+
+
+class FilterResultCache():
+    """
+    LRU cache of filter results: rows of selected chants and sources.
+
+    Attributes:
+        max_entries (int): maximal number of results kept in memory
+        _entries (OrderedDict): { key : (rows of chants, rows of sources) }, the least recently used first
+    """
+    def __init__(self, max_entries : int =DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the FilterResultCache.
+        Args corresponds to class attributes.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive.")
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(filter_hash : str, content_version : str) -> str:
+        """
+        Returns:
+            str: key of the result of the filter on the content
+        """
+        return hashlib.sha256(f"{filter_hash}\n{content_version}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _path(key : str, cache_dir : str) -> str:
+        return os.path.join(cache_dir, RESULTS_SUBDIR, f"{key}.pickle")
+
+    def get(self, key : str, cache_dir : str =None) -> tuple | None:
+        """
+        Returns stored result, it is looked up on disk when it is not in memory and cache_dir is given.
+
+        Args:
+            key (str): key of the result (see key())
+            cache_dir (str, optional): directory of results stored on disk
+
+        Returns:
+            tuple: (rows of chants, rows of sources), None for not restricted records, or None if result is not stored
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if cache_dir is None:
+            return None
+        try:
+            with open(self._path(key, cache_dir), 'rb') as f:
+                stored = pickle.load(f)
+            rows = stored['chants'], stored['sources']
+        except Exception:
+            return None # missing or corrupted result is computed again
+        self._remember(key, rows)
+        return rows
+
+    def put(self, key : str, rows : tuple, cache_dir : str =None):
+        """
+        Stores result in memory and on disk if cache_dir is given.
+
+        Args:
+            key (str): key of the result (see key())
+            rows (tuple): (rows of chants, rows of sources), None for not restricted records
+            cache_dir (str, optional): directory of results stored on disk
+        """
+        self._remember(key, rows)
+        if cache_dir is not None:
+            data = pickle.dumps({'chants' : rows[0], 'sources' : rows[1]}, protocol=pickle.HIGHEST_PROTOCOL)
+            try:
+                write_atomic(self._path(key, cache_dir), data)
+            except OSError as e:
+                print(f"Error storing filter result : {e}")
+
+    def _remember(self, key : str, rows : tuple):
+        self._entries[key] = rows
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops all results kept in memory (results stored on disk are kept).
+        """
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key : str) -> bool:
+        return key in self._entries
+
+
+# results shared by all corpora of the session
+FILTER_RESULTS = FilterResultCache()
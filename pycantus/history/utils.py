@@ -2,6 +2,7 @@
 """
 This module provides utility functions for logging operations in the Corpus history.
 """
+import inspect
 from functools import wraps
 from .history import HistoryEntry
 
@@ -24,9 +25,12 @@ def log_operation(func):
         if func.__name__ == "apply_filter":
             args = args[0].__str__()
         else:
-            # Transform kwargs into a string representation
-            if args == () and kwargs != {}:
-                args = '\n'.join([f"{k}: {v}" for k, v in kwargs.items()]) + '\n'
+            # Transform arguments into a string representation, positional ones are recorded by their names too
+            # (history identifies the content of the Corpus, see Corpus.content_version())
+            arguments = inspect.signature(func).bind(self, *args, **kwargs).arguments
+            arguments.pop('self', None)
+            if arguments:
+                args = '\n'.join([f"{k}: {v}" for k, v in arguments.items()]) + '\n'
             else:
                 args = '{}' + '\n'
 
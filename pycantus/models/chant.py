@@ -4,39 +4,90 @@ This module contains the Chant class, which represents a single chant entry from
 It provides methods for creating, modifying, and exporting chant data in a standardized format.
 """
 
-import pandas as pd
 import re
+from functools import lru_cache
+from itertools import repeat
 from importlib import resources as impresources
 
 import pycantus.static as static
+from pycantus.dataloaders.writer import format_csv_row
 from pycantus.models.melody import Melody
 
 
 __version__ = "1.0.0"
 __author__ = "Anna Dvorakova"
 
-@staticmethod
+@lru_cache(maxsize=None)
 def get_rite_dict() -> dict[str]:
     """
     Loads data about rites of genres.
+    The file is read on the first call (not at import time), then the same dict is returned.
 
     Returns:
         dict: {genre : rite}
     """
+    import pandas as pd # imported lazily to keep import of pycantus fast
     genre_file = impresources.files(static) / "genre.csv"
     with genre_file.open("rt") as f:
         genre = pd.read_csv(f)
     return genre.set_index('genre_name')['rite'].to_dict()
-GENRE_TO_RITE = get_rite_dict()
+
+def __getattr__(name):
+    # GENRE_TO_RITE is loaded on first access
+    if name == 'GENRE_TO_RITE':
+        return get_rite_dict()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 MANDATORY_CHANTS_FIELDS = {'cantus_id', 'incipit', 'srclink', 'siglum','chantlink', 'folio', 'db'}
 OPTIONAL_CHANTS_FIELDS = {'sequence', 'feast', 'genre', 'office', 'position', 'melody_id', 'image', 'mode',
                                'full_text', 'melody', 'century', 'rite'}
-NON_EXPORT_CHATN_FIELDS = ['locked', 'rite', '_has_melody', 'melody_object']
+# Fields with few distinct values, loader interns them (equal values share one string object)
+CATEGORICAL_CHANTS_FIELDS = {'siglum', 'srclink', 'db', 'feast', 'genre', 'office', 'mode', 'century'}
+NON_EXPORT_CHATN_FIELDS = ['locked', 'rite', '_has_melody', 'melody_object', '_melody_object']
+CHANT_INIT_FIELDS = ['cantus_id', 'incipit', 'siglum', 'srclink', 'chantlink', 'folio', 'db', 'sequence', 'feast', 'genre',
+                     'office', 'position', 'melody_id', 'image', 'mode', 'full_text', 'melody', 'century', 'rite']
 EXPORT_CHANTS_FIELDS = ['cantus_id', 'incipit', 'siglum', 'srclink', 'chantlink', 'folio', 'db', 'sequence', 'feast', 'genre',
                      'office', 'position', 'melody_id', 'image', 'mode', 'full_text', 'melody', 'century']
 
 
+def is_complete_chant_data(volpiano : str, full_text : str, incipit : str) -> bool:
+    """
+    Checks if the chant data are complete melodic and textual data.
+    Conditions for being a complete chant:
+    - Has a melody
+    - The melody's volpiano is a valid string containing notes
+    - Has full text
+    - The full text is not identical to the incipit
+    - The volpiano starts with '1' (indicating G clef)
+    - The volpiano does not contain '2' (indicating F clef)
+    - The volpiano does not contain '6------6' (indicating missing pitches)
+    - The volpiano contains only valid characters
+    - The volpiano contains at least one word boundary ('---')
+
+    Args:
+        volpiano (str): melody of the chant
+        full_text (str): full text of the chant
+        incipit (str): incipit of the chant
+
+    Returns:
+        bool: True if the data are complete
+    """
+    volpiano_pattern = r'^[3456712\(\)ABCDEFGHJKLMNOPQRSIWXYZ89abcdefghjklmnopqrsiwxyz\.\,\-\[\]\{\¶]*$'
+    notes_pattern = r'[89abcdefghjklmnopqrs\(\)ABCDEFGHJKLMNOPQRS]+'
+
+    return bool(
+        isinstance(volpiano, str) and             # has volpiano
+        re.search(notes_pattern, volpiano) and    # contains notes
+        isinstance(full_text, str) and            # has full text
+        full_text != incipit and                  # incipit is not full text
+        volpiano.startswith('1') and              # starts with G clef
+        '2' not in volpiano and                   # no F clef
+        '6------6' not in volpiano and            # no missing pitches
+        re.match(volpiano_pattern, volpiano) and  # only valid volpiano chars
+        '---' in volpiano                         # has at least word boundary
+    )
+
+
 class Chant():
     """
     Represents one chant entry (record of chant occurrence) in database.
@@ -65,11 +116,17 @@ class Chant():
 
         locked (bool): Indicates whether the object is locked for editing. If True, no attributes can be modified. (functional attribute)
         _has_melody (bool): True if the chant has a melody, False otherwise. (functional attribute)
-        melody_object (Melody): If the chant has a melody, this should be an instance of the Melody class representing the chant's melody once created. (functional attribute)
+        melody_object (Melody): If the chant has a melody, this should be an instance of the Melody class representing the chant's melody once created. 
+                                It is created on first access and follows the locked state of the chant. (functional attribute)
     
     (Fields marked with an asterisk (*) are obligatory and must be included in every record. 
     Other fields are optional but recommended when data is available.)
     """
+    # Attributes are stored in slots instead of per-object __dict__ (big datasets contain millions of chants),
+    # locked state is given by the class (see locked property and LockedChant)
+    __slots__ = ('cantus_id', 'incipit', 'siglum', 'srclink', 'chantlink', 'folio', 'db', 'feast', 
+                 'genre', 'office', 'sequence', 'position', 'mode', 'melody_id', 'melody', 'century', 'full_text', 
+                 'image', 'rite', '_has_melody', '_melody_object')
 
     def __init__(self, 
                  cantus_id : str,
@@ -96,7 +153,10 @@ class Chant():
         Initialize the Chant. 
         Args corresponds to class non-functional attributes.
         """
-        self.locked = False  # Indicates if the object is locked for editing
+        if rite is None: # add rite based on the genre
+            rite = get_rite_dict().get(genre, None)
+
+        # Unlocked chant has no modification check, so fields are plain slot assignments
         self.cantus_id = cantus_id
         self.incipit = incipit
         self.siglum = siglum
@@ -115,24 +175,63 @@ class Chant():
         self.century = century
         self.full_text = full_text
         self.image = image
+        self.rite = rite
+        self._has_melody = melody is not None
+        self._melody_object = None # created lazily, see melody_object property
 
-        if rite is not None:
-            self.rite = rite
-        else: # add rite based on the genre
-            self.rite = GENRE_TO_RITE.get(genre, None)
-        
-        self._has_melody = False
-        self.melody_object = None
+    @property
+    def locked(self) -> bool:
+        """
+        Indicates whether the object is locked for editing.
+        Locking turns the chant into LockedChant, which refuses modification of all attributes but locked.
+        """
+        return False
+
+    @locked.setter
+    def locked(self, value : bool):
+        object.__setattr__(self, '__class__', LockedChant if value else Chant)
+        # Melody follows the locked state of the chant
+        if self._melody_object is not None:
+            self._melody_object.locked = value
 
-        if self.melody is not None:
-            self._has_melody = True
+    def __reduce__(self):
+        # Pickled (e.g. for snapshot cache) as unlocked Chant, locked is restored as the last attribute,
+        # so the other attributes are restored without the lock check
+        state = {name : getattr(self, name) for name in Chant.__slots__}
+        state['locked'] = self.locked
+        return (Chant.__new__, (Chant,), (None, state))
+
+    @property
+    def melody_object(self) -> Melody:
+        """
+        Melody object of the chant, it is created on first access (see create_melody()).
+
+        Returns:
+            Melody: melody of the chant or None if the chant has no melody
+        """
+        if self._melody_object is None and self._has_melody:
             self.create_melody()
-            
-    # setter
-    def __setattr__(self, name, value):
-        if name != "locked" and getattr(self, "locked", False):
-            raise AttributeError(f"Cannot modify '{name}' because the object is locked.")
-        super().__setattr__(name, value)
+        return self._melody_object
+    
+    @melody_object.setter
+    def melody_object(self, melody : Melody):
+        self._melody_object = melody
+
+    @classmethod
+    def from_columns(cls, columns : dict[str, list], length : int):
+        """
+        Bulk factory creating Chant objects from column-wise data.
+        Fields not present in columns are set to None.
+
+        Args:
+            columns (dict): { field : list of values for all chants }
+            length (int): number of chants to be created
+
+        Returns:
+            generator: Chant objects in the order of the columns values
+        """
+        args = [columns[field] if field in columns else repeat(None, length) for field in CHANT_INIT_FIELDS]
+        return (cls(*values) for values in zip(*args))
 
     @staticmethod
     def header() -> str:
@@ -159,53 +258,23 @@ class Chant():
     @property
     def to_csv_row(self) -> str:
         """
-        Returns data fields of Chant in "to be pasted to the csv export file" form.
+        Returns data fields of Chant in "to be pasted to the csv export file" form
+        (RFC 4180 quoting, see format_csv_row()).
         
         Returns:
             str: data of object as standardized csv row
         """
-        csv_row = []
-        for attr_name in EXPORT_CHANTS_FIELDS:
-            attr_value = self.__getattribute__(attr_name)
-            if attr_value is not None:
-                csv_row.append(attr_value)
-            else:
-                csv_row.append('')
-        return ','.join(csv_row)
+        return format_csv_row(getattr(self, attr_name) for attr_name in EXPORT_CHANTS_FIELDS)
     
     @property
     def is_complete_chant(self) -> bool:
         """
-        Checks if the chant has complete melodic and textual data.
-        Conditions for being a complete chant:
-        - Has a melody
-        - The melody's volpiano is a valid string containing notes
-        - Has full text
-        - The full text is not identical to the incipit
-        - The volpiano starts with '1' (indicating G clef)
-        - The volpiano does not contain '2' (indicating F clef)
-        - The volpiano does not contain '6------6' (indicating missing pitches)
-        - The volpiano contains only valid characters
-        - The volpiano contains at least one word boundary ('---')
+        Checks if the chant has complete melodic and textual data (see is_complete_chant_data()).
         """
         if not self._has_melody:
             return False
-
-        volpiano = self.melody_object.raw_volpiano
-        volpiano_pattern = r'^[3456712\(\)ABCDEFGHJKLMNOPQRSIWXYZ89abcdefghjklmnopqrsiwxyz\.\,\-\[\]\{\¶]*$'
-        notes_pattern = r'[89abcdefghjklmnopqrs\(\)ABCDEFGHJKLMNOPQRS]+'
-
-        return (
-            isinstance(volpiano, str) and             # has volpiano
-            re.search(notes_pattern, volpiano) and    # contains notes
-            isinstance(self.full_text, str) and       # has full text
-            self.full_text != self.incipit and        # incipit is not full text
-            volpiano.startswith('1') and              # starts with G clef
-            '2' not in volpiano and                   # no F clef
-            '6------6' not in volpiano and            # no missing pitches
-            re.match(volpiano_pattern, volpiano) and  # only valid volpiano chars
-            '---' in volpiano                         # has at least word boundary
-        )
+        # melody is the same as melody_object.raw_volpiano, the Melody is not created
+        return is_complete_chant_data(self.melody, self.full_text, self.incipit)
     
     def create_melody(self):
         """
@@ -213,7 +282,29 @@ class Chant():
         Expects volpiano to be provided.
         """
         if self._has_melody:
-            self.melody_object = Melody(self.melody, self.chantlink, self.cantus_id, self.mode)
-        # Lock melody if chant is locked
-        if self.locked:
-            self.melody_object.locked = True
\ No newline at end of file
+            melody = Melody(self.melody, self.chantlink, self.cantus_id, self.mode)
+            # Lock melody if chant is locked
+            melody.locked = self.locked
+            # Creating the melody does not modify chant data, so it is allowed for locked chant as well
+            object.__setattr__(self, '_melody_object', melody)
+
+
+class LockedChant(Chant):
+    """
+    Locked chant (see Chant.locked), no attribute but locked can be modified.
+    """
+    __slots__ = ()
+
+    @property
+    def locked(self) -> bool:
+        return True
+
+    @locked.setter
+    def locked(self, value : bool):
+        Chant.locked.fset(self, value)
+
+    # setter
+    def __setattr__(self, name, value):
+        if name != "locked":
+            raise AttributeError(f"Cannot modify '{name}' because the object is locked.")
+        super().__setattr__(name, value)
@@ -0,0 +1,647 @@
+#!/usr/bin/env python
+"""
+This module contains the ChantTable class, column-wise storage of chants used by Corpus in 'columnar' storage mode,
+and the ChantView class, a lightweight row of the table which behaves like a Chant.
+
+Every chant field is stored in one NumPy array. Categorical fields (few distinct values, e.g. siglum, genre or office)
+are dictionary-encoded: the column holds integer codes into a table of distinct (interned) values, code -1 means None.
+Bulk operations (filtration, counting, dropping of chants) are evaluated on whole columns instead of per Chant object,
+Chant-like objects are created only for rows that are actually accessed.
+"""
+import copy
+from operator import attrgetter
+
+import numpy as np
+
+from pycantus.models.chant import Chant, CHANT_INIT_FIELDS, CATEGORICAL_CHANTS_FIELDS, get_rite_dict, is_complete_chant_data
+from pycantus.models.melody import Melody
+from pycantus.dataloaders.interning import intern_values, intern_value
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+# rite is derived from genre, so it has as few distinct values as genre
+TABLE_CATEGORICAL_FIELDS = CATEGORICAL_CHANTS_FIELDS | {'rite'}
+
+
+def object_array(values) -> np.ndarray:
+    """
+    Creates one-dimensional NumPy array of Python objects (values are never split into nested arrays).
+    """
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def dictionary_encode(values) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Dictionary-encodes the values of one field.
+
+    Args:
+        values (list): values of the field (None for missing values)
+
+    Returns:
+        np.ndarray: int32 codes of the values (-1 for None)
+        np.ndarray: distinct interned values followed by None, so decoding is plain indexing by codes
+    """
+    import pandas as pd # imported lazily to keep import of pycantus fast
+    codes, uniques = pd.factorize(object_array(values))
+    categories = object_array(intern_values(uniques.tolist()) + [None])
+    return codes.astype(np.int32), categories
+
+
+def factorize_records(records, field : str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes values of the field of records (Chant or Source objects, or ChantTable) as integer codes.
+
+    Returns:
+        np.ndarray: code of the value of each record (-1 for None)
+        np.ndarray: values of the codes
+    """
+    if getattr(records, 'columnar', False):
+        return records.factorize(field)
+    import pandas as pd
+    codes, uniques = pd.factorize(object_array(list(map(attrgetter(field), records))))
+    return codes, object_array(uniques.tolist())
+
+
+def row_index(codes : np.ndarray, categories : np.ndarray) -> 'RowIndex':
+    """
+    Builds index of rows by their codes with one stable sort, rows of each value are sorted (posting lists).
+
+    Args:
+        codes (np.ndarray): code of the value of each row (-1 for None)
+        categories (np.ndarray): values of the codes followed by None
+
+    Returns:
+        RowIndex: rows of each value
+    """
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.diff(sorted_codes)) + 1
+    bounds = np.concatenate(([0], starts, [len(order)])) if len(order) else np.zeros(1, dtype=np.intp)
+    values = categories[sorted_codes[bounds[:-1]]].tolist()
+    return RowIndex(values, order, bounds)
+
+
+class ChantTable():
+    """
+    Column-wise storage of chants.
+    It is a sequence of ChantView rows, so it can be iterated and indexed as a list of chants
+    (slicing returns ChantTable), but it does not support in-place list modifications (append, remove...).
+
+    Attributes:
+        _columns (dict): { field : NumPy array } (codes for categorical fields, objects for others)
+        _categories (dict): { categorical field : distinct values followed by None }
+        _locked (np.ndarray): locked state of each row
+        _has_melody (np.ndarray): presence of melody in each row (kept, so melodic rows are found without a scan)
+        _melodies (dict): { row : Melody } melody objects created on access
+    """
+    columnar = True # marks column-wise chants storage (e.g. for Filter.apply)
+
+    def __init__(self, columns : dict[str, np.ndarray], categories : dict[str, np.ndarray], locked : np.ndarray,
+                 has_melody : np.ndarray =None):
+        """
+        Initialize the ChantTable from already encoded columns (see from_columns() for plain values).
+        Args corresponds to class attributes.
+        """
+        self._columns = columns
+        self._categories = categories
+        self._locked = locked
+        if has_melody is None:
+            has_melody = columns['melody'] != None # noqa: E711 (element-wise comparison)
+        self._has_melody = has_melody
+        self._melodies = {}
+        self._codes = {} # { categorical field : { value : code } }, built when values are assigned
+
+    @classmethod
+    def from_columns(cls, columns : dict[str, list], length : int) -> 'ChantTable':
+        """
+        Creates ChantTable from column-wise data, counterpart of Chant.from_columns.
+        Fields not present in columns are set to None, missing rite is derived from genre as in Chant.
+
+        Args:
+            columns (dict): { field : list of values for all chants }
+            length (int): number of chants
+
+        Returns:
+            ChantTable: unlocked table of the chants
+        """
+        encoded = {}
+        categories = {}
+        for field in CHANT_INIT_FIELDS:
+            values = columns[field] if field in columns else [None] * length
+            if field == 'rite':
+                continue
+            if field in TABLE_CATEGORICAL_FIELDS:
+                encoded[field], categories[field] = dictionary_encode(values)
+            else:
+                encoded[field] = object_array(values)
+
+        # rite of each distinct genre, rows with explicitly given rite keep it
+        genre_rites = object_array([get_rite_dict().get(genre, None) for genre in categories['genre']])
+        rites = genre_rites[encoded['genre']]
+        if 'rite' in columns:
+            given_rites = object_array(columns['rite'])
+            rites = np.where(given_rites != None, given_rites, rites) # noqa: E711 (element-wise comparison)
+        encoded['rite'], categories['rite'] = dictionary_encode(rites)
+
+        return cls(encoded, categories, np.zeros(length, dtype=bool))
+
+    @classmethod
+    def from_chants(cls, chants : list) -> 'ChantTable':
+        """
+        Creates ChantTable from Chant (or ChantView) objects, their locked state is kept.
+        """
+        table = cls.from_columns({field : [getattr(ch, field) for ch in chants] for field in CHANT_INIT_FIELDS},
+                                 len(chants))
+        table._locked = np.fromiter((ch.locked for ch in chants), dtype=bool, count=len(chants))
+        return table
+
+    @classmethod
+    def concat(cls, tables : list['ChantTable']) -> 'ChantTable':
+        """
+        Concatenates rows of the tables into one new table (categories are encoded again).
+        """
+        table = cls.from_columns({field : np.concatenate([t.column(field) for t in tables])
+                                  for field in CHANT_INIT_FIELDS},
+                                 sum(len(t) for t in tables))
+        table._locked = np.concatenate([t._locked for t in tables])
+        offset = 0
+        for t in tables:
+            # rows of the new table can be locked or unlocked independently of the concatenated ones
+            table._melodies.update((offset + row, copy.copy(melody)) for row, melody in t._melodies.items())
+            offset += len(t)
+        return table
+
+    def append(self, other : 'ChantTable') -> 'ChantTable':
+        """
+        Returns new table with rows of other table appended after the rows of this table.
+        Unlike concat(), values of this table are not encoded again, only distinct values of other table are.
+        Melody objects of this table are kept. All columns are copied, so it takes time proportional to the size of the table.
+        """
+        columns = {}
+        categories = {}
+        for field, column in self._columns.items():
+            if field not in self._categories:
+                columns[field] = np.concatenate([column, other._columns[field]])
+                continue
+            own = self._categories[field][:-1].tolist()
+            codes = {value : code for code, value in enumerate(own)}
+            added = []
+            recode = [] # code in the result for each code of other table
+            for value in other._categories[field][:-1].tolist():
+                if value not in codes:
+                    codes[value] = len(own) + len(added)
+                    added.append(intern_value(value))
+                recode.append(codes[value])
+            recode = np.array(recode + [-1], dtype=column.dtype) # code -1 (None) stays -1
+            categories[field] = object_array(own + added + [None]) if added else self._categories[field]
+            columns[field] = np.concatenate([column, recode[other._columns[field]]])
+        table = ChantTable(columns, categories, np.concatenate([self._locked, other._locked]),
+                           np.concatenate([self._has_melody, other._has_melody]))
+        table._melodies = dict(self._melodies)
+        return table
+
+    def assign(self, rows, other : 'ChantTable'):
+        """
+        Overwrites the rows of this table by the rows of other table (in the given order), including locked state.
+        Locked state of the overwritten rows is not checked. Their melody objects are dropped (created again on access).
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        for field, column in self._columns.items():
+            if field in self._categories:
+                column[rows] = [self._code(field, value) for value in other.column(field).tolist()]
+            else:
+                column[rows] = other._columns[field]
+        self._locked[rows] = other._locked
+        self._has_melody[rows] = other._has_melody
+        for row in rows.tolist():
+            self._melodies.pop(row, None)
+
+    def __len__(self) -> int:
+        return len(self._locked)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(np.arange(len(self))[key])
+        row = int(key)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('ChantTable index out of range')
+        return ChantView(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield ChantView(self, row)
+
+    def rows(self, indices) -> list['ChantView']:
+        """
+        Returns:
+            list: views of the rows with given indices
+        """
+        return [ChantView(self, row) for row in np.asarray(indices).tolist()]
+
+    def take(self, selection : np.ndarray) -> 'ChantTable':
+        """
+        Selects rows of the table.
+        Distinct values of categorical fields and melody objects of the selected rows are shared with this table
+        (as Chant objects selected from a list, see copy_melodies()).
+
+        Args:
+            selection (np.ndarray): boolean mask or indices of the rows to be kept (in the given order)
+
+        Returns:
+            ChantTable: new table with the selected rows
+        """
+        selection = np.asarray(selection)
+        if selection.dtype == bool:
+            selection = np.flatnonzero(selection) # mask is scanned once, not once per column
+        else:
+            selection = selection.astype(np.intp, copy=False) # e.g. empty list of rows
+        columns = {field : column[selection] for field, column in self._columns.items()}
+        table = ChantTable(columns, dict(self._categories), self._locked[selection], self._has_melody[selection])
+        if self._melodies:
+            # melody objects (possibly edited) are moved to the new positions of their rows
+            melody_rows = np.fromiter(self._melodies, dtype=np.intp, count=len(self._melodies))
+            new_rows = np.flatnonzero(np.isin(selection, melody_rows))
+            table._melodies = {new_row : self._melodies[row]
+                               for new_row, row in zip(new_rows.tolist(), selection[new_rows].tolist())}
+        return table
+
+    def copy_melodies(self):
+        """
+        Replaces melody objects by their copies, so they are not shared with the table the rows were taken from.
+        """
+        self._melodies = {row : copy.copy(melody) for row, melody in self._melodies.items()}
+
+    def delete(self, rows) -> 'ChantTable':
+        """
+        Returns new table without the given rows (see take()), all columns are compacted (copied).
+        """
+        keep = np.ones(len(self), dtype=bool)
+        keep[np.asarray(rows, dtype=np.intp)] = False
+        return self.take(keep)
+
+    def value(self, field : str, row : int):
+        """
+        Returns value of the field in the row.
+        """
+        if field in self._categories:
+            return self._categories[field][self._columns[field][row]]
+        return self._columns[field][row]
+
+    def set_value(self, row : int, field : str, value):
+        """
+        Sets value of the field in the row, the row must not be locked.
+        """
+        if self._locked[row]:
+            raise AttributeError(f"Cannot modify '{field}' because the object is locked.")
+        if field in self._categories:
+            self._columns[field][row] = self._code(field, value)
+        else:
+            self._columns[field][row] = value
+            if field == 'melody':
+                self._has_melody[row] = value is not None
+
+    def _code(self, field : str, value) -> int:
+        """
+        Returns code of the categorical value, value not yet present is added to the field categories.
+        """
+        if value is None:
+            return -1
+        if field not in self._codes:
+            self._codes[field] = {category : code for code, category in enumerate(self._categories[field][:-1])}
+        codes = self._codes[field]
+        if value not in codes:
+            categories = self._categories[field]
+            # categories can be shared with other tables, so the extended copy is used only by this one
+            self._categories[field] = object_array(categories[:-1].tolist() + [intern_value(value), None])
+            codes[value] = len(categories) - 1
+        return codes[value]
+
+    def column(self, field : str) -> np.ndarray:
+        """
+        Returns values of the field for all rows (categorical fields are decoded).
+
+        Returns:
+            np.ndarray: read-only array of values
+        """
+        if field in self._categories:
+            values = self._categories[field][self._columns[field]]
+        else:
+            values = self._columns[field].view()
+        values.flags.writeable = False
+        return values
+
+    def to_columns(self) -> dict[str, list]:
+        """
+        Returns:
+            dict: { field : list of values } of all chant fields, e.g. for Chant.from_columns
+        """
+        return {field : self.column(field).tolist() for field in CHANT_INIT_FIELDS}
+
+    def to_chants(self) -> list[Chant]:
+        """
+        Creates Chant objects of all rows, their locked state and copies of their melody objects are kept.
+        """
+        chants = list(Chant.from_columns(self.to_columns(), len(self)))
+        for row, melody in self._melodies.items():
+            chants[row].melody_object = copy.copy(melody)
+        for row in np.flatnonzero(self._locked):
+            chants[row].locked = True
+        return chants
+
+    def isin(self, field : str, values) -> np.ndarray:
+        """
+        Vectorized membership test of field values.
+        Categorical fields test each distinct value once and map the result to rows by the codes.
+
+        Args:
+            field (str): chant field
+            values (iterable): tested values
+
+        Returns:
+            np.ndarray: boolean mask of rows having the value of field in values
+        """
+        values = set(values)
+        if field in self._categories:
+            categories = self._categories[field]
+            member = np.fromiter((category in values for category in categories), dtype=bool, count=len(categories))
+            return member[self._columns[field]]
+        import pandas as pd
+        return pd.Series(self._columns[field], copy=False).isin(values).to_numpy()
+
+    def notnull(self, field : str) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: boolean mask of rows with value of field set
+        """
+        if field in self._categories:
+            return self._columns[field] != -1
+        return self._columns[field] != None # noqa: E711 (element-wise comparison)
+
+    def unique(self, field : str) -> set:
+        """
+        Returns:
+            set: distinct values of field present in the rows
+        """
+        if field in self._categories:
+            return set(self._categories[field][np.unique(self._columns[field])].tolist())
+        return set(self._columns[field].tolist())
+
+    def value_counts(self, field : str) -> dict:
+        """
+        Returns:
+            dict: { value : number of rows with the value } of values of field present in the rows
+        """
+        if field in self._categories:
+            categories = self._categories[field]
+            counts = np.bincount(self._columns[field] + 1, minlength=len(categories))
+            # shifted codes, so count of None (code -1) is the first one
+            counts = np.roll(counts, -1)
+            return {category : int(count) for category, count in zip(categories.tolist(), counts.tolist()) if count}
+        import pandas as pd
+        return pd.Series(self._columns[field], copy=False).value_counts(dropna=False).to_dict()
+
+    def factorize(self, field : str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Encodes values of the field as integer codes (codes of categorical fields are taken as they are).
+
+        Returns:
+            np.ndarray: code of the value in each row (-1 for None)
+            np.ndarray: values of the codes (values of categorical fields do not have to be present in the rows)
+        """
+        if field in self._categories:
+            return self._columns[field], self._categories[field][:-1]
+        import pandas as pd
+        codes, uniques = pd.factorize(self._columns[field])
+        return codes, object_array(uniques.tolist())
+
+    def index(self, field : str) -> 'RowIndex':
+        """
+        Builds hash index of rows by value of the field with one stable sort of the codes.
+
+        Returns:
+            RowIndex: rows of each value of the field
+        """
+        if field in self._categories:
+            return row_index(self._columns[field], self._categories[field])
+        codes, uniques = self.factorize(field)
+        return row_index(codes, object_array(uniques.tolist() + [None]))
+
+    def duplicated(self, fields : list[str], keep : str ='first') -> np.ndarray:
+        """
+        Finds rows repeating the combination of values of the fields of another row (hash-based, one pass).
+        Categorical fields are compared by their codes.
+
+        Args:
+            fields (list): fields forming the key
+            keep (str): 'first' or 'last', occurrence which is not marked as duplicate
+
+        Returns:
+            np.ndarray: boolean mask of duplicate rows
+        """
+        import pandas as pd
+        key = pd.DataFrame({field : self._columns[field] for field in fields}, copy=False)
+        return key.duplicated(keep=keep).to_numpy()
+
+    def distinct(self, *fields : str) -> set[tuple]:
+        """
+        Returns:
+            set: distinct tuples of values of the fields present in the rows
+        """
+        return set(zip(*(self.column(field).tolist() for field in fields)))
+
+    def has_melody(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: boolean mask of rows having a melody (counterpart of Chant._has_melody)
+        """
+        return self._has_melody.copy()
+
+    def complete_mask(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: boolean mask of complete chants (counterpart of Chant.is_complete_chant)
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        rows = np.flatnonzero(self.has_melody())
+        melodies = self._columns['melody'][rows]
+        full_texts = self._columns['full_text'][rows]
+        incipits = self._columns['incipit'][rows]
+        mask[rows] = np.fromiter(map(is_complete_chant_data, melodies, full_texts, incipits),
+                                 dtype=bool, count=len(rows))
+        return mask
+
+    def set_locked(self, value : bool, row : int =None):
+        """
+        Locks (or unlocks) the row or all rows, melody objects follow the locked state.
+        """
+        if row is None:
+            self._locked[:] = value
+            melodies = self._melodies.values()
+        else:
+            self._locked[row] = value
+            melodies = [self._melodies[row]] if row in self._melodies else []
+        for melody in melodies:
+            melody.locked = value
+
+    def melody_object(self, row : int) -> Melody:
+        """
+        Returns Melody of the row, it is created on first access (as Chant.melody_object).
+        """
+        if row not in self._melodies and self.value('melody', row) is not None:
+            melody = Melody(self.value('melody', row), self.value('chantlink', row),
+                            self.value('cantus_id', row), self.value('mode', row))
+            melody.locked = bool(self._locked[row])
+            self._melodies[row] = melody
+        return self._melodies.get(row)
+
+
+class RowIndex():
+    """
+    Index of ChantTable rows by value of one field.
+    Rows are sorted by the value once, the index maps each value to the range of its rows,
+    so no array is created per value until it is looked up.
+
+    Attributes:
+        positions (dict): { value : number of its group }
+        order (np.ndarray): rows sorted by the value (stable, rows of one value keep the table order)
+        bounds (np.ndarray): group i are rows order[bounds[i]:bounds[i+1]]
+    """
+    def __init__(self, values : list, order : np.ndarray, bounds : np.ndarray):
+        self.positions = {value : group for group, value in enumerate(values)}
+        self.order = order
+        self.bounds = bounds
+
+    def get(self, value) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: rows with the value (empty if there is none)
+        """
+        group = self.positions.get(value)
+        if group is None:
+            return self.order[:0]
+        return self.order[self.bounds[group]:self.bounds[group + 1]]
+
+    def count(self, value) -> int:
+        """
+        Returns:
+            int: number of rows with the value
+        """
+        group = self.positions.get(value)
+        if group is None:
+            return 0
+        return int(self.bounds[group + 1] - self.bounds[group])
+
+    def union(self, values) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: sorted rows having any of the values (posting lists of the values merged)
+        """
+        postings = [self.get(value) for value in values if value in self.positions]
+        if not postings:
+            return self.order[:0]
+        return np.sort(np.concatenate(postings))
+
+    def counts(self) -> dict:
+        """
+        Returns:
+            dict: { value : number of rows with the value }
+        """
+        return dict(zip(self.positions, np.diff(self.bounds).tolist()))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, value) -> bool:
+        return value in self.positions
+
+
+class ChantView():
+    """
+    One row of ChantTable, behaves like a Chant (same attributes, properties and methods),
+    values are read from and written to the table columns.
+    Views are created on access and are cheap, two views of the same row are equal.
+    Pickled view becomes a Chant.
+    """
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table : ChantTable, row : int):
+        self._table = table
+        self._row = row
+
+    @property
+    def locked(self) -> bool:
+        """
+        Indicates whether the row is locked for editing.
+        """
+        return bool(self._table._locked[self._row])
+
+    @locked.setter
+    def locked(self, value : bool):
+        self._table.set_locked(value, self._row)
+
+    @property
+    def _has_melody(self) -> bool:
+        return bool(self._table._has_melody[self._row])
+
+    @property
+    def melody_object(self) -> Melody:
+        """
+        Melody object of the chant, it is created on first access.
+        """
+        return self._table.melody_object(self._row)
+
+    @melody_object.setter
+    def melody_object(self, melody : Melody):
+        self._table._melodies[self._row] = melody
+
+    def create_melody(self):
+        """
+        Creates a Melody object for the chant if it has a melody.
+        """
+        self._table.melody_object(self._row)
+
+    def to_chant(self) -> Chant:
+        """
+        Returns:
+            Chant: standalone copy of the row (with the same locked state)
+        """
+        chant = Chant(*(self._table.value(field, self._row) for field in CHANT_INIT_FIELDS))
+        chant.locked = self.locked
+        return chant
+
+    def __reduce__(self):
+        return self.to_chant().__reduce__()
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ChantView) and self._table is other._table and self._row == other._row
+
+    def __hash__(self) -> int:
+        return hash((id(self._table), self._row))
+
+    header = staticmethod(Chant.header)
+    __str__ = Chant.__str__
+    to_csv_row = Chant.to_csv_row
+    is_complete_chant = Chant.is_complete_chant
+
+
+def _field_property(field : str) -> property:
+    """
+    Creates property of ChantView reading and writing the field in the table.
+    """
+    def getter(view):
+        return view._table.value(field, view._row)
+
+    def setter(view, value):
+        view._table.set_value(view._row, field, value)
+
+    return property(getter, setter, doc=f"{field} of the chant (stored in the table column)")
+
+for _field in CHANT_INIT_FIELDS:
+    setattr(ChantView, _field, _field_property(_field))
@@ -4,12 +4,21 @@ This module contains the Corpus class, which represents a collection of chants a
 It provides methods for loading, filtering, and exporting data related to the chants and sources.
 """
 
-from collections import Counter
+import copy
+import gc
+import hashlib
+import itertools
+import json
+import os
+from collections import defaultdict
+from operator import attrgetter
 
-from pycantus.models.chant import Chant
-from pycantus.models.source import Source
+from pycantus.models.chant import Chant, EXPORT_CHANTS_FIELDS, CHANT_INIT_FIELDS
+from pycantus.models.source import Source, EXPORT_SOURCES_FIELDS, SOURCE_INIT_FIELDS
 from pycantus.models.melody import Melody
-from pycantus.dataloaders.loader import CsvLoader
+from pycantus.dataloaders.cache import SnapshotCache, file_hash
+from pycantus.dataloaders.integrity import SourcesReport, build_sources_report
+from pycantus.dataloaders.writer import DEFAULT_BATCH_SIZE, write_chants_csv, write_sources_csv
 from pycantus.filtration.filter import Filter
 from pycantus.history.utils import log_operation
 from pycantus.history.history import HistoryEntry
@@ -18,6 +27,115 @@ __version__ = "1.0.0"
 __author__ = "Anna Dvorakova"
 
 
+STORAGE_MODES = ('objects', 'columnar')
+FILTER_CACHE_HIT = 'filter_cache_hit' # history entry of filter result taken from cache, not part of content version
+
+
+def _key_fields(key : str | list[str], valid_fields : list[str], keep : str) -> list[str]:
+    """
+    Checks arguments of deduplication and returns fields of the key as list.
+    """
+    fields = [key] if isinstance(key, str) else list(key)
+    if not fields:
+        raise ValueError('Key of deduplication has to contain at least one field.')
+    for field in fields:
+        if field not in valid_fields:
+            raise ValueError(f"Field '{field}' is not a valid field for deduplication.")
+    if keep not in ('first', 'last'):
+        raise ValueError(f"Unknown keep policy '{keep}', expected 'first' or 'last'.")
+    return fields
+
+
+def _copy_records(records : list, cls : type, fields : list[str]) -> list:
+    """
+    Creates copies of Chant or Source objects in bulk (with the same locked state and copies of created melody objects).
+    """
+    copies = list(cls.from_columns({field : [getattr(r, field) for r in records] for field in fields}, len(records)))
+    for record_copy, record in zip(copies, records):
+        melody = getattr(record, '_melody_object', None)
+        if melody is not None:
+            # melody can be already edited (e.g. normalized), it is copied before the lock (which it follows)
+            record_copy.melody_object = copy.copy(melody)
+        if record.locked:
+            record_copy.locked = True
+    return copies
+
+
+def _keep_unique(records : list, key_of, keep : str ='first') -> list:
+    """
+    Keeps one record of each key in one pass using hash set, order of kept records is preserved.
+
+    Args:
+        records (list): Chant or Source objects
+        key_of (callable): returns key of the record (e.g. operator.attrgetter)
+        keep (str): 'first' or 'last', occurrence of each key to be kept
+
+    Returns:
+        list: deduplicated records
+    """
+    seen = set()
+    kept = []
+    for record in (reversed(records) if keep == 'last' else records):
+        record_key = key_of(record)
+        if record_key not in seen:
+            seen.add(record_key)
+            kept.append(record)
+    if keep == 'last':
+        kept.reverse()
+    return kept
+
+
+# tokens of corpora loaded in this session, see Corpus.content_version()
+_LOAD_TOKENS = itertools.count()
+
+
+def _first_rows(links) -> dict:
+    """
+    Returns { link : row of its first occurrence }, positions of records used by Corpus.apply_delta().
+    """
+    rows = {}
+    for row, link in enumerate(links):
+        rows.setdefault(link, row)
+    return rows
+
+
+def _upsert_rows(rows : dict, size : int, links : list) -> tuple[dict, dict]:
+    """
+    Plans upsert of delta records by their links: record with known link replaces the record at its row,
+    other records are appended (and rows are extended by them). Later delta record with the same link wins.
+
+    Args:
+        rows (dict): { link : row } of current records, updated by the appended records
+        size (int): number of current records
+        links (list): links of delta records
+
+    Returns:
+        dict: { row of replaced record : delta position }
+        dict: { appended row : delta position } in the order of rows
+    """
+    replaced = {}
+    appended = {}
+    for position, link in enumerate(links):
+        row = rows.get(link)
+        if row is None:
+            row = rows[link] = size + len(appended)
+        (appended if row >= size else replaced)[row] = position
+    return replaced, appended
+
+
+def _remove_rows(records : list, rows : list[int]):
+    """
+    Removes records at the given (sorted) rows in place by one compaction, slices of references are copied.
+    """
+    kept = []
+    start = 0
+    for row in rows:
+        kept += records[start:row]
+        start = row + 1
+    kept += records[start:]
+    records[:] = kept
+
+
 class Corpus():
     """
     Represents a collection of chants and sources (piece of repertoire).
@@ -31,9 +149,18 @@ class Corpus():
         is_editable (bool): indicates whether objects in Corpus should be locked
         check_missing_sources (bool): indicates whether load should an raise exception if some chant refers to source that is not in sources
         create_missing_sources (bool): indicates whether load should create Source entries for sources referred to in some of the chants and not being present in provided sources
+        use_cache (bool): indicates whether loaded data should be stored into and loaded from on-disk snapshot cache
+        cache_dir (str, optional): directory of snapshot cache (default is PYCANTUS_CACHE_DIR environment variable or ~/.cache/pycantus)
+        sumcheck (str, optional): expected SHA-256 hash of chants file, snapshot cache is used only if it matches
+        workers (int, optional): number of processes parsing chants file in parallel (None or 1 means no parallelism)
+        columns (list, optional): optional chant fields to be loaded, other fields are not read and stay None (None means all fields)
+        storage (str): 'objects' (chants are Chant objects) or 'columnar' (chants are stored column-wise in ChantTable
+                       and accessed as ChantView rows, bulk operations are vectorized, meant for very big corpora)
+        unparsable_centuries (list): distinct century values of loaded sources that could not be translated to numeric_century
         operations_history (list): list of operations applied on the corpus (from predefined list - see methods with @log_operation decorator)
-        _chants (list): list of Chant objects in the corpus
+        _chants (list): list of Chant objects in the corpus (ChantTable in 'columnar' storage)
         _sources (list): list of Source objects in the corpus
+        _indexes (dict): hash indexes of chants and sources built on demand (see chants_by() and source_of())
     
     Only chants_filepath is mandatory.
     The only way to initialize `Corpus` is via load from CSV files, 
@@ -49,6 +176,12 @@ class Corpus():
                  is_editable=False,
                  check_missing_sources=False,
                  create_missing_sources=False,
+                 use_cache=False,
+                 cache_dir=None,
+                 sumcheck=None,
+                 workers=None,
+                 columns=None,
+                 storage='objects',
                  **kwargs):
         """
         Initialize the Corpus. 
@@ -63,19 +196,61 @@ class Corpus():
         self.is_editable = is_editable
         self.create_missing_sources = create_missing_sources
         self.check_missing_sources = check_missing_sources
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.sumcheck = sumcheck
+        self.workers = workers
+        self.columns = columns
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage '{storage}', expected one of {STORAGE_MODES}.")
+        self.storage = storage
+        # Imported here, since loader imports models (loader can be imported first, e.g. in worker processes)
+        from pycantus.dataloaders.loader import CsvLoader
         loader = CsvLoader(self.chants_filepath, self.sources_filepath, self.check_missing_sources, 
                            self.create_missing_sources, self.chants_fallback_url, self.sources_fallback_url, 
-                           other_parameters)
-        chants, sources = loader.load()
+                           other_parameters, self.workers, self.columns, columnar=self.columnar)
 
-        self._chants = chants
-        self._sources = sources
+        snapshot = None
+        snapshot_key = None
+        if self.use_cache:
+            cache = SnapshotCache(self.cache_dir)
+            cache_options = {
+                'check_missing_sources' : self.check_missing_sources,
+                'create_missing_sources' : self.create_missing_sources,
+                'columns' : sorted(self.columns) if self.columns is not None else None
+            }
+            snapshot_path = cache.snapshot_path(loader.chants_filename, loader.sources_filename, **cache_options)
+            snapshot_key = cache.snapshot_key(loader.chants_filename, loader.sources_filename, 
+                                              sumcheck=self.sumcheck, **cache_options)
+            if snapshot_key is not None:
+                snapshot = cache.load(snapshot_path, snapshot_key, columnar=self.columnar)
+
+        if snapshot is not None:
+            print("Data loaded from snapshot cache!")
+            self._chants, self._sources = snapshot
+            # centuries are not parsed again, sources with century and without numeric_century are those not parsed
+            self.unparsable_centuries = list(dict.fromkeys(source.century for source in self._sources
+                                                           if source.century is not None and source.numeric_century is None))
+        else:
+            chants, sources = loader.load()
+            self.unparsable_centuries = loader.unparsable_centuries
+
+            self._chants = chants
+            self._sources = sources
+
+            if self.use_cache and snapshot_key is not None:
+                cache.store(snapshot_path, snapshot_key, self._chants, self._sources)
 
         if not self.is_editable:
             self._lock_chants()
             self._lock_sources()
 
         self.operations_history = []
+        # content of loaded data: hashes of the files computed for the snapshot cache (valid in any session),
+        # otherwise a token valid only in this session (files are not read again to identify the content)
+        self._loaded_content = snapshot_key if snapshot_key is not None else f"session:{os.getpid()}:{next(_LOAD_TOKENS)}"
+        self._persistent_content = snapshot_key is not None
+        self._invalidate_indexes()
 
         if self.create_missing_sources:
             miss_his_entry = HistoryEntry(
@@ -83,11 +258,272 @@ class Corpus():
                 parameters='{}'+'\n',
             )
             self.operations_history.append(miss_his_entry)
-    
+
+    @classmethod
+    def _from_data(cls, chants : list[Chant], sources : list[Source], chants_filepath : str,
+                   sources_filepath : str =None, is_editable : bool =False, check_missing_sources : bool =False,
+                   create_missing_sources : bool =False, operations_history : list[HistoryEntry] =None) -> 'Corpus':
+        """
+        Creates Corpus from already loaded chants and sources (e.g. merge of loaded corpora).
+        Not meant for public use - the data has to originate from files recorded in filepaths
+        and operations_history to keep the corpus replicable.
+        """
+        corpus = cls.__new__(cls)
+        corpus.chants_filepath = chants_filepath
+        corpus.sources_filepath = sources_filepath
+        corpus.chants_fallback_url = None
+        corpus.sources_fallback_url = None
+        corpus.other_download_parameters = None
+        corpus.is_editable = is_editable
+        corpus.create_missing_sources = create_missing_sources
+        corpus.check_missing_sources = check_missing_sources
+        corpus.use_cache = False
+        corpus.cache_dir = None
+        corpus.sumcheck = None
+        corpus.workers = None
+        corpus.columns = None
+        corpus.storage = 'columnar' if getattr(chants, 'columnar', False) else 'objects'
+        corpus.unparsable_centuries = []
+        corpus._chants = chants
+        corpus._sources = sources
+        corpus.operations_history = list(operations_history) if operations_history is not None else []
+        corpus._loaded_content = None # content cannot be identified by the files
+        corpus._persistent_content = False
+        corpus._invalidate_indexes()
+        return corpus
+
+    @classmethod
+    def merge(cls, corpora : list['Corpus'], is_editable : bool =None) -> 'Corpus':
+        """
+        Merges loaded corpora into one Corpus.
+        Chants are deduplicated by chantlink and sources by srclink (first occurrence wins),
+        both in one pass using hash sets. Duplicates within one merged corpus are dropped as well,
+        not only records of later corpora with links already present in earlier ones.
+        Files of all merged corpora are kept in chants_filepath and sources_filepath (joined by '; ')
+        and the merge is recorded in operations_history.
+        Result has 'columnar' storage only if all merged corpora have it.
+        Merged corpora are not changed: only locked chants and sources of non-editable corpora are shared
+        with non-editable result, the others are copied (with their melody objects).
+
+        Args:
+            corpora (list): Corpus objects to be merged, earlier corpora take precedence
+            is_editable (bool, optional): editability of the result,
+                                          default is editable only if all merged corpora are editable
+
+        Returns:
+            Corpus: merged corpus
+        """
+        if not corpora:
+            raise ValueError('At least one corpus has to be provided for merge.')
+        if is_editable is None:
+            is_editable = all(corpus.is_editable for corpus in corpora)
+
+        columnar = all(corpus.columnar for corpus in corpora)
+        chants = []
+        tables = [] # selected rows of columnar corpora
+        sources = []
+        seen_chantlinks = set()
+        seen_srclinks = set()
+        for corpus in corpora:
+            # objects stay in merged corpora, only locked objects are shared (neither corpus can change them)
+            copied = corpus.is_editable or is_editable
+            if corpus.columnar:
+                rows = []
+                for row, chantlink in enumerate(corpus._chants.column('chantlink').tolist()):
+                    if chantlink not in seen_chantlinks:
+                        seen_chantlinks.add(chantlink)
+                        rows.append(row)
+                selected = corpus._chants.take(rows)
+                if columnar:
+                    tables.append(selected)
+                else:
+                    # chants of corpora with different storages are merged as new Chant objects
+                    corpus_chants = selected.to_chants()
+                    for chant in corpus_chants:
+                        chant.locked = not is_editable
+                    chants.extend(corpus_chants)
+            else:
+                corpus_chants = []
+                for chant in corpus._chants:
+                    if chant.chantlink not in seen_chantlinks:
+                        seen_chantlinks.add(chant.chantlink)
+                        corpus_chants.append(chant)
+                if copied:
+                    corpus_chants = _copy_records(corpus_chants, Chant, CHANT_INIT_FIELDS)
+                    for chant in corpus_chants:
+                        chant.locked = not is_editable
+                chants.extend(corpus_chants)
+            corpus_sources = []
+            for source in corpus._sources:
+                if source.srclink not in seen_srclinks:
+                    seen_srclinks.add(source.srclink)
+                    corpus_sources.append(source)
+            if copied:
+                corpus_sources = _copy_records(corpus_sources, Source, SOURCE_INIT_FIELDS)
+                for source in corpus_sources:
+                    source.locked = not is_editable
+            sources.extend(corpus_sources)
+
+        if columnar:
+            from pycantus.models.chant_table import ChantTable # imports numpy, so only when needed
+            merged_chants = ChantTable.concat(tables)
+            merged_chants.set_locked(not is_editable)
+        else:
+            merged_chants = chants
+
+        merged = cls._from_data(
+            merged_chants, sources,
+            chants_filepath='; '.join(str(corpus.chants_filepath) for corpus in corpora),
+            sources_filepath='; '.join(str(corpus.sources_filepath) for corpus in corpora),
+            is_editable=is_editable,
+            check_missing_sources=any(corpus.check_missing_sources for corpus in corpora),
+            create_missing_sources=any(corpus.create_missing_sources for corpus in corpora),
+            operations_history=[entry for corpus in corpora for entry in corpus.operations_history]
+        )
+        merged.unparsable_centuries = list(dict.fromkeys(century for corpus in corpora
+                                                         for century in corpus.unparsable_centuries))
+
+        total_chants = sum(len(corpus._chants) for corpus in corpora)
+        total_sources = sum(len(corpus._sources) for corpus in corpora)
+        merge_entry = HistoryEntry(
+            method='merge',
+            parameters=f"corpora: {[corpus.chants_filepath for corpus in corpora]}\n"
+                       f"dropped_duplicate_chants: {total_chants - len(merged_chants)}\n"
+                       f"dropped_duplicate_sources: {total_sources - len(sources)}\n"
+        )
+        merged.operations_history.append(merge_entry)
+        return merged
+
+    def view(self, filter : Filter =None) -> 'Corpus':
+        """
+        Returns derived Corpus with chants and sources selected by the filter, this Corpus is not changed.
+        The derived Corpus shares Chant and Source objects with this one and stores only their selection
+        (list of references, in columnar storage a table with selected rows), no data are loaded or copied.
+        It has the same editability and operations_history extended by the applied filter,
+        further operations on it do not affect this Corpus and the other way round.
+
+        Derived Corpus of editable Corpus gets its own copies of the selected chants and sources (including created,
+        possibly edited, melody objects), so edits of either of them never change the other one.
+        Objects of this Corpus are never replaced.
+
+        Args:
+            filter (Filter, optional): filter to be applied, None selects all chants and sources
+
+        Returns:
+            Corpus: derived corpus
+        """
+        chants, sources = self._chants, self._sources
+        if filter is not None:
+            chants, sources, cache_entry = self._filter_data(filter)
+        derived = self._derived(chants, sources)
+        if filter is not None:
+            if cache_entry is not None:
+                derived.operations_history.append(cache_entry)
+            derived.operations_history.append(HistoryEntry(method='apply_filter', parameters=filter.__str__()))
+        return derived
+
+    def _derived(self, chants, sources : list) -> 'Corpus':
+        """
+        Creates derived Corpus with the selected chants and sources of this one and the same operations_history
+        (see view()), no entry is added to the history.
+        """
+        derived = copy.copy(self)
+        # filter can return the original lists, derived corpus never shares the containers
+        derived._chants = chants[:] if chants is self._chants else chants
+        derived._sources = list(sources)
+        derived.operations_history = list(self.operations_history)
+        if self.is_editable:
+            # objects of editable corpora can be edited in place, so derived Corpus gets its own copies
+            if derived.columnar:
+                derived._chants.copy_melodies() # rows are already copied in the new table (see ChantTable.take())
+            else:
+                derived._chants = _copy_records(derived._chants, Chant, CHANT_INIT_FIELDS)
+            derived._sources = _copy_records(derived._sources, Source, SOURCE_INIT_FIELDS)
+        derived._invalidate_indexes()
+        return derived
+
+    def clone_and_apply_filter(self, filter : Filter) -> 'Corpus':
+        """
+        Returns derived Corpus with the filter applied, this Corpus is not changed (see view()).
+
+        Args:
+            filter (Filter): filter to be applied
+
+        Returns:
+            Corpus: derived corpus
+        """
+        return self.view(filter)
+
+    def partition_by(self, field : str, filter : Filter =None) -> dict:
+        """
+        Splits the Corpus into derived corpora, one for each value of the field (e.g. one per genre), in one pass.
+        Chants are grouped by codes of their values (see groupby()) instead of applying one Filter per value,
+        so the cost does not grow with the number of values. This Corpus is not changed.
+
+        Each derived Corpus is a view (see view()) with operations_history extended by one 'partition_by' entry.
+        Partitions by chant field keep all sources, partitions by source field (e.g. provenance, numeric_century,
+        see groupby()) keep sources with the value, chants whose srclink has no source form the part of None.
+
+        Args:
+            field (str): chant or source field
+            filter (Filter, optional): filter applied before the partition (in the same pass)
+
+        Returns:
+            dict: { value : Corpus } in the order of the first chant of each value (None for missing values)
+        """
+        import numpy as np
+        from pycantus.models.groupby import GroupBy
+        from pycantus.models.source import resolve_field
+        kind, name = resolve_field(field)
+
+        base = self # groups of unfiltered non-editable Corpus are cached in it (as results of groupby())
+        cache_entry = None
+        if filter is not None:
+            base = copy.copy(self)
+            base._chants, base._sources, cache_entry = self._filter_data(filter)
+            base._invalidate_indexes()
+        group_ids, keys = GroupBy(base, field)._groups()
+
+        # rows of each group by one stable sort, rows of a group keep the order of chants
+        order = np.argsort(group_ids, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(group_ids, minlength=len(keys))))).tolist()
+        if kind == 'source':
+            sources_by_value = defaultdict(list)
+            for source in base._sources:
+                sources_by_value[getattr(source, name)].append(source)
+
+        parameters = f"field: {field}\nparts: {len(keys)}\n"
+        if filter is not None:
+            parameters += filter.__str__()
+        parts = {}
+        for key, start, end in zip(keys, bounds, bounds[1:]):
+            rows = order[start:end]
+            if base.columnar:
+                part_chants = base._chants.take(rows)
+            else:
+                part_chants = list(map(base._chants.__getitem__, rows.tolist()))
+            part_sources = sources_by_value.get(key, []) if kind == 'source' else base._sources
+            part = base._derived(part_chants, part_sources)
+            if cache_entry is not None:
+                part.operations_history.append(cache_entry)
+            part.operations_history.append(HistoryEntry(method='partition_by', parameters=f"value: {key}\n" + parameters))
+            parts[key] = part
+        return parts
+
+    @property
+    def columnar(self) -> bool:
+        """
+        Indicates whether chants are stored column-wise (see storage attribute).
+        """
+        return self.storage == 'columnar'
+
     def _lock_chants(self):
         """ 
         Sets all chants to locked. 
         """
+        if self.columnar:
+            self._chants.set_locked(True)
+            return
         for c in self._chants:
             c.locked = True
 
@@ -106,7 +542,11 @@ class Corpus():
     @chants.setter
     def chants(self, new_chants: list[Chant]):
         if self.is_editable:
+            if self.columnar and not getattr(new_chants, 'columnar', False):
+                from pycantus.models.chant_table import ChantTable
+                new_chants = ChantTable.from_chants(new_chants)
             self._chants = new_chants
+            self._invalidate_indexes()
         else:
             raise PermissionError('Corpus is not editable, cannot replace chant list.')
 
@@ -118,9 +558,229 @@ class Corpus():
     def sources(self, new_sources: list[Source]):
         if self.is_editable:
             self._sources = new_sources
+            self._invalidate_indexes()
         else:
             raise PermissionError('Corpus is not editable, cannot replace sources list.')
     
+    def _invalidate_indexes(self):
+        """
+        Drops indexes of chants and sources, they are rebuilt on next lookup.
+        Called by every method changing the data.
+        """
+        self._indexes = {}
+        self._indexes_state = None
+
+    def _valid_indexes(self) -> dict:
+        """
+        Returns indexes of current data.
+        Indexes are dropped also when chants or sources lists were replaced or changed size without
+        any Corpus method (e.g. by list append), but not when attributes of chants were edited,
+        then invalidate_indexes() has to be called.
+        """
+        state = self._data_state()
+        if self._indexes_state != state:
+            self._indexes = {}
+            self._indexes_state = state
+        return self._indexes
+
+    def _data_state(self) -> tuple:
+        """
+        Identity and size of chants and sources lists, indexes are valid only for the state they were built for.
+        """
+        return (id(self._chants), len(self._chants), id(self._sources), len(self._sources))
+
+    def _cached(self, key, compute):
+        """
+        Returns value stored among indexes (e.g. results of groupby()), compute() is called when it is not present.
+        It is valid until the data change, as indexes are.
+        """
+        indexes = self._valid_indexes()
+        if key not in indexes:
+            indexes[key] = compute()
+        return indexes[key]
+
+    def invalidate_indexes(self):
+        """
+        Drops indexes of chants and sources after in-place edits of chants or sources attributes in editable Corpus.
+        """
+        self._invalidate_indexes()
+
+    def _chants_index(self, field : str) -> dict:
+        """
+        Returns hash index of chants by the field, it is built in one pass on first use.
+
+        Returns:
+            dict: { value : list of chants with the value } (RowIndex of ChantTable in columnar storage)
+        """
+        indexes = self._valid_indexes()
+        if field not in indexes:
+            if field not in CHANT_INIT_FIELDS:
+                raise ValueError(f"Field '{field}' is not a valid chant field.")
+            if self.columnar:
+                indexes[field] = self._chants.index(field)
+            else:
+                index = defaultdict(list)
+                value_of = attrgetter(field)
+                gc_enabled = gc.isenabled()
+                gc.disable() # many lists are created at once, cyclic gc would only slow it down
+                try:
+                    for chant in self._chants:
+                        index[value_of(chant)].append(chant)
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+                indexes[field] = dict(index)
+        return indexes[field]
+
+    def chants_by(self, field : str, value) -> list[Chant]:
+        """
+        Returns chants having the value of the field, e.g. chants_by('cantus_id', '909000').
+        Index of the field is built on first call (one pass over chants), 
+        further lookups take constant time until the data change.
+
+        Args:
+            field (str): chant field
+            value: value of the field
+
+        Returns:
+            list: chants with the value in the order of the Corpus
+        """
+        if self.columnar:
+            return self._chants.rows(self._chants_index(field).get(value))
+        return list(self._chants_index(field).get(value, []))
+
+    def source_of(self, chant : Chant) -> Source | None:
+        """
+        Returns Source of the chant (by srclink) in constant time, index of sources is built on first call.
+        When more sources have the srclink, the first one is returned.
+
+        Args:
+            chant (Chant): chant (or anything with srclink attribute)
+
+        Returns:
+            Source: source of the chant or None if it is not in sources
+        """
+        indexes = self._valid_indexes()
+        if 'sources' not in indexes:
+            index = {}
+            for source in self._sources:
+                index.setdefault(source.srclink, source)
+            indexes['sources'] = index
+        return indexes['sources'].get(chant.srclink)
+
+    def _postings(self, field : str) -> 'RowIndex':
+        """
+        Returns posting lists of chants by the field (sorted rows of each value), built on first use
+        and cached until the data change (as indexes, see invalidate_indexes()).
+
+        Returns:
+            RowIndex: rows of chants of each value of the field
+        """
+        if self.columnar:
+            return self._chants_index(field)
+        from pycantus.models.chant_table import factorize_records, object_array, row_index
+        def compute():
+            codes, uniques = factorize_records(self._chants, field)
+            return row_index(codes, object_array(uniques.tolist() + [None]))
+        return self._cached(('postings', field), compute)
+
+    def _filter_postings(self):
+        """
+        Returns postings for Filter.apply(), posting lists are used only for non-editable Corpus,
+        chants of editable Corpus can be changed in place without updating them, so they are always scanned.
+        """
+        return None if self.is_editable else self._postings
+
+    def content_version(self) -> str | None:
+        """
+        Returns version of the content of the Corpus: hash of the loaded content and operations_history
+        (operations applied since loading). Loaded content of Corpus using snapshot cache is identified by the key
+        of its snapshot (hashes of the files computed on load and loader options), so corpora loaded from the same files
+        and changed by the same operations have the same version also in different sessions.
+        Other corpora get a token of their load, valid only in this session, and no file is read or written.
+        Results of filters are cached by it (see apply_filter()).
+
+        Returns:
+            str: hexadecimal SHA-256 digest or None if the content cannot be identified
+                 (editable Corpus, Corpus not loaded from files)
+        """
+        if self.is_editable or self._loaded_content is None:
+            return None
+        history = [str(entry) for entry in self.operations_history if entry.method != FILTER_CACHE_HIT]
+        def compute():
+            version_data = {
+                'content' : self._loaded_content,
+                'history' : history,
+                'size' : [len(self._chants), len(self._sources)]
+            }
+            return hashlib.sha256(json.dumps(version_data, sort_keys=True).encode('utf-8')).hexdigest()
+        return self._cached(('content_version', tuple(history)), compute)
+
+    def _filter_data(self, filter : Filter) -> tuple[list, list, HistoryEntry | None]:
+        """
+        Applies the filter on data of this Corpus (not changed), the result is taken from the filter result cache
+        when the same filter was applied on the same content (see content_version()) before.
+        Results are stored in memory (FILTER_RESULTS) and, when the Corpus was loaded using snapshot cache, also on disk.
+
+        Returns:
+            list: Reduced list of chants after filtration (ChantTable in columnar storage)
+            list: Reduced list of sources after filtration
+            HistoryEntry: entry recording the cache hit, None if the filter was evaluated
+        """
+        version = self.content_version()
+        if version is None or not filter.compile().fields:
+            chants, sources = filter.apply(self._chants, self._sources, postings=self._filter_postings())
+            return chants, sources, None
+        from pycantus.filtration.compiled import take_rows
+        from pycantus.filtration.result_cache import FILTER_RESULTS
+        key = FILTER_RESULTS.key(filter.canonical_hash(), version)
+        cache_dir = SnapshotCache(self.cache_dir).cache_dir if self._persistent_content else None
+        rows = FILTER_RESULTS.get(key, cache_dir)
+        cache_entry = None
+        if rows is None:
+            rows = filter.select(self._chants, self._sources, postings=self._filter_postings())
+            FILTER_RESULTS.put(key, rows, cache_dir)
+        else:
+            cache_entry = HistoryEntry(method=FILTER_CACHE_HIT, parameters=f"filter: {filter.name}\nkey: {key}\n")
+        return take_rows(self._chants, rows[0]), take_rows(self._sources, rows[1]), cache_entry
+
+    def explain_filter(self, filter : Filter) -> str:
+        """
+        Describes how the filter would be applied on this Corpus: by intersection of posting lists of selective
+        conditions (chant field values, conditions on sources pushed down to srclinks) or by a scan of all chants.
+
+        Args:
+            filter (Filter): filter to be explained
+
+        Returns:
+            str: plan of the filtration, e.g. 'index lookup of cantus_id (3 values, 120 rows) of 200000 chants'
+        """
+        from pycantus.filtration.planner import QueryPlanner
+        postings = self._filter_postings()
+        if postings is None:
+            return f"scan of {len(self._chants)} chants (Corpus is editable)"
+        return str(QueryPlanner(self._chants, self._sources, postings).plan(filter.compile()))
+
+    def groupby(self, fields : str | list[str]) -> 'GroupBy':
+        """
+        Groups chants by values of the fields for aggregations, e.g.
+        corpus.groupby('cantus_id').count() (number of chants of each Cantus ID) or
+        corpus.groupby(['provenance', 'genre']).agg(chants='count', cantus_ids=('cantus_id', 'nunique')).
+        Fields can be chant fields or fields of their sources (joined by srclink), such as provenance or numeric_century
+        (prefix 'source.' selects source field having the same name as chant field, e.g. 'source.century').
+
+        Aggregations are computed by vectorized operations over codes of the field values (see models/groupby.py)
+        and cached until the data change (as indexes, see invalidate_indexes()), results of editable Corpus are not cached.
+
+        Args:
+            fields (str or list): grouping field or fields
+
+        Returns:
+            GroupBy: grouped chants, aggregations are returned as dicts or DataFrames
+        """
+        from pycantus.models.groupby import GroupBy # imports numpy and pandas, so only when needed
+        return GroupBy(self, fields)
+
     @property #getter
     def melody_objects(self) -> list[Melody]:
         """
@@ -128,6 +788,8 @@ class Corpus():
         Returns:
             list : melody objects of chants in the Corpus
         """
+        if self.columnar:
+            return [self._chants.melody_object(row) for row in self._chants.has_melody().nonzero()[0]]
         return [ch.melody_object for ch in self._chants if ch._has_melody]
     
     @property
@@ -148,79 +810,274 @@ class Corpus():
         """
         return Source.header()
 
-    def export_csv(self, chants_filepath : str, sources_filepath=None):
+    def export_csv(self, chants_filepath : str, sources_filepath=None, batch_size : int =DEFAULT_BATCH_SIZE,
+                   parallel : bool =False):
         """ 
         Exports the chants and sources to CSV files.
 
         If sources_filepath is not provided or sources are not in Corpus,
         only chants will be exported.
+        Files are compressed on the fly if their path ends with .gz, .bz2, .xz or .zst.
+        Values are quoted according to RFC 4180, so the files are loaded back by load_dataset unchanged.
+        Rows are written in batches (see dataloaders/writer.py).
 
         Args:
             chants_filepath (str): Path to the output CSV file for chants.
             sources_filepath (str): Path to the output CSV file for sources. (optional)
+            batch_size (int): Number of rows written to the file at once.
+            parallel (bool): Write chants and sources files at the same time in two threads
+                             (pays off mainly for compressed files, compression runs without GIL).
         """
-        # Chants
-        try:
-            with open(chants_filepath, 'w') as s_file:
-                print(self.csv_chants_header, file=s_file)
-                for chant in self._chants:
-                    print(chant.to_csv_row, file=s_file)
-        except Exception as e:
-            print(f"Error exporting chants file : {e}")
-
-        # Sources
+        tasks = [('chants', write_chants_csv, chants_filepath, self._chants)]
         if self._sources and sources_filepath:
+            tasks.append(('sources', write_sources_csv, sources_filepath, self._sources))
+
+        def export(name, write, filepath, records):
             try:
-                with open(sources_filepath, 'w') as s_file:
-                    print(self.csv_sources_header, file=s_file)
-                    for source in self._sources:
-                        print(source.to_csv_row, file=s_file)
+                write(filepath, records, batch_size)
             except Exception as e:
-                print(f"Error exporting sources file : {e}")
+                print(f"Error exporting {name} file : {e}")
 
-    @log_operation
-    def drop_duplicate_chants(self):
+        if parallel and len(tasks) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+                list(executor.map(lambda task: export(*task), tasks))
+        else:
+            for task in tasks:
+                export(*task)
+
+    def export_parquet(self, chants_filepath : str, sources_filepath : str =None, compression : str ='zstd'):
+        """ 
+        Exports the chants and sources to compressed columnar Parquet files 
+        (they can be loaded back with load_dataset). Requires pyarrow.
+
+        If sources_filepath is not provided or sources are not in Corpus,
+        only chants will be exported.
+        Unlike CSV export, types are kept (e.g. numeric_century stays integer).
+
+        Args:
+            chants_filepath (str): Path to the output Parquet file for chants.
+            sources_filepath (str): Path to the output Parquet file for sources. (optional)
+            compression (str): Parquet compression codec ('zstd', 'snappy', 'gzip', 'brotli' or None)
         """
-        Discards all chants that have the same chantlink as another chant.
+        import pandas as pd # imported lazily to keep import of pycantus fast
+        if self.columnar:
+            chants_columns = {field : self._chants.column(field) for field in EXPORT_CHANTS_FIELDS}
+        else:
+            chants_columns = {field : [getattr(ch, field) for ch in self._chants] for field in EXPORT_CHANTS_FIELDS}
+        chants_frame = pd.DataFrame({field : pd.Series(values, dtype='string') 
+                                     for field, values in chants_columns.items()})
+        chants_frame.to_parquet(chants_filepath, compression=compression, index=False)
+
+        if self._sources and sources_filepath:
+            sources_frame = pd.DataFrame({field : pd.Series([getattr(s, field) for s in self._sources], 
+                                                            dtype='Int64' if field == 'numeric_century' else 'string')
+                                          for field in EXPORT_SOURCES_FIELDS})
+            sources_frame.to_parquet(sources_filepath, compression=compression, index=False)
 
-        Keeps the last occurrence of each chant.
+    def sources_report(self) -> SourcesReport:
         """
-        chantlinks = [ch.chantlink for ch in self._chants]
-        i = 0
-        for chant in self._chants:
-            if chantlinks.count(chantlinks[i]) > 1:
-                self._chants.remove(chant)
-                chantlinks.remove(chantlinks[i])
-            i += 1
+        Checks integrity of sources referred to in chants of the Corpus in one pass.
+        Reports all chants sources without record in sources, all duplicate srclinks 
+        in sources and all siglum mismatches between chants and sources.
 
-    @log_operation
-    def drop_duplicate_sources(self):
+        Returns:
+            SourcesReport: report of found integrity problems
+        """
+        if self.columnar:
+            chant_sources = self._chants.distinct('srclink', 'siglum')
+        else:
+            chant_sources = {(ch.srclink, ch.siglum) for ch in self._chants}
+        return build_sources_report(chant_sources, self._sources)
+
+    def drop_duplicate_chants(self, key : str | list[str] ='chantlink', keep : str ='last') -> int:
+        """
+        Discards all chants that have the same key as another chant, in one pass using hash set.
+        The operation, its key, policy and number of dropped chants are recorded in operations_history.
+
+        Args:
+            key (str or list): chant field (or list of fields forming composite key, 
+                               e.g. ['srclink', 'folio', 'sequence', 'cantus_id']) identifying duplicates
+            keep (str): 'last' keeps the last occurrence of each chant, 'first' the first one
+
+        Returns:
+            int: number of dropped chants
+        """
+        fields = _key_fields(key, CHANT_INIT_FIELDS, keep)
+        self._invalidate_indexes()
+        count = len(self._chants)
+        if self.columnar:
+            self._chants = self._chants.take(~self._chants.duplicated(fields, keep))
+        else:
+            self._chants = _keep_unique(self._chants, attrgetter(*fields), keep)
+        dropped = count - len(self._chants)
+        self._log_deduplication('drop_duplicate_chants', key, keep, dropped)
+        return dropped
+
+    def drop_duplicate_sources(self, key : str | list[str] ='srclink', keep : str ='last') -> int:
+        """
+        Discards all sources that have the same key as another source, in one pass using hash set.
+        The operation, its key, policy and number of dropped sources are recorded in operations_history.
+
+        Args:
+            key (str or list): source field (or list of fields forming composite key) identifying duplicates
+            keep (str): 'last' keeps the last occurrence of each source, 'first' the first one
+
+        Returns:
+            int: number of dropped sources
         """
-        Discards all sources that have the same srclink as another source.
+        fields = _key_fields(key, SOURCE_INIT_FIELDS, keep)
+        self._invalidate_indexes()
+        count = len(self._sources)
+        self._sources = _keep_unique(self._sources, attrgetter(*fields), keep)
+        dropped = count - len(self._sources)
+        self._log_deduplication('drop_duplicate_sources', key, keep, dropped)
+        return dropped
 
-        Keeps the last occurrence of each source.
+    def _log_deduplication(self, method : str, key : str | list[str], keep : str, dropped : int):
         """
-        srclinks = [s.srclink for s in self._sources]
-        i = 0
-        for source in self._sources:
-            if srclinks.count(srclinks[i]) > 1:
-                self._sources.remove(source)
-                srclinks.remove(srclinks[i])
-            i += 1
+        Records deduplication into operations_history.
+        """
+        self.operations_history.append(HistoryEntry(
+            method=method,
+            parameters=f"key: {key}\nkeep: {keep}\ndropped: {dropped}\n"
+        ))
     
+    def apply_delta(self, chants_filepath : str, sources_filepath : str =None, tombstone_column : str ='deleted') -> dict:
+        """
+        Applies update files (delta) published by a database.
+        Chants and sources are upserted by chantlink and srclink: record with a new link is appended,
+        record with a known link replaces the record with it (at its position).
+        Rows of delta files with tombstone_column set (e.g. 'true' or '1', see TOMBSTONE_VALUES in loader)
+        are tombstones, records with their link are deleted (only the link has to be filled, tombstones are applied after upserts).
+        Links are expected to be unique in the Corpus (see drop_duplicate_chants()), otherwise only the first
+        record with the link is replaced or deleted.
+
+        New records are locked unless the Corpus is editable. Paths and SHA-256 hashes of delta files are recorded
+        in operations_history, so the result can be replicated from the original files and the deltas.
+
+        Positions of records by link are kept among indexes (built in one pass on first use) and updated, 
+        so upserts take time proportional to the delta size. Tombstones compact the data once
+        (copy of references or columns, positions are rebuilt on next delta). 
+        Index of source_of() is updated as well, other indexes are dropped.
+
+        Limitation of 'columnar' storage: columns are NumPy arrays of exact length, so a delta appending chants
+        copies every column (ChantTable.append()) and tombstones of chants compact the whole table (ChantTable.delete()).
+        Such delta takes time proportional to the size of the Corpus (0.2 s for 1,100 rows on 2M chants),
+        replacements of existing chants are written in place and stay proportional to the delta.
+
+        Args:
+            chants_filepath (str): path to delta file with chants (in the format of chants file)
+            sources_filepath (str): path to delta file with sources (optional)
+            tombstone_column (str): name of the column marking deleted records (None means no tombstones)
+
+        Returns:
+            dict: numbers of inserted, updated and deleted chants and sources
+        """
+        # Imported here, since loader imports models
+        from pycantus.dataloaders.loader import CsvLoader
+        loader = CsvLoader(chants_filepath, sources_filepath, False, False, columnar=self.columnar)
+        new_chants, deleted_chants, new_sources, deleted_sources = loader.load_delta(tombstone_column)
+        if not self.is_editable:
+            if self.columnar:
+                new_chants.set_locked(True)
+            else:
+                for chant in new_chants:
+                    chant.locked = True
+            for source in new_sources:
+                source.locked = True
+
+        # Only indexes maintained here are kept
+        indexes = {name : index for name, index in self._valid_indexes().items()
+                   if name in ('chant_rows', 'source_rows', 'sources')}
+        stats = {}
+
+        # Chants
+        chants = self._chants
+        chant_rows = indexes.get('chant_rows')
+        if chant_rows is None:
+            chant_rows = _first_rows(chants.column('chantlink').tolist() if self.columnar 
+                                     else map(attrgetter('chantlink'), chants))
+        size = len(chants)
+        if self.columnar:
+            replaced, appended = _upsert_rows(chant_rows, size, new_chants.column('chantlink').tolist())
+            if replaced:
+                chants.assign(list(replaced), new_chants.take(list(replaced.values())))
+            if appended:
+                chants = chants.append(new_chants.take(list(appended.values())))
+        else:
+            replaced, appended = _upsert_rows(chant_rows, size, [chant.chantlink for chant in new_chants])
+            for row, position in replaced.items():
+                chants[row] = new_chants[position]
+            chants.extend(new_chants[position] for position in appended.values())
+        deleted_rows = sorted({chant_rows.pop(link) for link in deleted_chants if link in chant_rows})
+        if deleted_rows:
+            if self.columnar:
+                chants = chants.delete(deleted_rows)
+            else:
+                _remove_rows(chants, deleted_rows)
+            chant_rows = None # rows after the deleted ones moved
+        self._chants = chants
+        stats.update(inserted_chants=len(appended), updated_chants=len(replaced), deleted_chants=len(deleted_rows))
+
+        # Sources
+        sources = self._sources
+        source_rows = indexes.get('source_rows')
+        if source_rows is None:
+            source_rows = _first_rows(map(attrgetter('srclink'), sources))
+        replaced, appended = _upsert_rows(source_rows, len(sources), [source.srclink for source in new_sources])
+        for row, position in replaced.items():
+            sources[row] = new_sources[position]
+        sources.extend(new_sources[position] for position in appended.values())
+        if 'sources' in indexes:
+            for source in new_sources:
+                indexes['sources'][source.srclink] = sources[source_rows[source.srclink]]
+        deleted_rows = sorted({source_rows.pop(link) for link in deleted_sources if link in source_rows})
+        if deleted_rows:
+            _remove_rows(sources, deleted_rows)
+            source_rows = None
+            indexes.pop('sources', None)
+        stats.update(inserted_sources=len(appended), updated_sources=len(replaced), deleted_sources=len(deleted_rows))
+
+        # Updated indexes are valid for the current data
+        indexes['chant_rows'] = chant_rows
+        indexes['source_rows'] = source_rows
+        self._indexes = {name : index for name, index in indexes.items() if index is not None}
+        self._indexes_state = self._data_state()
+
+        sources_hash = file_hash(loader.sources_filename) if loader.sources_filename is not None else None
+        self.operations_history.append(HistoryEntry(
+            method='apply_delta',
+            parameters=f"chants_delta: {loader.chants_filename}\n"
+                       f"chants_delta_sha256: {file_hash(loader.chants_filename)}\n"
+                       f"sources_delta: {loader.sources_filename}\n"
+                       f"sources_delta_sha256: {sources_hash}\n"
+                       f"tombstone_column: {tombstone_column}\n"
+                       + ''.join(f"{name}: {count}\n" for name, count in stats.items())
+        ))
+        return stats
+
     @log_operation
     def keep_melodic_chants(self):
         """
         Keeps only chants that have a melody in the corpus.
         """
-        self._chants = [ch for ch in self._chants if ch._has_melody]
+        self._invalidate_indexes()
+        if self.columnar:
+            self._chants = self._chants.take(self._chants.has_melody())
+        else:
+            self._chants = [ch for ch in self._chants if ch._has_melody]
     
     @log_operation
     def drop_empty_sources(self):
         """
         Discards all sources that have no chants in corpus.
         """
-        sources_in_chant_data = {ch.srclink for ch in self._chants}
+        self._invalidate_indexes()
+        if self.columnar:
+            sources_in_chant_data = self._chants.unique('srclink')
+        else:
+            sources_in_chant_data = {ch.srclink for ch in self._chants}
         self._sources = [s for s in self._sources if s.srclink in sources_in_chant_data]
 
     @log_operation
@@ -232,17 +1089,25 @@ class Corpus():
         Args:
             min_chants (int): minimum number of chants a source must have to be kept
         """
-        source_chant_counts = Counter([ch.srclink for ch in self._chants])
+        source_chant_counts = self.groupby('srclink').count()
+        self._invalidate_indexes()
         sources_to_keep = {s for s, count in source_chant_counts.items() if count >= min_chants}
         self._sources = [s for s in self._sources if s.srclink in sources_to_keep]
-        self._chants = [ch for ch in self._chants if ch.srclink in sources_to_keep]
+        if self.columnar:
+            self._chants = self._chants.take(self._chants.isin('srclink', sources_to_keep))
+        else:
+            self._chants = [ch for ch in self._chants if ch.srclink in sources_to_keep]
     
     @log_operation
     def drop_incomplete_chants(self):
         """
         Discards all chants that do not have complete melodic and textual data.
         """
-        self._chants = [c for c in self._chants if c.is_complete_chant]
+        self._invalidate_indexes()
+        if self.columnar:
+            self._chants = self._chants.take(self._chants.complete_mask())
+        else:
+            self._chants = [c for c in self._chants if c.is_complete_chant]
 
     @log_operation
     def apply_filter(self, filter : Filter):
@@ -254,9 +1119,12 @@ class Corpus():
             filter (Filter): filter to be applied
             
         Note:
-            In future we plan to add clone_and_apply_filter(filter) method as well.
+            Use clone_and_apply_filter(filter) (or view(filter)) to keep this Corpus unchanged.
         """
-        self._chants, self._sources = filter.apply(self._chants, self._sources)
+        self._chants, self._sources, cache_entry = self._filter_data(filter)
+        if cache_entry is not None:
+            self.operations_history.append(cache_entry)
+        self._invalidate_indexes()
     
     def get_operations_history_string(self):
         """
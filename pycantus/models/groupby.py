@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+"""
+This module contains the GroupBy class, aggregations of chants of a Corpus grouped by values of their fields
+(e.g. number of chants of each Cantus ID, distinct Cantus IDs of each source, genres of each century).
+
+Chants can be grouped also by fields of their sources (joined by srclink), e.g. provenance or numeric_century.
+Values of each field are encoded as integer codes once, groups and aggregations are then computed
+by vectorized NumPy operations over the codes, no Python loop over chants is involved.
+Codes, groups and aggregations are cached in the Corpus until its data change (see Corpus.groupby()),
+except for editable Corpus, whose chants and sources can be edited in place without notice.
+"""
+import numpy as np
+import pandas as pd
+
+from pycantus.models.chant_table import factorize_records, object_array
+from pycantus.models.source import resolve_field
+
+
+__version__ = "1.0.0"
+__author__ = "Anna Dvorakova"
+
+
+AGGREGATIONS = ('count', 'nunique', 'collect')
+
+
+def cached_result(corpus, key, compute):
+    """
+    Returns result cached in the corpus (see Corpus._cached()), results of editable corpus are always computed,
+    since in-place edits of its chants and sources do not invalidate the cache.
+    """
+    if corpus.is_editable:
+        return compute()
+    return corpus._cached(key, compute)
+
+
+def encode_field(corpus, field : str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes values of the field for all chants of the corpus as integer codes.
+    Values of source fields are looked up once for each distinct srclink of chants.
+
+    Args:
+        corpus (Corpus): corpus of the chants
+        field (str): chant or source field (see resolve_field())
+
+    Returns:
+        np.ndarray: code of the value of each chant (-1 for None)
+        np.ndarray: values of the codes
+    """
+    kind, name = resolve_field(field)
+    if kind == 'chant':
+        return factorize_records(corpus._chants, name)
+
+    srclink_codes, srclinks = cached_result(corpus, ('codes', 'srclink'), lambda: encode_field(corpus, 'srclink'))
+    codes, uniques = pd.factorize(source_values(corpus._sources, srclinks, name))
+    codes = np.append(codes, -1) # chants without srclink (code -1) get code -1
+    return codes[srclink_codes], object_array(uniques.tolist())
+
+
+def source_values(sources : list, srclinks : np.ndarray, name : str) -> np.ndarray:
+    """
+    Looks up value of the source field for each srclink, the first source with the srclink is used
+    (as in Corpus.source_of()), srclinks without source get None.
+
+    Returns:
+        np.ndarray: value of the field for each srclink
+    """
+    values = {}
+    for source in sources:
+        values.setdefault(source.srclink, getattr(source, name))
+    return object_array([values.get(srclink) for srclink in srclinks.tolist()])
+
+
+class GroupBy():
+    """
+    Chants of a Corpus grouped by values of fields, created by Corpus.groupby(fields).
+    Missing values (None) form a group as well, groups are ordered by their first chant.
+
+    Attributes:
+        corpus (Corpus): grouped corpus
+        fields (tuple): grouping fields, chant fields or source fields (see resolve_field())
+    """
+    def __init__(self, corpus, fields : str | list[str]):
+        """
+        Initialize the GroupBy.
+        Args corresponds to class attributes.
+        """
+        self.corpus = corpus
+        self.fields = (fields,) if isinstance(fields, str) else tuple(fields)
+        if not self.fields:
+            raise ValueError('At least one field has to be given for grouping.')
+        for field in self.fields:
+            resolve_field(field)
+
+    def _codes(self, field : str) -> tuple[np.ndarray, np.ndarray]:
+        return cached_result(self.corpus, ('codes', field), lambda: encode_field(self.corpus, field))
+
+    def _groups(self) -> tuple[np.ndarray, list]:
+        """
+        Returns:
+            np.ndarray: group of each chant (groups are numbered in the order of their first chant)
+            list: key of each group (tuple of values for more fields)
+        """
+        return cached_result(self.corpus, ('groups', self.fields), self._compute_groups)
+
+    def _compute_groups(self) -> tuple[np.ndarray, list]:
+        encoded = [self._codes(field) for field in self.fields]
+        combined = np.zeros(len(self.corpus._chants), dtype=np.int64)
+        for codes, uniques in encoded:
+            # codes shifted by one (None is 0), combination is renumbered after each field so it cannot overflow
+            combined, _ = pd.factorize(combined * (len(uniques) + 1) + (codes + 1))
+        group_ids = combined.astype(np.intp)
+        # groups are numbered in the order of appearance, so the first chant of a group raises the running maximum
+        running_max = np.maximum.accumulate(group_ids)
+        first_rows = np.flatnonzero(np.diff(running_max, prepend=-1))
+        columns = [object_array(uniques.tolist() + [None])[codes[first_rows]].tolist() for codes, uniques in encoded]
+        keys = columns[0] if len(columns) == 1 else list(zip(*columns))
+        return group_ids, keys
+
+    def _aggregate(self, field : str, how : str) -> list:
+        """
+        Returns:
+            list: value of the aggregation for each group
+        """
+        key = ('aggregation', self.fields, field, how)
+        return cached_result(self.corpus, key, lambda: self._compute_aggregation(field, how))
+
+    def _compute_aggregation(self, field : str, how : str) -> list:
+        group_ids, keys = self._groups()
+        if field is None:
+            if how != 'count':
+                raise ValueError(f"Aggregation '{how}' needs a field.")
+            return np.bincount(group_ids, minlength=len(keys)).tolist()
+        if how not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{how}', expected one of {AGGREGATIONS}.")
+        codes, uniques = self._codes(field)
+        present = codes >= 0 # missing values are not aggregated
+        groups, codes = group_ids[present], codes[present]
+        if how == 'count':
+            return np.bincount(groups, minlength=len(keys)).tolist()
+        if how == 'nunique':
+            pairs = pd.unique(groups.astype(np.int64) * len(uniques) + codes)
+            return np.bincount(pairs // len(uniques), minlength=len(keys)).tolist()
+        # collect: values of each group in the order of chants
+        order = np.argsort(groups, kind='stable')
+        values = uniques[codes[order]].tolist()
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=len(keys))))).tolist()
+        return [values[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    def agg(self, as_frame : bool =False, **aggregations) -> dict | pd.DataFrame:
+        """
+        Computes named aggregations of the groups, e.g.
+        corpus.groupby('srclink').agg(chants='count', cantus_ids=('cantus_id', 'nunique'), feasts=('feast', 'collect')).
+
+        Args:
+            as_frame (bool): return DataFrame instead of dict
+            **aggregations: name='count' (number of chants of the group) or name=(field, aggregation),
+                            where aggregation is 'count' (number of values present), 'nunique' (number of distinct values)
+                            or 'collect' (list of values in the order of chants), missing values are left out
+
+        Returns:
+            dict: { key : { name : value } } (key is a tuple for more fields)
+                  or pd.DataFrame indexed by the fields with one column per aggregation
+        """
+        if not aggregations:
+            raise ValueError('At least one aggregation has to be given.')
+        results = {}
+        for name, aggregation in aggregations.items():
+            field, how = (None, aggregation) if isinstance(aggregation, str) else aggregation
+            if field is not None:
+                resolve_field(field)
+            values = self._aggregate(field, how)
+            # cached lists of values are not handed out
+            results[name] = [list(group_values) for group_values in values] if how == 'collect' else values
+        keys = self._groups()[1]
+        if as_frame:
+            if len(self.fields) == 1:
+                index = pd.Index(keys, name=self.fields[0], dtype=object)
+            else:
+                index = pd.MultiIndex.from_arrays([list(level) for level in zip(*keys)] or [[]] * len(self.fields),
+                                                  names=list(self.fields))
+            return pd.DataFrame(results, index=index)
+        names = list(results)
+        return {key : dict(zip(names, values)) for key, values in zip(keys, zip(*results.values()))}
+
+    def _single(self, field : str, how : str, as_frame : bool) -> dict | pd.DataFrame:
+        result = self.agg(as_frame=as_frame, **{how : how if field is None else (field, how)})
+        if as_frame:
+            return result
+        return {key : values[how] for key, values in result.items()}
+
+    def count(self, field : str =None, as_frame : bool =False) -> dict | pd.DataFrame:
+        """
+        Returns:
+            dict: { key : number of chants of the group } (number of present values of the field if it is given)
+        """
+        return self._single(field, 'count', as_frame)
+
+    def nunique(self, field : str, as_frame : bool =False) -> dict | pd.DataFrame:
+        """
+        Returns:
+            dict: { key : number of distinct values of the field in the group }
+        """
+        return self._single(field, 'nunique', as_frame)
+
+    def collect(self, field : str, as_frame : bool =False) -> dict | pd.DataFrame:
+        """
+        Returns:
+            dict: { key : list of values of the field in the group (in the order of chants) }
+        """
+        return self._single(field, 'collect', as_frame)
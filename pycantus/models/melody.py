@@ -31,21 +31,35 @@ class Melody():
 
         locked (bool): Indicates if the object is locked for editing. (functional attribute)
     """
+    # Attributes are stored in slots, locked state is given by the class (see locked property and LockedMelody)
+    __slots__ = ('raw_volpiano', 'volpiano', 'mode', 'chantlink', 'cantus_id')
     
     def __init__(self, volpiano : str, chantlink : str, cantus_id : str, mode : str):
-        self.locked = False  # Indicates if the object is locked for editing
+        # Unlocked melody has no modification check, so fields are plain slot assignments
         self.raw_volpiano = volpiano
         self.volpiano = volpiano
         self.mode = mode
         self.chantlink = chantlink
         self.cantus_id = cantus_id
 
+    @property
+    def locked(self) -> bool:
+        """
+        Indicates whether the object is locked for editing.
+        Locking turns the melody into LockedMelody, which refuses modification of all attributes but locked.
+        """
+        return False
 
-    # setter
-    def __setattr__(self, name, value):
-        if name != "locked" and getattr(self, "locked", False):
-            raise AttributeError(f"Cannot modify '{name}' because the object is locked.")
-        super().__setattr__(name, value)
+    @locked.setter
+    def locked(self, value : bool):
+        object.__setattr__(self, '__class__', LockedMelody if value else Melody)
+
+    def __reduce__(self):
+        # Pickled as unlocked Melody, locked is restored as the last attribute,
+        # so the other attributes are restored without the lock check
+        state = {name : getattr(self, name) for name in Melody.__slots__}
+        state['locked'] = self.locked
+        return (Melody.__new__, (Melody,), (None, state))
 
     def __str__(self) -> str:
         return self.volpiano
@@ -110,4 +124,25 @@ class Melody():
         Returns:
             tuple: the range of the melody with respect to the last note
         """
-        return get_range(self.volpiano)
\ No newline at end of file
+        return get_range(self.volpiano)
+
+
+class LockedMelody(Melody):
+    """
+    Locked melody (see Melody.locked), no attribute but locked can be modified.
+    """
+    __slots__ = ()
+
+    @property
+    def locked(self) -> bool:
+        return True
+
+    @locked.setter
+    def locked(self, value : bool):
+        Melody.locked.fset(self, value)
+
+    # setter
+    def __setattr__(self, name, value):
+        if name != "locked":
+            raise AttributeError(f"Cannot modify '{name}' because the object is locked.")
+        super().__setattr__(name, value)
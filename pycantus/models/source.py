@@ -4,14 +4,44 @@ This module contains Source class, which represents a single source entry from s
 It provides methods for creating, modifying, and exporting source data in a standardized format.
 """
 
+from itertools import repeat
+
+from pycantus.dataloaders.writer import format_csv_row
+from pycantus.models.chant import CHANT_INIT_FIELDS
+
+
 __version__ = "1.0.0"
 __author__ = "Anna Dvorakova"
 
 
 MANDATORY_SOURCES_FIELDS = {'title', 'srclink', 'siglum'}
 OPTIONAL_SOURCES_FIELDS = {'century', 'provenance', 'numeric_century', 'cursus'}
+# Fields with few distinct values, loader interns them (equal values share one string object)
+CATEGORICAL_SOURCES_FIELDS = {'srclink', 'siglum', 'century', 'provenance', 'cursus'}
+SOURCE_INIT_FIELDS = ['title', 'srclink', 'siglum', 'numeric_century', 'century', 'provenance', 'cursus']
 EXPORT_SOURCES_FIELDS = ['title', 'siglum','century', 'provenance', 'srclink', 'numeric_century', 'cursus']
 NON_EXPORT_SOURCES_FIELDS = ['locked']
+SOURCE_FIELD_PREFIX = 'source.'
+
+
+def resolve_field(field : str) -> tuple[str, str]:
+    """
+    Finds out whether the field is a field of chants or of their sources (joined by srclink).
+    Chant fields take precedence, fields present only in sources (e.g. provenance, numeric_century)
+    and fields prefixed by 'source.' (e.g. 'source.century') are fields of sources.
+
+    Returns:
+        tuple: ('chant' or 'source', name of the field)
+    """
+    if field.startswith(SOURCE_FIELD_PREFIX):
+        name = field[len(SOURCE_FIELD_PREFIX):]
+        if name in SOURCE_INIT_FIELDS:
+            return 'source', name
+    elif field in CHANT_INIT_FIELDS:
+        return 'chant', field
+    elif field in SOURCE_INIT_FIELDS:
+        return 'source', field
+    raise ValueError(f"Field '{field}' is not a valid chant or source field.")
 
 
 class Source():
@@ -29,6 +59,8 @@ class Source():
 
         locked (bool): Indicates whether the object is locked for editing. If True, no attributes can be modified. (functional attribute)
     """
+    # Attributes are stored in slots, locked state is given by the class (see locked property and LockedSource)
+    __slots__ = ('title', 'srclink', 'siglum', 'numeric_century', 'century', 'provenance', 'cursus')
 
     def __init__(self,
                  title,
@@ -42,7 +74,7 @@ class Source():
         Initialize the Source. 
         Args corresponds to class non-functional attributes.
         """
-        self.locked = False # Indicates if the object is locked for editing
+        # Unlocked source has no modification check, so fields are plain slot assignments
         self.title = title
         self.srclink = srclink
         self.siglum = siglum
@@ -50,13 +82,41 @@ class Source():
         self.century = century
         self.provenance = provenance
         self.cursus = cursus
-    
-    # setter
-    def __setattr__(self, name, value):
-        if name != "locked" and getattr(self, "locked", False):
-            raise AttributeError(f"Cannot modify '{name}' because the object is locked.")
-        super().__setattr__(name, value)
 
+    @property
+    def locked(self) -> bool:
+        """
+        Indicates whether the object is locked for editing.
+        Locking turns the source into LockedSource, which refuses modification of all attributes but locked.
+        """
+        return False
+
+    @locked.setter
+    def locked(self, value : bool):
+        object.__setattr__(self, '__class__', LockedSource if value else Source)
+
+    def __reduce__(self):
+        # Pickled (e.g. for snapshot cache) as unlocked Source, locked is restored as the last attribute,
+        # so the other attributes are restored without the lock check
+        state = {name : getattr(self, name) for name in Source.__slots__}
+        state['locked'] = self.locked
+        return (Source.__new__, (Source,), (None, state))
+
+    @classmethod
+    def from_columns(cls, columns : dict[str, list], length : int):
+        """
+        Bulk factory creating Source objects from column-wise data.
+        Fields not present in columns are set to None.
+
+        Args:
+            columns (dict): { field : list of values for all sources }
+            length (int): number of sources to be created
+
+        Returns:
+            generator: Source objects in the order of the columns values
+        """
+        args = [columns[field] if field in columns else repeat(None, length) for field in SOURCE_INIT_FIELDS]
+        return (cls(*values) for values in zip(*args))
 
     def __str__(self):
         source_string = self.siglum + '\n'
@@ -66,22 +126,13 @@ class Source():
     @property
     def to_csv_row(self):
         """
-        Returns data fields of Source in "to be pasted to the csv export file" form.
+        Returns data fields of Source in "to be pasted to the csv export file" form
+        (RFC 4180 quoting, see format_csv_row()).
         
         Returns:
             str: data of object as standardized csv row
         """
-        csv_row = []
-        for attr_name in EXPORT_SOURCES_FIELDS:
-            attr_value = self.__getattribute__(attr_name)
-            if attr_value is not None:
-                attr_value = str(attr_value)
-                if ',' in attr_value:
-                    attr_value = f'"{attr_value}"'  # Enclose in quotes if it contains a comma
-                csv_row.append(attr_value)
-            else:
-                csv_row.append('')
-        return ','.join(csv_row)
+        return format_csv_row(getattr(self, attr_name) for attr_name in EXPORT_SOURCES_FIELDS)
     
     @staticmethod
     def header() -> str:
@@ -91,4 +142,25 @@ class Source():
         Returns:
             str: the header for the CSV file, which includes all mandatory and optional fields.
         """
-        return ','.join(EXPORT_SOURCES_FIELDS)
\ No newline at end of file
+        return ','.join(EXPORT_SOURCES_FIELDS)
+
+
+class LockedSource(Source):
+    """
+    Locked source (see Source.locked), no attribute but locked can be modified.
+    """
+    __slots__ = ()
+
+    @property
+    def locked(self) -> bool:
+        return True
+
+    @locked.setter
+    def locked(self, value : bool):
+        Source.locked.fset(self, value)
+
+    # setter
+    def __setattr__(self, name, value):
+        if name != "locked":
+            raise AttributeError(f"Cannot modify '{name}' because the object is locked.")
+        super().__setattr__(name, value)
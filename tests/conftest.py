@@ -0,0 +1,68 @@
+import csv
+import random
+
+import pytest
+
+from pycantus.models.chant import CHANT_INIT_FIELDS
+from pycantus.models.corpus import Corpus
+
+
+CHANTS_COLUMNS = ['chantlink', 'incipit', 'siglum', 'srclink', 'cantus_id', 'folio', 'db', 'sequence',
+                  'feast', 'genre', 'office', 'mode', 'melody', 'full_text']
+SOURCES_COLUMNS = ['title', 'srclink', 'siglum', 'century', 'provenance', 'cursus']
+MELODIES = ['1---dH---h7--h--ghgfed--gH---3', '1---f--g--h---3', '1---c--d--e--f---4']
+
+
+def write_dataset(directory, n_chants : int =400, n_sources : int =12, seed : int =0) -> tuple[str, str]:
+    """
+    Writes random chants and sources files (with missing values and chants of sources not in sources file).
+
+    Returns:
+        tuple: (chants_path, sources_path)
+    """
+    rng = random.Random(seed)
+    chants_path = directory / 'chants.csv'
+    sources_path = directory / 'sources.csv'
+    with open(sources_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SOURCES_COLUMNS)
+        for i in range(n_sources):
+            writer.writerow([f'Source {i}', f's{i}', f'S{i}', rng.choice(['11th century', '12th century', '1250', '']),
+                             rng.choice(['Paris', 'Prague', 'Praha, Strahov', 'Wien', '']), rng.choice(['Secular', 'Monastic'])])
+    with open(chants_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CHANTS_COLUMNS)
+        for i in range(n_chants):
+            source = rng.randrange(n_sources + 2) # the last two sources are not in sources file
+            writer.writerow([f'c{i}', rng.choice(['Ave Maria', 'Alleluia', 'Gloria patri', 'Veni']), f'S{source}', f's{source}',
+                             f'00{rng.randrange(30):04d}', f'{rng.randrange(1, 50)}r', 'CI', rng.randrange(1, 9),
+                             rng.choice(['Nat. Domini', 'Pascha', 'Epiphania', '']), rng.choice(['A', 'R', 'V', 'H', '']),
+                             rng.choice(['M', 'V', 'L', '']), rng.choice(['1', '2', '8', '']),
+                             rng.choice(MELODIES + ['']), rng.choice(['Ave maria gratia plena', ''])])
+    return str(chants_path), str(sources_path)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return write_dataset(tmp_path)
+
+
+@pytest.fixture(params=['objects', 'columnar'])
+def storage(request):
+    return request.param
+
+
+def load_corpus(dataset, storage : str ='objects', **kwargs) -> Corpus:
+    chants_path, sources_path = dataset
+    return Corpus(chants_path, sources_path, storage=storage, **kwargs)
+
+
+def chant_records(chants) -> list[tuple]:
+    """
+    Returns values of all chant fields of each chant (comparable between storages).
+    """
+    return [tuple(getattr(chant, field) for field in CHANT_INIT_FIELDS) for chant in chants]
+
+
+def source_records(sources) -> list[tuple]:
+    return [(source.srclink, source.siglum, source.century, source.numeric_century, source.provenance) for source in sources]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from conftest import load_corpus, chant_records, source_records
+from pycantus.filtration import Filter
+from pycantus.models.chant_table import ChantTable
+
+
+def test_columnar_corpus_has_the_same_chants_as_objects(dataset):
+    objects = load_corpus(dataset, 'objects')
+    columnar = load_corpus(dataset, 'columnar')
+    assert isinstance(columnar.chants, ChantTable)
+    assert chant_records(columnar.chants) == chant_records(objects.chants)
+    assert source_records(columnar.sources) == source_records(objects.sources)
+    assert [m.volpiano for m in columnar.melody_objects] == [m.volpiano for m in objects.melody_objects]
+
+
+@pytest.mark.parametrize('operation', [
+    lambda corpus: corpus.keep_melodic_chants(),
+    lambda corpus: corpus.drop_incomplete_chants(),
+    lambda corpus: corpus.drop_small_sources_data(40),
+    lambda corpus: corpus.drop_empty_sources(),
+    lambda corpus: corpus.drop_duplicate_chants(key='cantus_id', keep='last'),
+])
+def test_columnar_operations_match_objects(dataset, operation):
+    objects = load_corpus(dataset, 'objects')
+    columnar = load_corpus(dataset, 'columnar')
+    assert operation(objects) == operation(columnar)
+    assert chant_records(columnar.chants) == chant_records(objects.chants)
+    assert source_records(columnar.sources) == source_records(objects.sources)
+    assert columnar.get_operations_history_string() == objects.get_operations_history_string()
+
+
+def test_columnar_lookups_match_objects(dataset):
+    objects = load_corpus(dataset, 'objects')
+    columnar = load_corpus(dataset, 'columnar')
+    for value in ['A', 'R', None, 'missing']:
+        assert chant_records(columnar.chants_by('genre', value)) == chant_records(objects.chants_by('genre', value))
+    sources = [objects.source_of(chant) for chant in objects.chants]
+    assert None in sources # chants of sources missing in sources file
+    srclinks = [source and source.srclink for source in sources]
+    assert [source and source.srclink for source in map(columnar.source_of, columnar.chants)] == srclinks
+
+
+def test_take_keeps_values_locked_state_and_melodies():
+    table = ChantTable.from_columns({'chantlink' : ['a', 'b', 'c'], 'genre' : ['A', None, 'R'],
+                                     'melody' : ['1---f---3', None, '1---g---3']}, 3)
+    table.set_locked(True, row=0)
+    table.melody_object(2).volpiano = 'EDITED'
+
+    taken = table.take(np.array([2, 0]))
+    assert taken.column('chantlink').tolist() == ['c', 'a']
+    assert taken.column('genre').tolist() == ['R', 'A']
+    assert taken._locked.tolist() == [False, True]
+    assert taken.melody_object(0).volpiano == 'EDITED'
+    assert table.take(np.array([True, True, False])).melody_object(0).volpiano == '1---f---3'
+
+
+def test_filter_on_columnar_storage_is_not_affected_by_edits_of_other_rows(dataset):
+    columnar = load_corpus(dataset, 'columnar', is_editable=True)
+    f = Filter('antiphons')
+    f.add_value_include('genre', 'A')
+    view = columnar.view(f)
+    view.chants[0].genre = 'R'
+    assert all(chant.genre == 'A' for chant in columnar.chants_by('genre', 'A'))
+    assert chant_records(columnar.view(f).chants) != chant_records(view.chants)
@@ -0,0 +1,177 @@
+import pytest
+
+from pycantus.models.corpus import Corpus
+from pycantus.filtration import Filter # imported after models (pycantus.filtration imports them)
+
+
+CHANTS_HEADER = 'chantlink,incipit,siglum,srclink,cantus_id,folio,db,genre,melody\n'
+MELODY = '1---dH---h7--h--ghgfed--gH---3'
+SOURCES_HEADER = 'title,srclink,siglum,century\n'
+
+
+@pytest.fixture
+def files(tmp_path):
+    """
+    Writes two small datasets, returns { name : (chants_path, sources_path) }.
+    """
+    paths = {}
+    for name, genre in (('a', 'A'), ('b', 'R')):
+        chants_path = tmp_path / f'{name}_chants.csv'
+        sources_path = tmp_path / f'{name}_sources.csv'
+        chants_path.write_text(CHANTS_HEADER + ''.join(
+            f'{name}{i},Ave,S{name},s{name},00{i},1r,CI,{genre},{MELODY if i < 2 else ""}\n' for i in range(3)))
+        sources_path.write_text(SOURCES_HEADER + f'Source {name},s{name},S{name},12th century\n')
+        paths[name] = (str(chants_path), str(sources_path))
+    return paths
+
+
+def load(files, name, is_editable):
+    chants_path, sources_path = files[name]
+    return Corpus(chants_path, sources_path, is_editable=is_editable)
+
+
+@pytest.mark.parametrize('is_editable', [None, True, False])
+def test_merge_does_not_change_merged_corpora(files, is_editable):
+    a = load(files, 'a', is_editable=True)
+    b = load(files, 'b', is_editable=False)
+    merged = Corpus.merge([a, b], is_editable=is_editable)
+    assert len(merged.chants) == 6
+
+    assert all(not chant.locked for chant in a.chants)
+    assert all(not source.locked for source in a.sources)
+    assert all(chant.locked for chant in b.chants)
+    assert all(source.locked for source in b.sources)
+    a.chants[0].genre = 'X'
+    with pytest.raises(Exception):
+        b.chants[0].genre = 'X'
+
+    assert merged.chants[0].genre == 'A'
+    assert all(chant.locked != merged.is_editable for chant in merged.chants)
+
+
+def test_merge_of_editable_corpora_copies_on_write(files):
+    a = load(files, 'a', is_editable=True)
+    b = load(files, 'b', is_editable=True)
+    merged = Corpus.merge([a, b])
+
+    merged.chants[0].genre = 'X'
+    merged.sources[0].title = 'X'
+    assert a.chants[0].genre == 'A'
+    assert a.sources[0].title == 'Source a'
+
+    b.chants[0].genre = 'Y'
+    assert merged.chants[3].genre == 'R'
+
+
+@pytest.mark.parametrize('storage', ['objects', 'columnar'])
+def test_view_of_editable_corpus_is_isolated_in_both_directions(files, storage):
+    chants_path, sources_path = files['a']
+    corpus = Corpus(chants_path, sources_path, is_editable=True, storage=storage)
+
+    view = corpus.view()
+    corpus.chants[0].genre = 'EDITED'
+    corpus.sources[0].title = 'EDITED'
+    assert view.chants[0].genre == 'A'
+    assert view.sources[0].title == 'Source a'
+
+    view = corpus.view()
+    view.chants[1].genre = 'EDITED'
+    view.sources[0].title = 'VIEW'
+    assert corpus.chants[1].genre == 'A'
+    assert corpus.sources[0].title == 'EDITED'
+
+
+@pytest.mark.parametrize('storage', ['objects', 'columnar'])
+def test_groupby_of_editable_corpus_follows_edits(files, storage):
+    chants_path, sources_path = files['a']
+    corpus = Corpus(chants_path, sources_path, is_editable=True, storage=storage)
+    assert corpus.groupby('genre').count() == {'A': 3}
+
+    corpus.chants[0].genre = 'ZZ'
+    corpus.sources[0].provenance = 'Place'
+    assert corpus.groupby('genre').count() == {'ZZ': 1, 'A': 2}
+    assert corpus.groupby('provenance').count() == {'Place': 3}
+
+
+@pytest.mark.parametrize('storage', ['objects', 'columnar'])
+def test_partition_by_of_editable_corpus_follows_edits(files, storage):
+    chants_path, sources_path = files['a']
+    corpus = Corpus(chants_path, sources_path, is_editable=True, storage=storage)
+    assert corpus.groupby('genre').count() == {'A': 3}
+
+    corpus.chants[0].genre = 'ZZ'
+    parts = corpus.partition_by('genre')
+    assert {value : len(part.chants) for value, part in parts.items()} == {'ZZ': 1, 'A': 2}
+    for value, part in parts.items():
+        assert all(chant.genre == value for chant in part.chants)
+
+
+@pytest.mark.parametrize('storage', ['objects', 'columnar'])
+def test_edited_melodies_are_kept_by_filtration(files, storage):
+    chants_path, sources_path = files['a']
+    corpus = Corpus(chants_path, sources_path, is_editable=True, storage=storage)
+    corpus.chants[1].melody_object.volpiano = 'EDITED'
+
+    f = Filter('second')
+    f.add_value_include('chantlink', ['a1', 'a2'])
+    corpus.apply_filter(f)
+    corpus.keep_melodic_chants()
+    assert [melody.volpiano for melody in corpus.melody_objects] == ['EDITED']
+
+
+@pytest.mark.parametrize('storage', ['objects', 'columnar'])
+def test_view_keeps_melodies_of_editable_corpus(files, storage):
+    chants_path, sources_path = files['a']
+    corpus = Corpus(chants_path, sources_path, is_editable=True, storage=storage)
+    melody = corpus.melody_objects[0]
+    melody.normalize_volpiano()
+    normalized = melody.volpiano
+    assert normalized != melody.raw_volpiano
+    chant = corpus.chants[0]
+
+    view = corpus.view()
+    assert corpus.melody_objects[0] is melody
+    assert corpus.melody_objects[0].volpiano == normalized
+    assert corpus.chants[0] == chant
+    assert view.melody_objects[0].volpiano == normalized
+
+    view.melody_objects[0].volpiano = 'VIEW'
+    assert melody.volpiano == normalized
+
+
+def test_filter_results_of_corpus_without_cache_stay_in_memory(files, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setenv('PYCANTUS_CACHE_DIR', str(cache_dir))
+    corpus = load(files, 'a', is_editable=False)
+    f = Filter('first')
+    f.add_value_include('chantlink', 'a0')
+
+    assert [chant.chantlink for chant in corpus.view(f).chants] == ['a0']
+    hit = corpus.view(f)
+    assert [entry.method for entry in hit.operations_history] == ['filter_cache_hit', 'apply_filter']
+    assert [chant.chantlink for chant in hit.chants] == ['a0']
+    assert not cache_dir.exists()
+    assert load(files, 'a', is_editable=False).content_version() != corpus.content_version()
+
+
+def test_unparsable_centuries_are_reported_once(tmp_path):
+    chants_path = tmp_path / 'chants.csv'
+    sources_path = tmp_path / 'sources.csv'
+    chants_path.write_text(CHANTS_HEADER + ''.join(f'c{i},Ave,S{i},s{i},001,1r,CI,A,\n' for i in range(4)))
+    sources_path.write_text(SOURCES_HEADER + 'T,s0,S0,12th century\nT,s1,S1,unknown\nT,s2,S2,unknown\nT,s3,S3,early\n')
+
+    with pytest.warns(UserWarning, match='2 distinct century values') as warned:
+        corpus = Corpus(str(chants_path), str(sources_path))
+    assert len(warned) == 1
+    assert corpus.unparsable_centuries == ['unknown', 'early']
+    assert [source.numeric_century for source in corpus.sources] == [12, None, None, None]
+
+
+def test_merge_drops_duplicates_within_one_corpus(files, tmp_path):
+    chants_path = tmp_path / 'dup_chants.csv'
+    chants_path.write_text(CHANTS_HEADER + 'a0,First,Sa,sa,001,1r,CI,A,\na0,Second,Sa,sa,001,1r,CI,A,\n')
+    a = load(files, 'a', is_editable=False)
+    duplicated = Corpus(str(chants_path), files['a'][1])
+    merged = Corpus.merge([duplicated, a])
+    assert [chant.incipit for chant in merged.chants if chant.chantlink == 'a0'] == ['First']
+    assert len(merged.chants) == 3
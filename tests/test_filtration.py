@@ -0,0 +1,238 @@
+import pytest
+
+from conftest import write_dataset, load_corpus, chant_records, source_records
+from pycantus.filtration import Filter
+from pycantus.filtration.planner import QueryPlanner
+from pycantus.filtration.expression import Expression, Condition, And, Or, Not, IsIn, Range, Prefix, Regex, IsNull
+from pycantus.models.chant import EXPORT_CHANTS_FIELDS
+from pycantus.models.source import EXPORT_SOURCES_FIELDS
+
+
+def holds(expression, value) -> bool:
+    """
+    Evaluates the expression on one record, value(condition) returns the value tested by the condition.
+    """
+    if isinstance(expression, Condition):
+        return expression.test([value(expression)])[0]
+    if isinstance(expression, Not):
+        return not holds(expression.operand, value)
+    results = [holds(operand, value) for operand in expression.operands]
+    return all(results) if expression.operator == 'and' else any(results)
+
+
+def brute_force(filter : Filter, chants : list, sources : list) -> tuple[list, list]:
+    """
+    Filters the records one by one: sources by their fields (and by expression testing only source fields),
+    chants of dropped sources are dropped, the remaining chants are tested by their fields
+    (and by expression, values of source fields are taken from the source with their srclink).
+    """
+    include, exclude = filter.filters_include, filter.filters_exclude
+    fields = set(include) | set(exclude)
+
+    def passes(record, fields : set) -> bool:
+        return all((not include.get(field) or getattr(record, field) in include[field]) and
+                   (not exclude.get(field) or getattr(record, field) not in exclude[field]) for field in fields)
+
+    expression = filter.expression
+    source_expression = expression is not None and all(c.kind == 'source' for c in expression.conditions())
+    kept = [passes(source, fields & set(EXPORT_SOURCES_FIELDS)) and
+            (not source_expression or holds(expression, lambda condition: getattr(source, condition.name)))
+            for source in sources]
+    discarded = {source.srclink for source, keep in zip(sources, kept) if not keep}
+    by_srclink = {}
+    for source in sources:
+        by_srclink.setdefault(source.srclink, source)
+
+    def value(chant, condition):
+        if condition.kind == 'chant':
+            return getattr(chant, condition.name)
+        source = by_srclink.get(chant.srclink)
+        return None if source is None else getattr(source, condition.name)
+
+    chants = [chant for chant in chants if chant.srclink not in discarded and passes(chant, fields & set(EXPORT_CHANTS_FIELDS))
+              and (expression is None or source_expression or holds(expression, lambda condition: value(chant, condition)))]
+    return chants, [source for source, keep in zip(sources, kept) if keep]
+
+
+def make_filter(include : dict =None, exclude : dict =None, expression=None) -> Filter:
+    filter = Filter('test')
+    for field, values in (include or {}).items():
+        filter.add_value_include(field, values)
+    for field, values in (exclude or {}).items():
+        filter.add_value_exclude(field, values)
+    if expression is not None:
+        filter.add_expression(expression)
+    return filter
+
+
+def assert_matches_brute_force(corpus, filter : Filter):
+    expected_chants, expected_sources = brute_force(filter, list(corpus.chants), list(corpus.sources))
+    chants, sources = filter.apply(corpus.chants, corpus.sources)
+    assert chant_records(chants) == chant_records(expected_chants)
+    assert source_records(sources) == source_records(expected_sources)
+    view = corpus.view(filter)
+    assert chant_records(view.chants) == chant_records(expected_chants)
+    assert source_records(view.sources) == source_records(expected_sources)
+    return expected_chants
+
+
+VALUE_FILTERS = [
+    {'include' : {'genre' : ['A', 'R']}},
+    {'exclude' : {'genre' : 'A'}},
+    {'include' : {'genre' : 'A'}, 'exclude' : {'office' : ['M', 'V']}},
+    {'include' : {'cantus_id' : [f'00{i:04d}' for i in range(0, 30, 2)]}, 'exclude' : {'cantus_id' : ['000000', '000004']}},
+    {'exclude' : {'cantus_id' : [f'00{i:04d}' for i in range(25)], 'genre' : ['V']}},
+    {'include' : {'provenance' : 'Wien'}},
+    {'exclude' : {'century' : '12th century'}, 'include' : {'mode' : '1'}},
+    {'include' : {'siglum' : ['S1', 'S3', 'S13']}},
+    {'include' : {'srclink' : ['s1', 's2', 's12', 's13']}, 'exclude' : {'provenance' : 'Praha, Strahov'}},
+    {'include' : {'numeric_century' : [11, 13]}},
+    {'include' : {'genre' : 'A'}, 'exclude' : {'genre' : 'A'}},
+]
+
+
+@pytest.mark.parametrize('spec', VALUE_FILTERS)
+def test_value_filters_match_brute_force(dataset, storage, spec):
+    corpus = load_corpus(dataset, storage)
+    assert_matches_brute_force(corpus, make_filter(**spec))
+
+
+@pytest.mark.parametrize('spec', VALUE_FILTERS)
+def test_value_filters_of_editable_corpus_match_brute_force(dataset, storage, spec):
+    corpus = load_corpus(dataset, storage, is_editable=True)
+    assert_matches_brute_force(corpus, make_filter(**spec))
+
+
+def test_apply_filter_reduces_corpus(dataset, storage):
+    corpus = load_corpus(dataset, storage)
+    filter = make_filter(include={'genre' : 'A', 'provenance' : ['Paris', 'Wien']})
+    expected_chants, expected_sources = brute_force(filter, list(corpus.chants), list(corpus.sources))
+    corpus.apply_filter(filter)
+    assert chant_records(corpus.chants) == chant_records(expected_chants)
+    assert source_records(corpus.sources) == source_records(expected_sources)
+    assert chant_records(corpus.chants_by('genre', 'R')) == []
+
+
+def test_filter_is_compiled_on_each_application(dataset, storage):
+    corpus = load_corpus(dataset, storage)
+    filter = make_filter(include={'genre' : 'A'})
+    assert_matches_brute_force(corpus, filter)
+    filter.filters_include['genre'] = ['R'] # direct edits of values are taken into account
+    assert all(chant.genre == 'R' for chant in assert_matches_brute_force(corpus, filter))
+
+
+EXPRESSIONS = [
+    IsIn('genre', ['A', 'R']) & Regex('incipit', '^A'),
+    Range('numeric_century', 11, 12),
+    Range('numeric_century', min=12) | IsNull('provenance'),
+    Prefix('cantus_id', '00001') | ~IsIn('mode', '1'),
+    IsNull('melody'),
+    Range('sequence', 2, 5) & ~IsNull('office'),
+    IsIn('genre', 'A') & Range('numeric_century', max=11),
+    ~(Prefix('source.siglum', 'S1') | IsNull('source.century')) & Not(IsNull('mode')),
+    Or(IsIn('provenance', 'Wien'), And(IsIn('cursus', 'Secular'), Regex('century', r'\d{4}'))),
+]
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS, ids=repr)
+def test_expressions_match_brute_force(dataset, storage, expression):
+    corpus = load_corpus(dataset, storage)
+    expected = assert_matches_brute_force(corpus, make_filter(expression=expression))
+    assert 0 < len(expected) < len(corpus.chants)
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS, ids=repr)
+def test_expressions_of_editable_corpus_match_brute_force(dataset, storage, expression):
+    corpus = load_corpus(dataset, storage, is_editable=True)
+    assert_matches_brute_force(corpus, make_filter(expression=expression))
+
+
+def test_expression_is_combined_with_values(dataset, storage):
+    corpus = load_corpus(dataset, storage)
+    filter = make_filter(include={'office' : ['M', 'V']}, exclude={'provenance' : 'Wien'}, expression=Regex('full_text', 'gratia'))
+    filter.add_expression(Range('numeric_century', max=12) | IsNull('numeric_century'))
+    assert isinstance(filter.expression, And)
+    assert_matches_brute_force(corpus, filter)
+
+
+def test_expression_survives_yaml_round_trip(dataset, storage, tmp_path):
+    corpus = load_corpus(dataset, storage)
+    filter = make_filter(include={'genre' : ['R', 'A']}, expression=EXPRESSIONS[2] & EXPRESSIONS[3])
+    loaded = Filter('loaded')
+    loaded.import_string(filter.as_yaml())
+    assert loaded.expression == filter.expression
+    assert loaded.canonical_hash() == filter.canonical_hash()
+    filter.export_yaml(str(tmp_path))
+    imported = Filter('imported')
+    imported.import_yaml(str(tmp_path / 'test.yaml'))
+    assert imported.expression == filter.expression
+    assert chant_records(corpus.view(imported).chants) == chant_records(brute_force(filter, list(corpus.chants), list(corpus.sources))[0])
+
+
+def test_nested_operators_are_flattened():
+    a, b, c = IsIn('genre', 'A'), Prefix('incipit', 'A'), IsNull('mode')
+    assert len((a & b & c).operands) == 3
+    assert len((a | (b | c)).operands) == 3
+    assert len((a & (b | c)).operands) == 2
+    assert Expression.from_dict((a & ~(b | c)).to_dict()) == a & ~(b | c)
+
+
+def test_invalid_expressions_are_rejected():
+    with pytest.raises(ValueError):
+        Regex('incipit', '(')
+    with pytest.raises(ValueError):
+        Range('numeric_century')
+    with pytest.raises(ValueError):
+        IsIn('unknown', 'A')
+    with pytest.raises(ValueError):
+        Expression.from_dict({'xor' : []})
+    with pytest.raises(TypeError):
+        Filter('test').add_expression({'in' : {'field' : 'genre', 'values' : ['A']}})
+
+
+@pytest.mark.parametrize('spec', VALUE_FILTERS + [{'expression' : expression} for expression in EXPRESSIONS] + [
+    {'include' : {'cantus_id' : ['000003', '000007']}, 'expression' : Range('numeric_century', max=11)},
+    {'include' : {'chantlink' : ['c1', 'c2', 'c390', 'missing']}, 'exclude' : {'genre' : 'R'}},
+    {'expression' : IsIn('folio', ['1r', '2r']) & IsIn('provenance', ['Wien']) & IsNull('mode')},
+])
+def test_query_plans_match_scan(dataset, storage, spec):
+    corpus = load_corpus(dataset, storage)
+    compiled = make_filter(**spec).compile()
+    scanned = compiled.rows(corpus.chants, corpus.sources)
+    # every possible lookup is used, so all of them are checked
+    planner = QueryPlanner(corpus.chants, corpus.sources, corpus._postings, selectivity=1.0)
+    plan = planner.plan(compiled)
+    planned = planner.rows(compiled)
+    for planned_rows, scanned_rows in zip(planned, scanned):
+        if scanned_rows is None:
+            assert planned_rows is None
+        else:
+            assert planned_rows.tolist() == scanned_rows.tolist()
+    assert plan.strategy == ('index' if plan.lookups else 'scan')
+    assert [rows for _, _, rows in plan.lookups] == sorted(rows for _, _, rows in plan.lookups)
+
+
+def test_explain_filter_chooses_index_for_selective_filters(tmp_path, storage):
+    dataset = write_dataset(tmp_path, n_chants=2000, n_sources=60)
+    corpus = load_corpus(dataset, storage)
+    selective = make_filter(include={'cantus_id' : '000001', 'genre' : 'A'})
+    assert corpus.explain_filter(selective).startswith('index lookup of cantus_id (1 values,')
+    assert 'genre' not in corpus.explain_filter(selective)
+    assert corpus.explain_filter(make_filter(include={'genre' : 'A'})) == 'scan of 2000 chants'
+    # condition on sources is pushed down to srclinks of chants
+    pushed_down = make_filter(expression=IsIn('genre', 'A') & IsIn('source.siglum', 'S5'))
+    assert corpus.explain_filter(pushed_down).startswith('index lookup of srclink (1 values,')
+    editable = load_corpus(dataset, storage, is_editable=True)
+    assert editable.explain_filter(selective) == 'scan of 2000 chants (Corpus is editable)'
+    assert_matches_brute_force(corpus, selective)
+    assert_matches_brute_force(corpus, pushed_down)
+
+
+def test_posting_lists_follow_changes_of_corpus(dataset, storage):
+    corpus = load_corpus(dataset, storage)
+    filter = make_filter(include={'cantus_id' : '000002'})
+    assert corpus.explain_filter(filter).startswith('index lookup')
+    assert_matches_brute_force(corpus, filter)
+    corpus.drop_duplicate_chants(key=['cantus_id', 'srclink'])
+    corpus.keep_melodic_chants()
+    assert_matches_brute_force(corpus, filter)
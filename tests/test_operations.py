@@ -0,0 +1,181 @@
+import csv
+
+import pytest
+
+from conftest import load_corpus, chant_records, source_records, CHANTS_COLUMNS, SOURCES_COLUMNS, MELODIES
+from pycantus.dataloaders.cache import file_hash
+
+
+def expected_unique(records : list, key, keep : str) -> list:
+    """
+    Brute-force deduplication: records whose key does not occur again later (keep='last') or earlier (keep='first').
+    """
+    keys = [key(record) for record in records]
+    if keep == 'last':
+        return [record for i, record in enumerate(records) if keys[i] not in keys[i + 1:]]
+    return [record for i, record in enumerate(records) if keys[i] not in keys[:i]]
+
+
+@pytest.mark.parametrize('keep', ['last', 'first'])
+@pytest.mark.parametrize('key', ['cantus_id', ['srclink', 'cantus_id'], ['genre', 'mode']])
+def test_drop_duplicate_chants_keeps_one_occurrence(dataset, storage, key, keep):
+    corpus = load_corpus(dataset, storage)
+    fields = [key] if isinstance(key, str) else key
+    records = chant_records(corpus.chants)
+    expected = expected_unique(list(corpus.chants), lambda chant: tuple(getattr(chant, field) for field in fields), keep)
+    expected = chant_records(expected)
+
+    dropped = corpus.drop_duplicate_chants(key=key, keep=keep)
+    assert chant_records(corpus.chants) == expected
+    assert dropped == len(records) - len(expected) > 0
+    assert corpus.operations_history[-1].method == 'drop_duplicate_chants'
+    assert f"keep: {keep}\ndropped: {dropped}\n" in corpus.operations_history[-1].parameters
+
+
+def test_drop_duplicate_chants_keeps_the_last_occurrence(dataset, storage):
+    corpus = load_corpus(dataset, storage, is_editable=True)
+    chants = list(corpus.chants)
+    chants[5].incipit = 'First'
+    chants[-1].incipit = 'Last'
+    link = chants[5].chantlink
+    chants[-1].chantlink = link
+    assert corpus.drop_duplicate_chants() == 1
+    assert [chant.incipit for chant in corpus.chants if chant.chantlink == link] == ['Last']
+    assert corpus.chants[-1].chantlink == link
+
+
+def test_drop_duplicate_chants_without_duplicates_drops_nothing(dataset, storage):
+    corpus = load_corpus(dataset, storage)
+    records = chant_records(corpus.chants)
+    assert corpus.drop_duplicate_chants() == 0
+    assert chant_records(corpus.chants) == records
+
+
+def test_drop_duplicate_chants_refreshes_indexes(dataset, storage):
+    corpus = load_corpus(dataset, storage)
+    before = len(corpus.chants_by('cantus_id', '000001'))
+    corpus.drop_duplicate_chants(key='cantus_id')
+    assert len(corpus.chants_by('cantus_id', '000001')) == min(before, 1)
+
+
+@pytest.mark.parametrize('keep', ['last', 'first'])
+def test_drop_duplicate_sources_keeps_one_occurrence(dataset, keep):
+    corpus = load_corpus(dataset)
+    count = len(corpus.sources)
+    expected = source_records(expected_unique(list(corpus.sources), lambda source: source.cursus, keep))
+    assert corpus.drop_duplicate_sources(key='cursus', keep=keep) == count - len(expected)
+    assert source_records(corpus.sources) == expected
+    assert len(expected) == 2 # Secular and Monastic
+
+
+def test_deduplication_rejects_unknown_field_and_policy(dataset):
+    corpus = load_corpus(dataset)
+    with pytest.raises(ValueError):
+        corpus.drop_duplicate_chants(key='unknown')
+    with pytest.raises(ValueError):
+        corpus.drop_duplicate_chants(keep='middle')
+    with pytest.raises(ValueError):
+        corpus.drop_duplicate_sources(key=['srclink', 'unknown'])
+
+
+def write_delta(path, columns : list[str], rows : list[list]) -> str:
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return str(path)
+
+
+def chant_row(chantlink : str, srclink : str, incipit : str, deleted : str ='') -> list:
+    values = {'chantlink' : chantlink, 'incipit' : incipit, 'siglum' : f'S{srclink[1:]}', 'srclink' : srclink,
+              'cantus_id' : '009999', 'folio' : '1r', 'db' : 'CI', 'sequence' : '1', 'genre' : 'A', 'melody' : MELODIES[1]}
+    return [values.get(column, '') for column in CHANTS_COLUMNS] + [deleted]
+
+
+def expected_delta(records : list[tuple], upserts : dict[str, tuple], deleted : set[str]) -> list[tuple]:
+    """
+    Brute-force upsert by link (first field of records) followed by deletion of tombstones.
+    """
+    result = [upserts.get(record[0], record) for record in records]
+    links = {record[0] for record in records}
+    result += [record for link, record in upserts.items() if link not in links]
+    return [record for record in result if record[0] not in deleted]
+
+
+def test_apply_delta_upserts_and_deletes_chants_and_sources(dataset, storage, tmp_path):
+    corpus = load_corpus(dataset, storage)
+    chants = write_delta(tmp_path / 'chants_delta.csv', CHANTS_COLUMNS + ['deleted'], [
+        chant_row('c3', 's1', 'Replaced'),
+        chant_row('new1', 's99', 'Inserted'),
+        chant_row('c20', '', '', deleted='true'),
+        chant_row('c30', '', '', deleted='1'),
+        chant_row('c10', 's2', 'Replaced too'),
+        chant_row('unknown', '', '', deleted='yes'), # tombstone of a link not in the corpus
+    ])
+    sources = write_delta(tmp_path / 'sources_delta.csv', SOURCES_COLUMNS + ['deleted'], [
+        ['Replaced source', 's1', 'S1', '13th century', 'Brno', 'Secular', ''],
+        ['New source', 's99', 'S99', '', '', '', ''],
+        ['', 's2', '', '', '', '', 'x'],
+    ])
+    chant_fields = lambda chants: [(ch.chantlink, ch.incipit, ch.srclink, ch.melody) for ch in chants]
+    source_fields = lambda sources: [(s.srclink, s.title, s.century) for s in sources]
+    expected_chants = expected_delta(chant_fields(corpus.chants), {
+        'c3' : ('c3', 'Replaced', 's1', MELODIES[1]),
+        'c10' : ('c10', 'Replaced too', 's2', MELODIES[1]),
+        'new1' : ('new1', 'Inserted', 's99', MELODIES[1]),
+    }, {'c20', 'c30'})
+    expected_sources = expected_delta(source_fields(corpus.sources), {
+        's1' : ('s1', 'Replaced source', '13th century'),
+        's99' : ('s99', 'New source', None),
+    }, {'s2'})
+
+    stats = corpus.apply_delta(chants, sources)
+    assert stats == {'inserted_chants' : 1, 'updated_chants' : 2, 'deleted_chants' : 2,
+                     'inserted_sources' : 1, 'updated_sources' : 1, 'deleted_sources' : 1}
+    assert chant_fields(corpus.chants) == expected_chants
+    assert source_fields(corpus.sources) == expected_sources
+    assert all(chant.locked for chant in corpus.chants)
+    assert corpus.source_of(corpus.chants_by('chantlink', 'new1')[0]).title == 'New source'
+    assert corpus.source_of(corpus.chants_by('chantlink', 'c10')[0]) is None
+    assert corpus.chants_by('chantlink', 'c20') == []
+    entry = corpus.operations_history[-1]
+    assert entry.method == 'apply_delta'
+    assert f"chants_delta_sha256: {file_hash(chants)}\n" in entry.parameters
+    assert "deleted_chants: 2\n" in entry.parameters
+
+
+def test_apply_delta_matches_between_storages_and_repeated_deltas(dataset, tmp_path):
+    corpora = [load_corpus(dataset, 'objects'), load_corpus(dataset, 'columnar')]
+    first = write_delta(tmp_path / 'first.csv', CHANTS_COLUMNS + ['deleted'], [
+        chant_row('c1', '', '', deleted='true'),
+        chant_row('c2', 's3', 'First'),
+        chant_row('new1', 's3', 'Inserted'),
+    ])
+    # positions of chants moved after tombstones of the first delta
+    second = write_delta(tmp_path / 'second.csv', CHANTS_COLUMNS + ['deleted'], [
+        chant_row('c399', 's4', 'Second'),
+        chant_row('new1', 's4', 'Inserted again'),
+        chant_row('c0', '', '', deleted='true'),
+    ])
+    for corpus in corpora:
+        corpus.chants_by('genre', 'A') # index built before the deltas has to be refreshed
+        assert corpus.apply_delta(first)['deleted_chants'] == 1
+        assert corpus.apply_delta(second) == {'inserted_chants' : 0, 'updated_chants' : 2, 'deleted_chants' : 1,
+                                              'inserted_sources' : 0, 'updated_sources' : 0, 'deleted_sources' : 0}
+    objects, columnar = corpora
+    assert chant_records(columnar.chants) == chant_records(objects.chants)
+    assert [ch.incipit for ch in objects.chants_by('chantlink', 'new1')] == ['Inserted again']
+    assert objects.chants[-1].incipit == 'Inserted again'
+    assert objects.chants[-2].incipit == 'Second'
+    assert objects.chants[0].chantlink == 'c2'
+    assert chant_records(columnar.chants_by('genre', 'A')) == chant_records(ch for ch in objects.chants if ch.genre == 'A')
+
+
+def test_apply_delta_keeps_new_records_editable_in_editable_corpus(dataset, storage, tmp_path):
+    corpus = load_corpus(dataset, storage, is_editable=True)
+    delta = write_delta(tmp_path / 'delta.csv', CHANTS_COLUMNS, [chant_row('new1', 's1', 'Inserted')[:-1]])
+    assert corpus.apply_delta(delta, tombstone_column=None)['inserted_chants'] == 1
+    chant = corpus.chants[-1]
+    assert not chant.locked
+    chant.incipit = 'Edited'
+    assert corpus.chants_by('chantlink', 'new1')[0].incipit == 'Edited'
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+
+from conftest import load_corpus, chant_records, source_records
+from pycantus.filtration import Filter
+from pycantus.filtration import result_cache
+from pycantus.filtration.expression import IsIn, Range
+from pycantus.filtration.result_cache import FilterResultCache, RESULTS_SUBDIR
+
+
+@pytest.fixture
+def results(monkeypatch):
+    """
+    Fresh FILTER_RESULTS, so results of other tests are never reused.
+    """
+    cache = FilterResultCache()
+    monkeypatch.setattr(result_cache, 'FILTER_RESULTS', cache)
+    return cache
+
+
+def genre_filter(*genres : str, name : str ='genres') -> Filter:
+    filter = Filter(name)
+    filter.add_value_include('genre', list(genres))
+    return filter
+
+
+def assert_scanned(corpus, derived, filter : Filter):
+    """
+    Checks that the derived corpus has data selected by a scan of the corpus.
+    """
+    chants, sources = filter.apply(corpus.chants, corpus.sources)
+    assert chant_records(derived.chants) == chant_records(chants)
+    assert source_records(derived.sources) == source_records(sources)
+
+
+def methods(corpus) -> list[str]:
+    return [entry.method for entry in corpus.operations_history]
+
+
+def test_lru_evicts_the_least_recently_used_result():
+    cache = FilterResultCache(max_entries=2)
+    a, b, c = (np.array([1, 2]), None), (np.array([3]), np.array([0])), (None, None)
+    cache.put('a', a)
+    cache.put('b', b)
+    assert cache.get('a') is a # a is the most recently used now
+    cache.put('c', c)
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache and len(cache) == 2
+    assert cache.get('b') is None
+    cache.clear()
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        FilterResultCache(max_entries=0)
+
+
+def test_results_are_stored_on_disk(tmp_path):
+    rows = (np.array([0, 5, 7]), None)
+    key = FilterResultCache.key('filter', 'version')
+    FilterResultCache().put(key, rows, str(tmp_path))
+    stored = FilterResultCache().get(key, str(tmp_path))
+    assert stored[0].tolist() == [0, 5, 7] and stored[1] is None
+    assert FilterResultCache().get(key) is None # without cache_dir only memory is used
+
+    (tmp_path / RESULTS_SUBDIR / f"{key}.pickle").write_bytes(b'corrupted')
+    assert FilterResultCache().get(key, str(tmp_path)) is None
+
+
+def test_key_depends_on_filter_and_content():
+    key = FilterResultCache.key('filter', 'version')
+    assert key == FilterResultCache.key('filter', 'version')
+    assert key != FilterResultCache.key('other filter', 'version')
+    assert key != FilterResultCache.key('filter', 'other version')
+
+
+def test_canonical_hash_ignores_name_and_order_of_values():
+    first = genre_filter('A', 'R', name='first')
+    second = genre_filter('R', 'A', name='second')
+    second.filters_include['office'] = [] # fields without values do not restrict anything
+    assert first.canonical_hash() == second.canonical_hash()
+    assert genre_filter('A').canonical_hash() != first.canonical_hash()
+    excluded = Filter('excluded')
+    excluded.add_value_exclude('genre', ['A', 'R'])
+    assert excluded.canonical_hash() != first.canonical_hash()
+
+    first.add_expression(IsIn('mode', ['1', '2']) & Range('numeric_century', 11, 12))
+    second.add_expression(IsIn('mode', ['2', '1']) & Range('numeric_century', 11, 12))
+    assert first.canonical_hash() == second.canonical_hash()
+    third = genre_filter('A', 'R')
+    third.add_expression(IsIn('mode', ['1', '2']) & Range('numeric_century', 11, 13))
+    assert third.canonical_hash() != first.canonical_hash()
+
+
+def test_repeated_filter_reuses_result(dataset, storage, results):
+    corpus = load_corpus(dataset, storage)
+    filter = genre_filter('A', 'R')
+    first = corpus.view(filter)
+    assert methods(first) == ['apply_filter'] and len(results) == 1
+    # the same filter of another name selecting the same values is the same query
+    again = corpus.view(genre_filter('R', 'A', name='again'))
+    assert methods(again) == ['filter_cache_hit', 'apply_filter']
+    assert_scanned(corpus, again, filter)
+    assert len(results) == 1
+
+    corpus.apply_filter(filter)
+    assert methods(corpus) == ['filter_cache_hit', 'apply_filter']
+    assert chant_records(corpus.chants) == chant_records(first.chants)
+
+
+def test_result_is_not_reused_after_change_of_content(dataset, storage, results):
+    corpus = load_corpus(dataset, storage)
+    filter = genre_filter('A')
+    version = corpus.content_version()
+    corpus.view(filter)
+
+    corpus.keep_melodic_chants()
+    assert corpus.content_version() != version
+    changed = corpus.view(filter)
+    assert 'filter_cache_hit' not in methods(changed)
+    assert_scanned(corpus, changed, filter)
+    assert len(results) == 2
+
+    # a cache hit does not change the version, so results of further filters are shared as well
+    hit = corpus.view(filter)
+    assert methods(hit)[-2] == 'filter_cache_hit'
+    assert hit.content_version() == changed.content_version()
+    changed.view(genre_filter('R'))
+    assert methods(hit.view(genre_filter('R')))[-2:] == ['filter_cache_hit', 'apply_filter']
+
+
+def test_corpora_loaded_separately_do_not_share_results(dataset, storage, results):
+    first = load_corpus(dataset, storage)
+    second = load_corpus(dataset, storage)
+    assert first.content_version() != second.content_version()
+    filter = genre_filter('A')
+    first.view(filter)
+    assert 'filter_cache_hit' not in methods(second.view(filter))
+
+
+def test_results_of_editable_corpus_are_not_cached(dataset, storage, results):
+    corpus = load_corpus(dataset, storage, is_editable=True)
+    assert corpus.content_version() is None
+    filter = genre_filter('A')
+    corpus.view(filter)
+    corpus.chants[0].genre = 'A' if corpus.chants[0].genre != 'A' else 'R'
+    view = corpus.view(filter)
+    assert methods(view) == ['apply_filter'] and len(results) == 0
+    assert_scanned(corpus, view, filter)
+
+
+def test_results_of_cached_corpus_survive_the_session(dataset, storage, results, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    corpus = load_corpus(dataset, storage, use_cache=True, cache_dir=str(cache_dir))
+    filter = genre_filter('A', 'V')
+    corpus.view(filter)
+    assert len(list((cache_dir / RESULTS_SUBDIR).iterdir())) == 1
+
+    results.clear() # as in a new session
+    loaded = load_corpus(dataset, storage, use_cache=True, cache_dir=str(cache_dir))
+    assert loaded.content_version() == corpus.content_version()
+    hit = loaded.view(filter)
+    assert methods(hit) == ['filter_cache_hit', 'apply_filter']
+    assert_scanned(loaded, hit, filter)